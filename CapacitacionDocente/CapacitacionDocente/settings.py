@@ -131,6 +131,74 @@ if not DEBUG:
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# --- CACHÉ DE PDF GENERADOS ---
+# Carpeta donde se guardan los PDF ya renderizados y tamaño máximo (0 = sin caché).
+# Al pasar el límite se borran los menos usados recientemente.
+PDF_CACHE_DIR = os.environ.get('PDF_CACHE_DIR', os.path.join(BASE_DIR, 'pdf_cache'))
+PDF_CACHE_MAX_BYTES = int(os.environ.get('PDF_CACHE_MAX_BYTES', 200 * 1024 * 1024))
+
+# --- ENVÍO DE PDF ---
+# Sin caché, el PDF se escribe en memoria hasta PDF_SPOOL_MAX_BYTES y de ahí en adelante en disco.
+# PDF_ENVIO: '' (Django manda el archivo), 'x-accel' (nginx) o 'x-sendfile' (Apache / lighttpd):
+# con los dos últimos, el servidor web manda el PDF de la caché y el worker queda libre.
+# PDF_X_ACCEL_PREFIJO es la location 'internal' de nginx que apunta a PDF_CACHE_DIR.
+PDF_SPOOL_MAX_BYTES = int(os.environ.get('PDF_SPOOL_MAX_BYTES', 1024 * 1024))
+PDF_ENVIO = os.environ.get('PDF_ENVIO', '')
+PDF_X_ACCEL_PREFIJO = os.environ.get('PDF_X_ACCEL_PREFIJO', '/pdf_cache_interno/')
+
+# --- COLA DE PDF (MODO ASÍNCRONO) ---
+# Segundos tras los cuales un trabajo 'procesando' se considera abandonado y se reintenta.
+PDF_COLA_TIMEOUT = int(os.environ.get('PDF_COLA_TIMEOUT', 300))
+# Pre-generar el PDF en cuanto se guarda un formato: 'hilo' (en el mismo proceso web),
+# 'cola' (lo toma `manage.py procesar_pdfs`) o '' para desactivarlo.
+PDF_PRERENDER = os.environ.get('PDF_PRERENDER', 'hilo')
+
+# --- RENDER AISLADO DE PDF (DESCARGAS DESDE LA WEB) ---
+# Procesos que maquetan los PDF fuera del worker web (0 = en el mismo proceso),
+# segundos máximos por PDF, memoria máxima por proceso (RLIMIT_AS) y PDF antes de reciclarlo.
+# Son POR WORKER de gunicorn y se crean hasta que hacen falta: con 512 MB-1 GB de RAM,
+# uno por worker alcanza. RLIMIT_AS cuenta memoria virtual, no lo que de verdad se usa.
+PDF_AISLADO_PROCESOS = int(os.environ.get('PDF_AISLADO_PROCESOS', 1))
+PDF_AISLADO_TIMEOUT = int(os.environ.get('PDF_AISLADO_TIMEOUT', 60))
+PDF_AISLADO_MEMORIA_MB = int(os.environ.get('PDF_AISLADO_MEMORIA_MB', 1024))
+PDF_AISLADO_RENDERS = int(os.environ.get('PDF_AISLADO_RENDERS', 50))
+
+# --- TAMAÑO DEL PDF ---
+# Con PDF_OPTIMIZAR se usan las imágenes de Sistema/img/pdf/ (las genera
+# `manage.py optimizar_imagenes_pdf` en build.sh) y WeasyPrint baja las imágenes a
+# PDF_IMAGEN_DPI y deja en el PDF solo los glifos usados de cada fuente.
+PDF_OPTIMIZAR = os.environ.get('PDF_OPTIMIZAR', '1') == '1'
+PDF_IMAGEN_DPI = int(os.environ.get('PDF_IMAGEN_DPI', 300))
+PDF_IMAGEN_LADO_MAX = int(os.environ.get('PDF_IMAGEN_LADO_MAX', 300))
+PDF_JPEG_CALIDAD = int(os.environ.get('PDF_JPEG_CALIDAD', 85))
+
+# --- EXPORTACIÓN MASIVA DE PDF ---
+# Procesos que renderizan en paralelo al exportar un periodo completo (ZIP).
+PDF_LOTE_PROCESOS = int(os.environ.get('PDF_LOTE_PROCESOS', 4))
+# Las exportaciones desde la web las arma `manage.py procesar_pdfs` en esta carpeta
+# y se borran después de PDF_EXPORTACIONES_SEGUNDOS.
+PDF_EXPORTACIONES_DIR = os.environ.get('PDF_EXPORTACIONES_DIR', os.path.join(BASE_DIR, 'pdf_exportaciones'))
+PDF_EXPORTACIONES_SEGUNDOS = int(os.environ.get('PDF_EXPORTACIONES_SEGUNDOS', 24 * 60 * 60))
+
+# --- LISTAS DE ASISTENCIA ---
+# Hojas de 23 participantes que admite una lista. Cada participante son 11 campos del
+# formulario, así que el tope de campos por POST tiene que alcanzar para todos.
+ASISTENCIA_MAX_HOJAS = int(os.environ.get('ASISTENCIA_MAX_HOJAS', 20))
+DATA_UPLOAD_MAX_NUMBER_FIELDS = 100 + ASISTENCIA_MAX_HOJAS * 23 * 11
+
+# --- CACHÉ (ESTADÍSTICAS) ---
+# CACHE_BACKEND: 'memoria' (default, una caché por proceso) o 'archivo' (en CACHE_DIR,
+# compartida por todos los workers de gunicorn). Con varios workers conviene 'archivo':
+# así una encuesta nueva invalida las estadísticas en todos y no solo en el que la guardó.
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'memoria')
+CACHE_DIR = os.environ.get('CACHE_DIR', os.path.join(BASE_DIR, 'cache'))
+if CACHE_BACKEND == 'archivo':
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': CACHE_DIR}}
+else:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'capacitacion'}}
+# Segundos que duran los resultados del tablero; una encuesta nueva los invalida antes.
+ESTADISTICAS_CACHE_SEGUNDOS = int(os.environ.get('ESTADISTICAS_CACHE_SEGUNDOS', 60 * 60))
+
 # --- CONFIGURACIÓN DE JAZZMIN (ADMIN) ---
 JAZZMIN_UI_TWEAKS = {
     "navbar_small_text": False,
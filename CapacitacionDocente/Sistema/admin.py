@@ -8,7 +8,7 @@ from .models import (
     DiagnosticoNecesidades, DiagnosticoAsignatura, DiagnosticoActividad,
     CurriculumVitae, CVExperienciaLaboral, CVExperienciaDocente,
     CVProductoAcademico, CVParticipacionInstructor,
-    ListaAsistencia, AsistenciaParticipante, Profesor
+    ListaAsistencia, AsistenciaParticipante, Profesor, TrabajoPDF
 )
 
 # =======================================================
@@ -256,4 +256,14 @@ class ProfesorAdmin(admin.ModelAdmin):
         return f"{obj.apellido_paterno} {obj.apellido_materno} {obj.nombre}"
 
     # Permitir ordenar por la columna calculada
-    nombre_completo.admin_order_field = 'apellido_paterno'
\ No newline at end of file
+    nombre_completo.admin_order_field = 'apellido_paterno'
+
+
+# =======================================================
+# 12. COLA DE PDF
+# =======================================================
+@admin.register(TrabajoPDF)
+class TrabajoPDFAdmin(admin.ModelAdmin):
+    list_display = ('tipo', 'objeto_id', 'estado', 'fecha_creacion', 'fecha_actualizacion')
+    list_filter = ('estado', 'tipo')
+    readonly_fields = ('error',)
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class SistemaConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'Sistema'
+
+    def ready(self):
+        # Señales que invalidan la caché de PDF cuando cambia un documento
+        # y que mantienen el resumen de encuestas de las estadísticas
+        from . import signals
+        signals.conectar()
@@ -0,0 +1,263 @@
+import hashlib
+import json
+import re
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Avg, Count, F, FloatField, Q, StdDev, Sum, Window
+from django.db.models.functions import PercentRank, Rank
+
+from .models import EncuestaSatisfaccion, ResumenEncuesta
+
+# =======================================================
+# ESTADÍSTICAS DE LAS ENCUESTAS DE SATISFACCIÓN
+# =======================================================
+# ResumenEncuesta guarda, por (periodo, facilitador, curso), cuántas encuestas hay y la
+# suma de cada pregunta. Las señales de EncuestaSatisfaccion (signals.py) la mantienen al
+# día con sumar_encuesta(); así el tablero no depende de cuántas encuestas se han juntado.
+#
+# Además, los resultados del tablero se guardan en la caché de Django bajo una versión
+# (_CLAVE_VERSION) que cambia con cada encuesta guardada o borrada: lo viejo simplemente
+# deja de leerse y se va por su tiempo de vida.
+
+PREGUNTAS = [f'q{i}' for i in range(1, 21)]
+CALIFICACIONES = range(1, 6)
+CLAVE_RESUMEN = ['periodo', 'facilitador', 'nombre_curso']
+
+
+def valores_encuesta(encuesta):
+    """Lo que cuenta para el resumen: la clave y las 20 calificaciones."""
+    return {campo: getattr(encuesta, campo) for campo in CLAVE_RESUMEN + PREGUNTAS}
+
+
+def sumar_encuesta(valores, signo=1):
+    """Suma (signo=1) o resta (signo=-1) una encuesta en su fila del resumen."""
+    clave = {campo: valores[campo] for campo in CLAVE_RESUMEN}
+    with transaction.atomic():
+        fila, _ = ResumenEncuesta.objects.get_or_create(**clave)
+        # F(): el incremento lo hace la base, sin leer y reescribir (dos encuestas a la vez no se pisan)
+        ResumenEncuesta.objects.filter(pk=fila.pk).update(
+            respuestas=F('respuestas') + signo,
+            **{f'suma_{q}': F(f'suma_{q}') + signo * int(valores[q]) for q in PREGUNTAS}
+        )
+        if signo < 0:
+            # Sin encuestas, la combinación deja de aparecer en los filtros
+            ResumenEncuesta.objects.filter(pk=fila.pk, respuestas__lte=0).delete()
+
+
+def reconstruir_resumen():
+    """Vuelve a calcular todo el resumen desde las encuestas (por si se cargaron datos sin señales)."""
+    filas = (
+        EncuestaSatisfaccion.objects.order_by()
+        .values(*CLAVE_RESUMEN)
+        .annotate(respuestas=Count('pk'), **{f'suma_{q}': Sum(q) for q in PREGUNTAS})
+    )
+    with transaction.atomic():
+        ResumenEncuesta.objects.all().delete()
+        ResumenEncuesta.objects.bulk_create([ResumenEncuesta(**fila) for fila in filas])
+
+
+# =======================================================
+# ORDEN CRONOLÓGICO DE LOS PERIODOS
+# =======================================================
+# El periodo es texto libre ("Enero-Junio 2024", "Agosto-Diciembre 2023", "2025-1").
+# Ordenado como texto, "Agosto-Diciembre 2024" queda antes que "Enero-Junio 2024"; por eso
+# se ordena por (año, mes en que empieza o número de semestre) y solo al final por el texto.
+_MESES = ['ene', 'feb', 'mar', 'abr', 'may', 'jun', 'jul', 'ago', 'sep', 'oct', 'nov', 'dic']
+_ANIO = re.compile(r'(?<!\d)(\d{4})(?!\d)')
+_MES = re.compile(r'\b(' + '|'.join(_MESES) + r'|set)[a-z]*', re.IGNORECASE)
+_NUMERO = re.compile(r'(?<!\d)(\d{1,2})(?!\d)')
+
+
+def clave_periodo(periodo):
+    """Clave para ordenar periodos cronológicamente. Los que no traen año quedan al principio."""
+    anio = _ANIO.search(periodo)
+    sin_anio = _ANIO.sub(' ', periodo)
+    mes = _MES.search(sin_anio)
+    if mes:
+        parte = _MESES.index('sep' if mes.group(1).lower() == 'set' else mes.group(1).lower()) + 1
+    else:
+        numero = _NUMERO.search(sin_anio)
+        parte = int(numero.group(1)) if numero else 0
+    return int(anio.group(1)) if anio else 0, parte, periodo
+
+
+# =======================================================
+# CACHÉ VERSIONADA
+# =======================================================
+_CLAVE_VERSION = 'estadisticas:version'
+
+
+def _version():
+    """Versión actual de los resultados. Si se perdió (caché nueva o desalojada), se crea una nueva."""
+    version = cache.get(_CLAVE_VERSION)
+    if version is None:
+        # Una versión que no se haya usado antes, para no revivir resultados viejos
+        cache.add(_CLAVE_VERSION, time.time_ns(), None)
+        version = cache.get(_CLAVE_VERSION)
+    return version
+
+
+def invalidar():
+    """Deja atrás todos los resultados guardados (los invalida el cambio de versión)."""
+    cache.set(_CLAVE_VERSION, time.time_ns(), None)
+
+
+def en_cache(nombre, calcular, **filtro):
+    """
+    calcular() guardado en caché para el filtro dado y la versión actual.
+    Los valores del filtro van en un hash: pueden traer espacios o acentos.
+    """
+    huella = hashlib.sha1(json.dumps(filtro, sort_keys=True).encode()).hexdigest()
+    return cache.get_or_set(
+        f'estadisticas:{nombre}:{huella}', calcular, settings.ESTADISTICAS_CACHE_SEGUNDOS, version=_version()
+    )
+
+
+# =======================================================
+# CONSULTAS DEL TABLERO
+# =======================================================
+def opciones_filtro():
+    """(periodos, facilitadores) que tienen al menos una encuesta, para los filtros del tablero."""
+    return en_cache('opciones', _opciones_filtro)
+
+
+def _opciones_filtro():
+    periodos = ResumenEncuesta.objects.order_by('periodo').values_list('periodo', flat=True).distinct()
+    facilitadores = ResumenEncuesta.objects.order_by('facilitador').values_list('facilitador', flat=True).distinct()
+    return sorted(periodos, key=clave_periodo), list(facilitadores)
+
+
+def promedios(periodo=None, facilitador=None):
+    """{'q1': promedio o None, ...} de las encuestas que cumplen el filtro, leído del resumen."""
+    return en_cache('promedios', lambda: _promedios(periodo, facilitador), periodo=periodo, facilitador=facilitador)
+
+
+def _promedios(periodo, facilitador):
+    filas = ResumenEncuesta.objects.all()
+    if periodo:
+        filas = filas.filter(periodo=periodo)
+    if facilitador:
+        filas = filas.filter(facilitador=facilitador)
+
+    totales = filas.aggregate(respuestas=Sum('respuestas'), **{q: Sum(f'suma_{q}') for q in PREGUNTAS})
+    n = totales['respuestas']
+    return {q: totales[q] / n if n else None for q in PREGUNTAS}
+
+
+def distribucion(periodo=None, facilitador=None, nombre_curso=None):
+    """
+    Cuántas veces se respondió cada calificación (1 a 5) en cada pregunta, con n, promedio y
+    desviación estándar. Todo sale de UNA consulta con conteos condicionales
+    (COUNT(*) FILTER (WHERE q1 = 1), ...) en lugar de 100 consultas de conteo.
+    """
+    filtro = {'periodo': periodo, 'facilitador': facilitador, 'nombre_curso': nombre_curso}
+    return en_cache('distribucion', lambda: _distribucion(**filtro), **filtro)
+
+
+def _distribucion(**filtro):
+    encuestas = EncuestaSatisfaccion.objects.filter(**{campo: valor for campo, valor in filtro.items() if valor})
+
+    agregados = {'n': Count('pk')}
+    for q in PREGUNTAS:
+        agregados[f'{q}_promedio'] = Avg(q)
+        agregados[f'{q}_desviacion'] = StdDev(q)
+        for calificacion in CALIFICACIONES:
+            agregados[f'{q}_{calificacion}'] = Count('pk', filter=Q(**{q: calificacion}))
+    fila = encuestas.aggregate(**agregados)
+
+    return {
+        'n': fila['n'],
+        'preguntas': [
+            {
+                'pregunta': q,
+                'conteos': {str(c): fila[f'{q}_{c}'] for c in CALIFICACIONES},
+                'promedio': _redondear(fila[f'{q}_promedio']),
+                'desviacion': _redondear(fila[f'{q}_desviacion']),
+            }
+            for q in PREGUNTAS
+        ],
+    }
+
+
+def _redondear(valor):
+    return round(valor, 2) if valor is not None else None
+
+
+def tendencia(facilitador=None):
+    """
+    Promedio de cada pregunta (y el general de las 20) en cada periodo, en orden cronológico.
+    Una sola consulta agrupada por periodo sobre el resumen, en lugar de una por periodo.
+    """
+    return en_cache('tendencia', lambda: _tendencia(facilitador), facilitador=facilitador)
+
+
+def _tendencia(facilitador):
+    filas = ResumenEncuesta.objects.order_by()
+    if facilitador:
+        filas = filas.filter(facilitador=facilitador)
+
+    por_periodo = (
+        filas.values('periodo')
+        .annotate(n=Sum('respuestas'), **{q: Sum(f'suma_{q}') for q in PREGUNTAS})
+    )
+
+    periodos = []
+    for fila in sorted(por_periodo, key=lambda fila: clave_periodo(fila['periodo'])):
+        n = fila['n']
+        periodos.append({
+            'periodo': fila['periodo'],
+            'n': n,
+            'general': _redondear(sum(fila[q] for q in PREGUNTAS) / (n * len(PREGUNTAS))),
+            'promedios': {q: _redondear(fila[q] / n) for q in PREGUNTAS},
+        })
+    return periodos
+
+
+# Bandas por percentil dentro del periodo: (percentil mínimo, banda)
+BANDAS_PERCENTIL = [(0.75, 'Superior'), (0.25, 'Media'), (0.0, 'Inferior')]
+
+
+def ranking_facilitadores(periodo=None):
+    """
+    Cada facilitador por periodo: promedio de satisfacción (las 20 preguntas), encuestas,
+    lugar, percentil y banda dentro del periodo. Lugar y percentil los calcula la base con
+    funciones de ventana (RANK y PERCENT_RANK ... OVER (PARTITION BY periodo)).
+    """
+    return en_cache('ranking', lambda: _ranking_facilitadores(periodo), periodo=periodo)
+
+
+def _ranking_facilitadores(periodo):
+    encuestas = EncuestaSatisfaccion.objects.order_by()
+    if periodo:
+        encuestas = encuestas.filter(periodo=periodo)
+
+    suma_preguntas = sum((F(q) for q in PREGUNTAS[1:]), F(PREGUNTAS[0]))
+    filas = (
+        encuestas.values('periodo', 'facilitador')
+        .annotate(
+            promedio=Avg(suma_preguntas, output_field=FloatField()) / len(PREGUNTAS),
+            respuestas=Count('pk'),
+        )
+        .annotate(
+            lugar=Window(Rank(), partition_by=F('periodo'), order_by=F('promedio').desc()),
+            percentil=Window(PercentRank(), partition_by=F('periodo'), order_by=F('promedio').asc()),
+            facilitadores=Window(Count('facilitador'), partition_by=F('periodo')),
+        )
+        .order_by('lugar', 'facilitador')
+    )
+
+    ranking = []
+    # Del periodo más reciente al más antiguo (sorted es estable: se conserva lugar y facilitador)
+    for fila in sorted(filas, key=lambda fila: clave_periodo(fila['periodo']), reverse=True):
+        fila['promedio'] = round(fila['promedio'], 2)
+        fila['percentil'] = round(fila['percentil'] * 100)
+        # Con un solo facilitador en el periodo no hay con quién comparar
+        fila['banda'] = '' if fila['facilitadores'] == 1 else next(
+            banda for minimo, banda in BANDAS_PERCENTIL if fila['percentil'] >= minimo * 100
+        )
+        ranking.append(fila)
+    return ranking
+
@@ -148,7 +148,8 @@ class ListaAsistenciaForm(forms.ModelForm):
     class Meta:
         model = ListaAsistencia
         fields = [
-            'hoja_actual', 'hoja_total', 'instituto', 'clave_curso', 'folio',
+            # hoja_actual / hoja_total las calcula la vista según los participantes
+            'instituto', 'clave_curso', 'folio',
             'nombre_curso', 'instructor', 'periodo', 'duracion', 'horario',
             'instructor_rfc', 'instructor_curp', 'coordinador_rfc', 'coordinador_curp'
         ]
@@ -157,6 +158,16 @@ class ListaAsistenciaForm(forms.ModelForm):
 # 10. REGISTRO FORMACION
 # =======================================================
 
+class RegistroGeneralForm(forms.ModelForm):
+    # Encabezado y firmas del registro: ya no se ponen valores fijos en la vista
+    jefe_desarrollo = forms.CharField(required=True)
+    subdirector = forms.CharField(required=True)
+
+    class Meta:
+        model = RegistroGeneral
+        fields = ['periodo', 'jefe_desarrollo', 'subdirector']
+
+
 class RegistroFilaForm(forms.ModelForm): # <--- CAMBIO DE NOMBRE
     # Forzamos fechas obligatorias
     fecha_inicio = forms.DateField(required=True)
@@ -0,0 +1,58 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from Sistema import pdf_benchmark
+from Sistema.pdf import PDF_CONFIG
+
+
+class Command(BaseCommand):
+    help = 'Mide tiempo y memoria de la generación de cada PDF (vacío, típico y máximo) y guarda un reporte JSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--salida', default='benchmark_pdf.json',
+                            help='Ruta del reporte JSON (default: benchmark_pdf.json).')
+        parser.add_argument('--tipos', default=','.join(PDF_CONFIG),
+                            help='Formatos a medir separados por coma (default: todos).')
+        parser.add_argument('--escenarios', default=','.join(pdf_benchmark.ESCENARIOS),
+                            help='Escenarios separados por coma: vacio, tipico, maximo.')
+        parser.add_argument('--repeticiones', type=int, default=5,
+                            help='Generaciones cronometradas por escenario (default: 5).')
+        parser.add_argument('--comparar', action='store_true',
+                            help='Mide también las pantallas de captura (plantillas web) y reporta la diferencia.')
+
+    def handle(self, *args, **options):
+        tipos = [t for t in options['tipos'].split(',') if t]
+        escenarios = [e for e in options['escenarios'].split(',') if e]
+        invalidos = [t for t in tipos if t not in PDF_CONFIG]
+        invalidos += [e for e in escenarios if e not in pdf_benchmark.ESCENARIOS]
+        if invalidos:
+            raise CommandError(f"Valores no válidos: {', '.join(invalidos)}")
+        if options['repeticiones'] < 1:
+            raise CommandError('--repeticiones debe ser al menos 1.')
+
+        reporte = pdf_benchmark.ejecutar(tipos, escenarios, options['repeticiones'], options['comparar'])
+
+        self.stdout.write(f"{'tipo':<12}{'escenario':<10}{'html':<10}{'filas':>6}{'consultas':>10}"
+                          f"{'plantilla':>11}{'layout':>10}{'pdf':>9}{'total':>10}{'rss KB':>10}{'KB':>9}")
+        for r in reporte['resultados']:
+            t = r['tiempos']
+            self.stdout.write(
+                f"{r['tipo']:<12}{r['escenario']:<10}{r['plantilla']:<10}{r['filas_hijas']:>6}{r['consultas']:>10}"
+                f"{t['plantilla']['mediana_ms']:>11}{t['layout']['mediana_ms']:>10}{t['pdf']['mediana_ms']:>9}"
+                f"{t['total']['mediana_ms']:>10}{r['rss_pico_kb']:>10}{r['pdf_bytes'] // 1024:>9}"
+            )
+
+        if reporte['comparacion']:
+            self.stdout.write('\nReducción con la plantilla de impresión (%, contra la pantalla de captura):')
+            self.stdout.write(f"{'tipo':<12}{'escenario':<10}{'html':>8}{'layout':>8}{'total':>8}{'pdf':>8}")
+            for c in reporte['comparacion']:
+                self.stdout.write(
+                    f"{c['tipo']:<12}{c['escenario']:<10}{c['html_bytes_pct']:>8}{c['layout_pct']:>8}"
+                    f"{c['total_pct']:>8}{c['pdf_bytes_pct']:>8}"
+                )
+
+        with open(options['salida'], 'w', encoding='utf-8') as archivo:
+            json.dump(reporte, archivo, indent=2, ensure_ascii=False)
+
+        self.stdout.write(self.style.SUCCESS(f"Reporte guardado en {options['salida']} (tiempos en ms, medianas)."))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from Sistema import pdf_lote
+
+
+class Command(BaseCommand):
+    help = 'Genera un ZIP con todos los PDF (asistencia, encuesta, inscripción) de un periodo.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('periodo', help='Periodo tal como se capturó en los formatos.')
+        parser.add_argument('--salida', help='Ruta del ZIP (default: pdfs_<periodo>.zip).')
+        parser.add_argument('--tipos', default=','.join(pdf_lote.TIPOS_PERIODO),
+                            help='Formatos a incluir separados por coma.')
+        parser.add_argument('--procesos', type=int, default=None,
+                            help='Procesos que renderizan en paralelo (default: PDF_LOTE_PROCESOS).')
+
+    def handle(self, *args, **options):
+        tipos = [t for t in options['tipos'].split(',') if t]
+        invalidos = [t for t in tipos if t not in pdf_lote.TIPOS_PERIODO]
+        if invalidos:
+            raise CommandError(f"Tipos no válidos: {', '.join(invalidos)}")
+
+        salida = options['salida'] or f"pdfs_{options['periodo']}.zip"
+        registros = pdf_lote.registros_periodo(options['periodo'], tipos)
+        with open(salida, 'wb') as archivo:
+            for parte in pdf_lote.zip_en_partes(registros, options['procesos']):
+                archivo.write(parte)
+
+        self.stdout.write(self.style.SUCCESS(f'ZIP generado: {salida}'))
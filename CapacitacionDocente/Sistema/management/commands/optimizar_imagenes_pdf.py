@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.test import override_settings
+
+from Sistema import pdf_imagenes
+from Sistema.pdf import PDF_CONFIG, construir_contexto, html_a_pdf
+from Sistema.pdf_benchmark import sembrar
+
+
+class Command(BaseCommand):
+    help = 'Genera en Sistema/img/pdf/ las imágenes a resolución de impresión que usan los PDF.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lado-max', type=int, default=None,
+                            help='Lado mayor en px de cada imagen (default: PDF_IMAGEN_LADO_MAX).')
+        parser.add_argument('--dpi', type=int, default=None,
+                            help='DPI que se anota en cada imagen (default: PDF_IMAGEN_DPI).')
+        parser.add_argument('--reporte', action='store_true',
+                            help='Genera además un PDF de prueba de cada formato con y sin optimizar y muestra el tamaño.')
+
+    def handle(self, *args, **options):
+        total_original = total_optimizado = 0
+        for nombre, original, optimizado in pdf_imagenes.optimizar_carpeta(options['lado_max'], options['dpi']):
+            total_original += original
+            total_optimizado += optimizado
+            self.stdout.write(f'{nombre:<28}{original // 1024:>8} KB ->{optimizado // 1024:>6} KB')
+        self.stdout.write(self.style.SUCCESS(
+            f'Imágenes: {total_original // 1024} KB -> {total_optimizado // 1024} KB en {pdf_imagenes.CARPETA_IMG_PDF}'
+        ))
+
+        if options['reporte']:
+            self._reporte()
+
+    def _reporte(self):
+        """Tamaño del PDF de cada formato (escenario 'tipico' del benchmark), sin dejar datos en la base."""
+        self.stdout.write(f"\n{'tipo':<12}{'original KB':>12}{'optimizado KB':>15}{'%':>7}")
+        with transaction.atomic():
+            for tipo in PDF_CONFIG:
+                registro, _ = sembrar(tipo, 'tipico')
+                html_string = render_to_string(PDF_CONFIG[tipo]['template'], construir_contexto(tipo, registro))
+                with override_settings(PDF_OPTIMIZAR=False):
+                    original = len(html_a_pdf(tipo, html_string))
+                with override_settings(PDF_OPTIMIZAR=True):
+                    optimizado = len(html_a_pdf(tipo, html_string))
+                ahorro = round(100 * (original - optimizado) / original, 1) if original else 0.0
+                self.stdout.write(f'{tipo:<12}{original / 1024:>12.1f}{optimizado / 1024:>15.1f}{ahorro:>7}')
+            transaction.set_rollback(True)
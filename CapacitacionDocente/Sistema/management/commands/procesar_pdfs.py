@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from Sistema import pdf_cola
+
+
+class Command(BaseCommand):
+    help = 'Procesa la cola de PDF asíncronos (TrabajoPDF) con un pool de procesos.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--procesos', type=int, default=2,
+                            help='Número de procesos que renderizan en paralelo (default: 2).')
+        parser.add_argument('--una-vez', action='store_true',
+                            help='Vacía la cola y termina, en lugar de quedarse esperando trabajos.')
+        parser.add_argument('--espera', type=float, default=1.0,
+                            help='Segundos entre revisiones de la cola cuando está vacía.')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Procesando cola de PDF con {options['procesos']} procesos...")
+        pdf_cola.ejecutar(
+            procesos=options['procesos'],
+            una_vez=options['una_vez'],
+            espera=options['espera'],
+        )
+        self.stdout.write(self.style.SUCCESS('Cola vacía.'))
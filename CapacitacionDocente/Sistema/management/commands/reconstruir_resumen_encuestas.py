@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from Sistema import estadisticas_encuestas
+from Sistema.models import ResumenEncuesta
+
+
+class Command(BaseCommand):
+    help = ('Recalcula desde cero el resumen de encuestas de las estadísticas '
+            '(por si se cargaron o borraron encuestas sin pasar por las señales).')
+
+    def handle(self, *args, **options):
+        estadisticas_encuestas.reconstruir_resumen()
+        self.stdout.write(self.style.SUCCESS(
+            f'Resumen reconstruido: {ResumenEncuesta.objects.count()} combinaciones de periodo, facilitador y curso.'
+        ))
@@ -0,0 +1,32 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from Sistema import pdf_lote
+
+
+class Command(BaseCommand):
+    help = 'Genera un solo PDF con todos los documentos de un tipo en el periodo (para imprimir).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('periodo', help='Periodo tal como se capturó en los formatos.')
+        parser.add_argument('--tipo', default='asistencia', choices=pdf_lote.TIPOS_PERIODO,
+                            help='Formato a unir (default: asistencia).')
+        parser.add_argument('--salida', help='Ruta del PDF (default: <tipo>_<periodo>.pdf).')
+
+    def handle(self, *args, **options):
+        salida = options['salida'] or f"{options['tipo']}_{options['periodo']}.pdf"
+        # WeasyPrint escribe directo al archivo (el PDF de un periodo completo no pasa por memoria);
+        # se usa un temporal para no dejar un PDF a medias ni pisar uno anterior si algo falla
+        temporal = f'{salida}.tmp'
+        try:
+            with open(temporal, 'wb') as archivo:
+                generado = pdf_lote.pdf_unido_periodo(options['periodo'], options['tipo'], archivo)
+            if generado is None:
+                raise CommandError('No hay documentos en ese periodo.')
+            os.replace(temporal, salida)
+        finally:
+            if os.path.exists(temporal):
+                os.remove(temporal)
+
+        self.stdout.write(self.style.SUCCESS(f'PDF generado: {salida}'))
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.8 on 2026-10-18 12:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Sistema', '0006_fecha_actualizacion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EnvioFormulario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.UUIDField(unique=True)),
+                ('tipo', models.CharField(max_length=20)),
+                ('objeto_id', models.IntegerField()),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Envío de formulario',
+                'verbose_name_plural': 'Envíos de formulario',
+            },
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.8 on 2026-10-18 12:55
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+PREGUNTAS = [f'q{i}' for i in range(1, 21)]
+
+
+def llenar_resumen(apps, schema_editor):
+    """Suma las encuestas que ya existían; de aquí en adelante lo mantienen las señales."""
+    EncuestaSatisfaccion = apps.get_model('Sistema', 'EncuestaSatisfaccion')
+    ResumenEncuesta = apps.get_model('Sistema', 'ResumenEncuesta')
+    filas = (
+        EncuestaSatisfaccion.objects.order_by()
+        .values('periodo', 'facilitador', 'nombre_curso')
+        .annotate(respuestas=Count('pk'), **{f'suma_{q}': Sum(q) for q in PREGUNTAS})
+    )
+    ResumenEncuesta.objects.bulk_create([ResumenEncuesta(**fila) for fila in filas])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Sistema', '0007_envioformulario'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenEncuesta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('periodo', models.CharField(max_length=100)),
+                ('facilitador', models.CharField(max_length=200)),
+                ('nombre_curso', models.CharField(max_length=200)),
+                ('respuestas', models.IntegerField(default=0)),
+                ('suma_q1', models.IntegerField(default=0)),
+                ('suma_q2', models.IntegerField(default=0)),
+                ('suma_q3', models.IntegerField(default=0)),
+                ('suma_q4', models.IntegerField(default=0)),
+                ('suma_q5', models.IntegerField(default=0)),
+                ('suma_q6', models.IntegerField(default=0)),
+                ('suma_q7', models.IntegerField(default=0)),
+                ('suma_q8', models.IntegerField(default=0)),
+                ('suma_q9', models.IntegerField(default=0)),
+                ('suma_q10', models.IntegerField(default=0)),
+                ('suma_q11', models.IntegerField(default=0)),
+                ('suma_q12', models.IntegerField(default=0)),
+                ('suma_q13', models.IntegerField(default=0)),
+                ('suma_q14', models.IntegerField(default=0)),
+                ('suma_q15', models.IntegerField(default=0)),
+                ('suma_q16', models.IntegerField(default=0)),
+                ('suma_q17', models.IntegerField(default=0)),
+                ('suma_q18', models.IntegerField(default=0)),
+                ('suma_q19', models.IntegerField(default=0)),
+                ('suma_q20', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Resumen de encuestas',
+                'verbose_name_plural': 'Resúmenes de encuestas',
+                'constraints': [models.UniqueConstraint(fields=('periodo', 'facilitador', 'nombre_curso'), name='resumen_encuesta_unico')],
+            },
+        ),
+        migrations.RunPython(llenar_resumen, migrations.RunPython.noop),
+    ]
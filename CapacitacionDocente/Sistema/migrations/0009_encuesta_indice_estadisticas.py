@@ -0,0 +1,17 @@
+# Generated by Django 5.2.8 on 2026-10-18 12:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Sistema', '0008_resumenencuesta'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='encuestasatisfaccion',
+            index=models.Index(fields=['periodo', 'facilitador'], name='Sistema_enc_periodo_851e5a_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:08
+
+from django.db import migrations, models
+
+
+def quitar_duplicados(apps, schema_editor):
+    """Antes de la restricción: de los trabajos vivos repetidos se queda el más reciente."""
+    TrabajoPDF = apps.get_model('Sistema', 'TrabajoPDF')
+    vistos = set()
+    repetidos = []
+    vivos = TrabajoPDF.objects.filter(estado__in=['pendiente', 'procesando']).order_by('-pk')
+    for pk, tipo, objeto_id in vivos.values_list('pk', 'tipo', 'objeto_id'):
+        if (tipo, objeto_id) in vistos:
+            repetidos.append(pk)
+        vistos.add((tipo, objeto_id))
+    TrabajoPDF.objects.filter(pk__in=repetidos).delete()
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Sistema', '0009_encuesta_indice_estadisticas'),
+    ]
+
+    operations = [
+        migrations.RunPython(quitar_duplicados, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='trabajopdf',
+            constraint=models.UniqueConstraint(condition=models.Q(('estado__in', ['pendiente', 'procesando'])), fields=('tipo', 'objeto_id'), name='trabajo_pdf_vivo_unico'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Sistema', '0010_trabajopdf_vivo_unico'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='trabajopdf',
+            name='trabajo_pdf_vivo_unico',
+        ),
+        migrations.AddField(
+            model_name='trabajopdf',
+            name='archivo',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='trabajopdf',
+            name='periodo',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='trabajopdf',
+            name='tipos',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='trabajopdf',
+            name='objeto_id',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddConstraint(
+            model_name='trabajopdf',
+            constraint=models.UniqueConstraint(condition=models.Q(('estado__in', ['pendiente', 'procesando'])), fields=('tipo', 'objeto_id', 'periodo', 'tipos'), name='trabajo_pdf_vivo_unico'),
+        ),
+    ]
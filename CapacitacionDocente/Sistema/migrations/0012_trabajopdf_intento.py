@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Sistema', '0011_trabajopdf_exportaciones'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trabajopdf',
+            name='intento',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -50,6 +50,7 @@ class Inscripcion(models.Model):
     jefe_inmediato = models.CharField(max_length=200)
     telefono = models.CharField(max_length=20)
     extension = models.CharField(max_length=10, blank=True, null=True)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.nombre_completo} - {self.nombre_curso}"
@@ -73,6 +74,7 @@ class FichaTecnica(models.Model):
 
     resultados = models.TextField()
     fuentes_informacion = models.TextField()
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.nombre_curso
@@ -96,6 +98,7 @@ class CriteriosSeleccion(models.Model):
 
     total_puntaje = models.IntegerField(default=0)
     aceptado = models.CharField(max_length=5, choices=[('si', 'Sí'), ('no', 'No')])
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"Evaluación de {self.nombre_instructor}"
@@ -137,6 +140,11 @@ class EncuestaSatisfaccion(models.Model):
     q20 = models.IntegerField()
 
     comentarios = models.TextField(blank=True, null=True)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        # Filtros de las estadísticas (por periodo y por periodo + facilitador)
+        indexes = [models.Index(fields=['periodo', 'facilitador'])]
 
 
 # =======================================================
@@ -150,6 +158,7 @@ class RegistroGeneral(models.Model):
     # Firmas (Pie de página)
     jefe_desarrollo = models.CharField(max_length=200, blank=True)
     subdirector = models.CharField(max_length=200, blank=True)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"Registro General - {self.periodo} ({self.fecha_creacion.strftime('%d/%m/%Y')})"
@@ -188,6 +197,7 @@ class ProgramaInstitucional(models.Model):
     aprobo_nombre = models.CharField(max_length=200)
     aprobo_fecha = models.DateField(null=True, blank=True)
     fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"Programa {self.periodo}"
@@ -239,6 +249,7 @@ class DiagnosticoNecesidades(models.Model):
 
     # Fecha de registro en sistema
     created_at = models.DateTimeField(auto_now_add=True)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"Diagnóstico {self.departamento_academico}"
@@ -302,6 +313,7 @@ class CurriculumVitae(models.Model):
     otros_institucion = models.CharField(max_length=200, blank=True)
     otros_titulacion = models.CharField(max_length=100, blank=True)
     otros_cedula = models.CharField(max_length=50, blank=True)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.nombre
@@ -365,6 +377,7 @@ class ListaAsistencia(models.Model):
     coordinador_curp = models.CharField(max_length=20, blank=True)
 
     fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"Lista: {self.nombre_curso} ({self.estado})"
@@ -408,4 +421,112 @@ class Profesor(models.Model):
     class Meta:
         verbose_name = "Profesor"
         verbose_name_plural = "Profesores"
-        ordering = ['apellido_paterno', 'apellido_materno']
\ No newline at end of file
+        ordering = ['apellido_paterno', 'apellido_materno']
+
+# =======================================================
+# 12. COLA DE GENERACIÓN DE PDF (Modo asíncrono)
+# =======================================================
+class TrabajoPDF(models.Model):
+    ESTADOS = [
+        ('pendiente', 'Pendiente'),
+        ('procesando', 'Procesando'),
+        ('listo', 'Listo'),
+        ('error', 'Error'),
+    ]
+    tipo = models.CharField(max_length=20)  # Clave de PDF_CONFIG, o de pdf_lote.EXPORTACIONES
+    objeto_id = models.IntegerField(default=0)  # 0 en las exportaciones de un periodo
+    estado = models.CharField(max_length=20, choices=ESTADOS, default='pendiente')
+    error = models.TextField(blank=True)
+    # Solo exportaciones: periodo, formatos que incluye (separados por coma) y archivo generado
+    periodo = models.CharField(max_length=100, blank=True)
+    tipos = models.CharField(max_length=100, blank=True)
+    archivo = models.CharField(max_length=255, blank=True)
+    # Cuántas veces se ha tomado: solo el último intento puede renovarlo, publicar y cerrarlo
+    intento = models.IntegerField(default=0)
+
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"PDF {self.tipo} #{self.objeto_id} ({self.estado})"
+
+    class Meta:
+        verbose_name = "Trabajo PDF"
+        verbose_name_plural = "Trabajos PDF"
+        indexes = [models.Index(fields=['estado', 'fecha_creacion'])]
+        # Un solo trabajo vivo por PDF: dos descargas a la vez no lo encolan dos veces
+        constraints = [
+            models.UniqueConstraint(
+                fields=['tipo', 'objeto_id', 'periodo', 'tipos'],
+                condition=models.Q(estado__in=['pendiente', 'procesando']),
+                name='trabajo_pdf_vivo_unico',
+            ),
+        ]
+
+
+# =======================================================
+# 13. ENVÍOS DE FORMULARIO (Doble clic en "Guardar")
+# =======================================================
+class EnvioFormulario(models.Model):
+    """Cada formulario pintado lleva un token; si el mismo token llega dos veces, se regresa lo ya creado."""
+    token = models.UUIDField(unique=True)
+    tipo = models.CharField(max_length=20)  # Clave de PDF_CONFIG
+    objeto_id = models.IntegerField()
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Envío {self.tipo} #{self.objeto_id}"
+
+    class Meta:
+        verbose_name = "Envío de formulario"
+        verbose_name_plural = "Envíos de formulario"
+
+
+# =======================================================
+# 14. RESUMEN DE ENCUESTAS (Estadísticas)
+# =======================================================
+class ResumenEncuesta(models.Model):
+    """
+    Sumas por pregunta de las encuestas de un (periodo, facilitador, curso).
+    Se actualiza cada vez que se guarda o borra una EncuestaSatisfaccion (ver estadisticas_encuestas.py);
+    el tablero lee de aquí en lugar de recorrer todas las encuestas.
+    """
+    periodo = models.CharField(max_length=100)
+    facilitador = models.CharField(max_length=200)
+    nombre_curso = models.CharField(max_length=200)
+
+    # Encuestas sumadas: las 20 preguntas son obligatorias, así que es el conteo de cada una
+    respuestas = models.IntegerField(default=0)
+
+    # Suma de las calificaciones (1 al 5) de cada pregunta
+    suma_q1 = models.IntegerField(default=0)
+    suma_q2 = models.IntegerField(default=0)
+    suma_q3 = models.IntegerField(default=0)
+    suma_q4 = models.IntegerField(default=0)
+    suma_q5 = models.IntegerField(default=0)
+    suma_q6 = models.IntegerField(default=0)
+    suma_q7 = models.IntegerField(default=0)
+    suma_q8 = models.IntegerField(default=0)
+    suma_q9 = models.IntegerField(default=0)
+    suma_q10 = models.IntegerField(default=0)
+    suma_q11 = models.IntegerField(default=0)
+    suma_q12 = models.IntegerField(default=0)
+    suma_q13 = models.IntegerField(default=0)
+    suma_q14 = models.IntegerField(default=0)
+    suma_q15 = models.IntegerField(default=0)
+    suma_q16 = models.IntegerField(default=0)
+    suma_q17 = models.IntegerField(default=0)
+    suma_q18 = models.IntegerField(default=0)
+    suma_q19 = models.IntegerField(default=0)
+    suma_q20 = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"Resumen {self.periodo} - {self.facilitador} - {self.nombre_curso} ({self.respuestas})"
+
+    class Meta:
+        verbose_name = "Resumen de encuestas"
+        verbose_name_plural = "Resúmenes de encuestas"
+        constraints = [
+            models.UniqueConstraint(fields=['periodo', 'facilitador', 'nombre_curso'], name='resumen_encuesta_unico'),
+        ]
+
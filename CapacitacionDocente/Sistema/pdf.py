@@ -0,0 +1,625 @@
+import hashlib
+import html
+import logging
+import mimetypes
+import os
+import re
+import tempfile
+import threading
+from urllib.parse import urljoin, urlsplit, unquote
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.exceptions import SuspiciousFileOperation
+from django.db.models import Prefetch, prefetch_related_objects
+from django.template.loader import get_template, render_to_string
+from django.utils._os import safe_join
+import weasyprint
+from weasyprint.text.fonts import FontConfiguration
+
+from . import pdf_aislado, pdf_cache
+from .pdf_imagenes import variante_pdf
+from .models import (
+    Inscripcion, FichaTecnica, CriteriosSeleccion, EncuestaSatisfaccion,
+    ProgramaInstitucional, DiagnosticoNecesidades, CurriculumVitae,
+    ListaAsistencia, RegistroGeneral
+)
+
+logger = logging.getLogger(__name__)
+
+# =======================================================
+# DICCIONARIO MAESTRO (CONFIGURACIÓN)
+# =======================================================
+# Aquí registras cada formato. Si creas uno nuevo, solo agregas una línea aquí.
+# 'template': plantilla solo de impresión (Sistema/pdf/), no la pantalla de captura.
+# 'css': hoja de estilos (ruta de static) que usa la plantilla.
+# 'tablas': tablas hijas que se imprimen, en el orden de la plantilla (ver tabla()).
+#   Si cambian sus filas, el PDF en caché deja de servir.
+def tabla(contexto, relacion, filas, filtro=None, columnas=None, hojas=False):
+    """
+    Una tabla hija del formato:
+      contexto -> nombre de la variable en la plantilla
+      relacion -> accessor inverso en el documento (ej. 'participantes', 'cvproductoacademico_set')
+      filas    -> filas que tiene la hoja impresa; se completan con vacías
+      filtro   -> {campo: valor} para repartir una misma relación en varias tablas
+      columnas -> {clave_plantilla: atributo o función(fila)}. Si se da, las filas se acomodan
+                  por no_consecutivo como dicts con 'counter'; si no, son los objetos o None.
+      hojas    -> si es True, la tabla no tiene tope: crece de hoja en hoja (de 'filas' en 'filas')
+                  y la plantilla recibe además '<contexto>_hojas' (ver dividir_en_hojas).
+    """
+    return {'contexto': contexto, 'relacion': relacion, 'filas': filas,
+            'filtro': filtro or {}, 'columnas': columnas, 'hojas': hojas}
+
+
+def _marca(campo):
+    return lambda fila: 'X' if getattr(fila, campo) else ''
+
+
+# Renglones de cada hoja impresa de la lista de asistencia; más participantes, más hojas
+PARTICIPANTES_POR_HOJA = 23
+
+COLUMNAS_ASISTENCIA = {c: c for c in [
+    'nombre', 'rfc', 'puesto', 'sexo', 'asist_l', 'asist_m1', 'asist_m2', 'asist_j', 'asist_v', 'concluyo',
+]}
+
+PDF_CONFIG = {
+    'inscripcion': {
+        'model': Inscripcion,
+        'template': 'Sistema/pdf/inscripcion.html',
+        'css': 'Sistema/css/pdf/pdf.css',
+        'tablas': [],
+    },
+    'ficha': {
+        'model': FichaTecnica,
+        'template': 'Sistema/pdf/ficha.html',
+        'css': 'Sistema/css/pdf/pdf.css',
+        'tablas': [],
+    },
+    'criterios': {
+        'model': CriteriosSeleccion,
+        'template': 'Sistema/pdf/criterios.html',
+        'css': 'Sistema/css/pdf/pdf.css',
+        'tablas': [],
+    },
+    'cv': {
+        'model': CurriculumVitae,
+        'template': 'Sistema/pdf/cv.html',
+        'css': 'Sistema/css/pdf/pdf.css',
+        'tablas': [
+            tabla('tabla_laboral', 'cvexperiencialaboral_set', 3),
+            tabla('tabla_docente', 'cvexperienciadocente_set', 3),
+            tabla('tabla_productos', 'cvproductoacademico_set', 3),
+            tabla('tabla_instructor', 'cvparticipacioninstructor_set', 3),
+        ],
+    },
+    'encuesta': {
+        'model': EncuestaSatisfaccion,
+        'template': 'Sistema/pdf/encuesta.html',
+        'css': 'Sistema/css/pdf/pdf.css',
+        'tablas': [],
+    },
+    'programa': {
+        'model': ProgramaInstitucional,
+        'template': 'Sistema/pdf/programa.html',
+        'css': 'Sistema/css/pdf/pdf.css',
+        'tablas': [
+            tabla('tabla_filas', 'detalles', 10, columnas={
+                'nombre_curso': 'nombre_curso', 'objetivo': 'objetivo', 'periodo': 'periodo_realizacion',
+                'lugar': 'lugar', 'horas': 'horas', 'instructor': 'instructor',
+                'dirigido': 'dirigido_a', 'observaciones': 'observaciones',
+            }),
+        ],
+    },
+    'diagnostico': {
+        'model': DiagnosticoNecesidades,
+        'template': 'Sistema/pdf/diagnostico.html',
+        'css': 'Sistema/css/pdf/pdf.css',
+        'tablas': [
+            tabla('tabla_a', 'asignaturas', 3, filtro={'tipo_tabla': 'generica'}),
+            tabla('tabla_b', 'asignaturas', 3, filtro={'tipo_tabla': 'especialidad'}),
+            tabla('tabla_c', 'actividades', 3, filtro={'tipo_tabla': 'docente'}),
+            tabla('tabla_d', 'actividades', 3, filtro={'tipo_tabla': 'profesional'}),
+        ],
+    },
+    'asistencia': {
+        'model': ListaAsistencia,
+        'template': 'Sistema/pdf/asistencia.html',
+        'css': 'Sistema/css/pdf/pdf.css',
+        'tablas': [
+            tabla('tabla_participantes', 'participantes', PARTICIPANTES_POR_HOJA,
+                  columnas=COLUMNAS_ASISTENCIA, hojas=True),
+        ],
+    },
+    'registro': {
+        'model': RegistroGeneral,
+        'template': 'Sistema/pdf/registro.html',
+        'css': 'Sistema/css/pdf/pdf.css',
+        'tablas': [
+            tabla('tabla_registros', 'filas', 15, columnas={
+                'instituto': 'instituto', 'nombre_curso': 'nombre_curso',
+                'es_formacion': _marca('es_formacion'), 'es_actualizacion': _marca('es_actualizacion'),
+                'instructor': 'instructor', 'fecha_inicio': 'fecha_inicio', 'fecha_termino': 'fecha_termino',
+                'horas': 'horas', 'modalidad': 'modalidad', 'inscritos': 'docentes_inscritos',
+                'terminaron': 'docentes_terminaron', 'acreditados': 'docentes_acreditados', 'tipo': 'tipo',
+            }),
+        ],
+    },
+}
+
+
+def campo_padre(modelo_hijo, modelo_padre):
+    """Nombre de la FK (attname, ej. 'lista_id') con la que una tabla hija apunta a su documento."""
+    for field in modelo_hijo._meta.concrete_fields:
+        if field.is_relation and field.related_model is modelo_padre:
+            return field.attname
+    raise ValueError(f'{modelo_hijo.__name__} no tiene FK hacia {modelo_padre.__name__}')
+
+
+# =======================================================
+# RECURSOS ESTÁTICOS PARA WEASYPRINT
+# =======================================================
+# URL base "ficticia" con la que se resuelven los {% static %} de las plantillas.
+# Nunca sale a la red: el fetcher de abajo la reconoce y lee el archivo del disco.
+BASE_URL_PDF = 'http://capacitacion.local/'
+_HOST_LOCAL = urlsplit(BASE_URL_PDF).netloc
+
+# Bytes de cada archivo ya leído: {ruta_absoluta: (mtime, bytes, mime_type)}
+_CACHE_RECURSOS = {}
+
+
+def _ruta_estatico(nombre):
+    """Ubica un archivo estático en STATIC_ROOT (producción) o con los finders (desarrollo)."""
+    static_root = getattr(settings, 'STATIC_ROOT', None)
+    try:
+        if static_root:
+            ruta = safe_join(static_root, nombre)
+            if os.path.isfile(ruta):
+                return ruta
+        return finders.find(nombre)
+    except SuspiciousFileOperation:
+        # Rutas con '..' que intentan salir de la carpeta de estáticos
+        return None
+
+
+def _leer_recurso(ruta):
+    """Devuelve (bytes, mime_type) del archivo, reutilizando la copia en memoria si no cambió."""
+    mtime = os.path.getmtime(ruta)
+    guardado = _CACHE_RECURSOS.get(ruta)
+    if guardado and guardado[0] == mtime:
+        return guardado[1], guardado[2]
+
+    with open(ruta, 'rb') as archivo:
+        contenido = archivo.read()
+    mime_type = mimetypes.guess_type(ruta)[0]
+    _CACHE_RECURSOS[ruta] = (mtime, contenido, mime_type)
+    return contenido, mime_type
+
+
+def _es_local(url):
+    return urlsplit(url).netloc == _HOST_LOCAL
+
+
+# Con el manifest de collectstatic (producción), {% static %} da nombres con hash:
+# 'Sistema/img/logo.3f2a9c.png'. Para buscar la variante de impresión hay que volver
+# al nombre original y de ahí al nombre con hash de la variante.
+_ORIGINALES = {'manifest': None, 'nombres': {}}  # {nombre con hash: nombre original}
+
+
+def _nombre_original(nombre):
+    """'Sistema/img/logo.3f2a9c.png' -> 'Sistema/img/logo.png' según el manifest; sin manifest, igual."""
+    guardados = getattr(staticfiles_storage, 'hashed_files', None)
+    if not guardados:
+        return nombre
+    if _ORIGINALES['manifest'] is not guardados:
+        _ORIGINALES['nombres'] = {guardado: original for original, guardado in guardados.items()}
+        _ORIGINALES['manifest'] = guardados
+    return _ORIGINALES['nombres'].get(nombre, nombre)
+
+
+def _nombre_guardado(nombre):
+    """Nombre con el que collectstatic guardó el archivo (con hash si hay manifest)."""
+    try:
+        return staticfiles_storage.stored_name(nombre)
+    except (AttributeError, ValueError):
+        # Storage sin manifest, o un archivo que no está en él
+        return nombre
+
+
+def _ruta_local(url):
+    """Archivo en disco al que apunta una URL local de STATIC_URL, o None si no existe."""
+    prefijo = '/' + settings.STATIC_URL.lstrip('/')
+    ruta_url = unquote(urlsplit(url).path)
+    if not ruta_url.startswith(prefijo):
+        return None
+    nombre = ruta_url[len(prefijo):]
+    if settings.PDF_OPTIMIZAR:
+        # La copia a resolución de impresión (img/pdf/), si ya se generó
+        variante = variante_pdf(_nombre_original(nombre))
+        ruta = _ruta_estatico(_nombre_guardado(variante)) if variante else None
+        if ruta:
+            return ruta
+    return _ruta_estatico(nombre)
+
+
+def url_fetcher_local(url, *args, **kwargs):
+    """
+    url_fetcher para WeasyPrint: los archivos de STATIC_URL se leen directo del disco
+    en lugar de pedírselos por HTTP a nuestro propio servidor. Solo las URLs realmente
+    externas (CDN, etc.) pasan al fetcher por defecto.
+    """
+    if not _es_local(url):
+        return weasyprint.default_url_fetcher(url, *args, **kwargs)
+
+    ruta = _ruta_local(url)
+    if not ruta:
+        raise ValueError(f'Archivo estático no encontrado: {url}')
+
+    contenido, mime_type = _leer_recurso(ruta)
+    return {'string': contenido, 'mime_type': mime_type, 'redirected_url': url}
+
+
+# =======================================================
+# HOJAS DE ESTILO COMPARTIDAS ENTRE VARIOS RENDERS
+# =======================================================
+_LINK_CSS = re.compile(r'<link\b[^>]*>', re.IGNORECASE)
+_ATRIBUTO = re.compile(r'([\w-]+)\s*=\s*(?:"([^"]*)"|\'([^\']*)\')')
+
+
+def separar_hojas(html_string):
+    """
+    Quita del HTML los <link rel="stylesheet"> y devuelve (html_sin_links, [urls absolutas en orden]).
+    Así WeasyPrint no vuelve a descargar ni parsear esas hojas: se le pasan ya parseadas.
+    """
+    urls = []
+
+    def quitar(match):
+        atributos = {m.group(1).lower(): m.group(2) if m.group(2) is not None else m.group(3)
+                     for m in _ATRIBUTO.finditer(match.group(0))}
+        if 'stylesheet' not in atributos.get('rel', '').lower().split() or not atributos.get('href'):
+            return match.group(0)
+        urls.append(urljoin(BASE_URL_PDF, html.unescape(atributos['href'])))
+        return ''
+
+    return _LINK_CSS.sub(quitar, html_string), urls
+
+
+class EstilosPDF:
+    """
+    CSS ya parseados y la FontConfiguration con la que se parsearon.
+    Todas las hojas se pasan a WeasyPrint en el mismo orden en que venían en el HTML,
+    así la cascada entre ellas no cambia. Una hoja local se vuelve a parsear si su
+    archivo cambió (mtime); las externas (CDN) se parsean una sola vez.
+    """
+
+    def __init__(self):
+        self.font_config = FontConfiguration()
+        self._hojas = {}  # {url: (mtime o None, weasyprint.CSS)}
+        # Los objetos de WeasyPrint no se deben usar desde dos hilos a la vez
+        self._lock = threading.Lock()
+
+    def hojas(self, urls):
+        hojas = []
+        for url in urls:
+            ruta = _ruta_local(url) if _es_local(url) else None
+            version = os.path.getmtime(ruta) if ruta else None
+            guardada = self._hojas.get(url)
+            if guardada is None or guardada[0] != version:
+                try:
+                    css = weasyprint.CSS(url=url, url_fetcher=url_fetcher_local, font_config=self.font_config)
+                except Exception as error:
+                    # Igual que WeasyPrint: una hoja que no carga no impide generar el PDF
+                    logger.warning('No se pudo cargar la hoja %s: %s', url, error)
+                    continue
+                guardada = self._hojas[url] = (version, css)
+            hojas.append(guardada[1])
+        return hojas
+
+    def render(self, html_string):
+        """Maqueta el HTML y devuelve el weasyprint.Document (sin escribir el PDF)."""
+        html_limpio, urls = separar_hojas(html_string)
+        with self._lock:
+            documento = weasyprint.HTML(string=html_limpio, base_url=BASE_URL_PDF, url_fetcher=url_fetcher_local)
+            return documento.render(font_config=self.font_config, stylesheets=self.hojas(urls))
+
+
+# Un EstilosPDF por formato de PDF_CONFIG que vive lo que dure el proceso:
+# el CSS y las fuentes se preparan en el primer PDF y los siguientes los reutilizan.
+_ESTILOS = {}
+_ESTILOS_LOCK = threading.Lock()
+
+
+def estilos_de(tipo):
+    with _ESTILOS_LOCK:
+        if tipo not in _ESTILOS:
+            _ESTILOS[tipo] = EstilosPDF()
+        return _ESTILOS[tipo]
+
+
+def opciones_pdf():
+    """
+    Opciones de write_pdf. Con PDF_OPTIMIZAR, WeasyPrint recomprime las imágenes a
+    PDF_IMAGEN_DPI y mete solo los glifos usados de cada fuente; sin él, los defaults de WeasyPrint.
+    """
+    if not settings.PDF_OPTIMIZAR:
+        return {}
+    return {
+        'optimize_images': True,
+        'dpi': settings.PDF_IMAGEN_DPI,
+        'jpeg_quality': settings.PDF_JPEG_CALIDAD,
+        'full_fonts': False,
+    }
+
+
+def html_a_pdf(tipo, html_string, destino=None):
+    """
+    Convierte el HTML ya renderizado en el PDF, con los estilos del formato.
+    Sin destino devuelve los bytes; con destino (ruta o archivo abierto) lo escribe ahí.
+    """
+    return estilos_de(tipo).render(html_string).write_pdf(destino, **opciones_pdf())
+
+
+# =======================================================
+# CARGA DE TABLAS HIJAS Y CONTEXTO DE CADA FORMATO
+# =======================================================
+def _relaciones(tipo):
+    """Relaciones (accessors inversos) distintas que usan las tablas del formato, en orden."""
+    return list(dict.fromkeys(t['relacion'] for t in PDF_CONFIG[tipo]['tablas']))
+
+
+def modelo_de_relacion(modelo, relacion):
+    for rel in modelo._meta.related_objects:
+        if rel.get_accessor_name() == relacion:
+            return rel.related_model
+    raise ValueError(f'{modelo.__name__} no tiene la relación {relacion}')
+
+
+def modelos_hijos(tipo):
+    """Modelos de las tablas hijas del formato (para señales y huellas)."""
+    modelo = PDF_CONFIG[tipo]['model']
+    return [modelo_de_relacion(modelo, relacion) for relacion in _relaciones(tipo)]
+
+
+def presupuesto_consultas(tipo):
+    """
+    Consultas que cuesta cargar todas las tablas hijas de uno o muchos documentos:
+    una por relación, sin importar cuántas tablas o filas haya.
+    """
+    return len(_relaciones(tipo))
+
+
+def cargar_hijos(tipo, registros):
+    """
+    Trae de una vez (prefetch) las filas hijas de los documentos. Las tablas que comparten
+    relación (ej. diagnóstico a/b) salen de la misma consulta y se separan en memoria.
+    Si ya estaban cargadas no se vuelven a consultar.
+    """
+    modelo = PDF_CONFIG[tipo]['model']
+    prefetch_related_objects(list(registros), *[
+        Prefetch(relacion, queryset=modelo_de_relacion(modelo, relacion).objects.order_by('pk'))
+        for relacion in _relaciones(tipo)
+    ])
+
+
+def _filas_de(tabla, registro, items=None):
+    """Filas de una tabla ya rellenas hasta su tamaño. Sin registro ni items, todas vacías."""
+    if items is None:
+        items = list(getattr(registro, tabla['relacion']).all()) if registro is not None else []
+    if tabla['filtro']:
+        items = [i for i in items if all(getattr(i, c) == v for c, v in tabla['filtro'].items())]
+
+    total = tabla['filas']
+    if tabla['columnas'] is None:
+        if tabla['hojas']:
+            total = filas_en_hojas(len(items), tabla['filas'])
+        while len(items) < total: items.append(None)
+        return items
+
+    por_numero = {i.no_consecutivo: i for i in items}
+    if tabla['hojas']:
+        total = filas_en_hojas(max(por_numero, default=0), tabla['filas'])
+    filas = []
+    for n in range(1, total + 1):
+        item = por_numero.get(n)
+        fila = {'counter': n}
+        for clave, origen in tabla['columnas'].items():
+            if item is None:
+                fila[clave] = ''
+            else:
+                fila[clave] = origen(item) if callable(origen) else getattr(item, origen)
+        filas.append(fila)
+    return filas
+
+
+def filas_en_hojas(ocupadas, por_hoja):
+    """Filas de las hojas completas que hacen falta para 'ocupadas' filas (al menos una hoja)."""
+    return max(1, -(-ocupadas // por_hoja)) * por_hoja
+
+
+def dividir_en_hojas(filas, por_hoja):
+    """[{'numero', 'total', 'filas'}] con las filas repartidas en hojas de por_hoja renglones."""
+    partes = [filas[i:i + por_hoja] for i in range(0, len(filas), por_hoja)] or [[]]
+    return [{'numero': n, 'total': len(partes), 'filas': parte} for n, parte in enumerate(partes, 1)]
+
+
+def tablas_hijas(tipo, registro=None, capturadas=None):
+    """
+    {variable de la plantilla: filas} de todas las tablas del formato.
+    capturadas={relación: [filas sin guardar]} pinta esas filas en lugar de las de la base
+    (un POST rechazado vuelve a la pantalla con lo que se había escrito).
+    """
+    capturadas = capturadas or {}
+    if registro is not None and not all(t['relacion'] in capturadas for t in PDF_CONFIG[tipo]['tablas']):
+        cargar_hijos(tipo, [registro])
+    context = {}
+    for t in PDF_CONFIG[tipo]['tablas']:
+        context[t['contexto']] = _filas_de(t, registro, capturadas.get(t['relacion']))
+        if t['hojas']:
+            context[t['contexto'] + '_hojas'] = dividir_en_hojas(context[t['contexto']], t['filas'])
+    return context
+
+
+def max_participantes():
+    """Tope de participantes de una lista: ASISTENCIA_MAX_HOJAS hojas de 23."""
+    return settings.ASISTENCIA_MAX_HOJAS * PARTICIPANTES_POR_HOJA
+
+
+def tablas_asistencia(lista, capturadas=None):
+    """Las tablas de la pantalla de asistencia: las mismas hojas de 23 que se imprimen en el PDF."""
+    tablas = tablas_hijas('asistencia', lista, capturadas)
+    return {
+        'tabla_participantes': tablas['tabla_participantes'],
+        'hojas_participantes': tablas['tabla_participantes_hojas'],
+        'participantes_por_hoja': PARTICIPANTES_POR_HOJA,
+        'max_participantes': max_participantes(),
+    }
+
+
+def construir_contexto(tipo, registro):
+    """Arma el contexto de la plantilla: el registro ya guardado y las tablas hijas con sus filas vacías."""
+    context = {'registro': registro}
+    context.update(tablas_hijas(tipo, registro))
+    return context
+
+
+# =======================================================
+# HUELLAS PARA LA CACHÉ
+# =======================================================
+def _valores(obj):
+    return tuple(getattr(obj, f.attname) for f in obj._meta.concrete_fields)
+
+
+def huella_registro(tipo, registro):
+    """Hash de los datos del documento y de todas sus filas hijas (sin renderizar nada)."""
+    h = hashlib.sha256(repr(_valores(registro)).encode())
+    # Las mismas filas precargadas que después usa construir_contexto
+    cargar_hijos(tipo, [registro])
+    for relacion in _relaciones(tipo):
+        h.update(repr([_valores(fila) for fila in getattr(registro, relacion).all()]).encode())
+    return h.hexdigest()
+
+
+# Las extienden o incluyen todas las plantillas de Sistema/pdf/
+PLANTILLAS_COMUNES = ['Sistema/pdf/base.html', 'Sistema/pdf/cintilla.html']
+
+
+def huella_plantilla(tipo):
+    """Hash del HTML de la plantilla y de su CSS: si alguien los edita, los PDF viejos ya no aplican."""
+    config = PDF_CONFIG[tipo]
+    h = hashlib.sha256()
+    for plantilla in [config['template']] + PLANTILLAS_COMUNES:
+        h.update(_leer_recurso(get_template(plantilla).origin.name)[0])
+    ruta_css = _ruta_estatico(config['css'])
+    if ruta_css:
+        h.update(_leer_recurso(ruta_css)[0])
+    # Otras opciones de tamaño dan otro PDF
+    h.update(repr(sorted(opciones_pdf().items())).encode())
+    return h.hexdigest()
+
+
+def etag_pdf(tipo, registro):
+    """
+    ETag del PDF sin renderizar ni leer las filas hijas: sale de fecha_actualizacion
+    (que las señales mueven también cuando cambia una fila hija) y de la plantilla.
+    """
+    version = f'{tipo}:{registro.pk}:{registro.fecha_actualizacion.isoformat()}:{huella_plantilla(tipo)}'
+    return 'W/"%s"' % hashlib.sha256(version.encode()).hexdigest()[:32]
+
+
+def clave_cache(tipo, registro):
+    return hashlib.sha256(
+        f'{tipo}:{registro.pk}:{huella_registro(tipo, registro)}:{huella_plantilla(tipo)}'.encode()
+    ).hexdigest()
+
+
+# =======================================================
+# GENERACIÓN
+# =======================================================
+def _escribir_pdf(tipo, registro, aislado, destino):
+    """Renderiza el PDF del registro y lo escribe en destino (ruta o archivo abierto)."""
+    html_string = render_to_string(PDF_CONFIG[tipo]['template'], construir_contexto(tipo, registro))
+    # Los logos y CSS se leen del disco (ver url_fetcher_local), no por HTTP
+    if aislado and pdf_aislado.activo():
+        pdf_aislado.html_a_pdf(tipo, html_string, destino)
+    else:
+        html_a_pdf(tipo, html_string, destino)
+
+
+def archivo_pdf(tipo, registro, aislado=False):
+    """
+    Devuelve (archivo abierto en 'rb', ruta en caché o None) con el PDF del registro.
+    El PDF nunca se arma completo en memoria: WeasyPrint lo escribe en la caché de disco
+    (o, sin caché, en un SpooledTemporaryFile que pasa a disco si crece) y de ahí se envía.
+    aislado=True (procesos web): la maquetación corre en pdf_aislado, con límites de tiempo y
+    memoria; si se pasa, lanza pdf_aislado.PDFNoDisponible.
+    """
+    clave = clave_cache(tipo, registro)
+    abierto = pdf_cache.abrir(tipo, registro.pk, clave)
+    if abierto is not None:
+        return abierto
+
+    if pdf_cache.activa():
+        ruta_temporal = pdf_cache.temporal(tipo, registro.pk)
+        try:
+            _escribir_pdf(tipo, registro, aislado, ruta_temporal)
+            # Se abre antes de publicarlo: si la limpieza LRU lo borra, el envío no se corta
+            archivo = open(ruta_temporal, 'rb')
+            return archivo, pdf_cache.publicar(tipo, registro.pk, clave, ruta_temporal)
+        except BaseException:
+            if os.path.exists(ruta_temporal):
+                os.remove(ruta_temporal)
+            raise
+
+    if aislado and pdf_aislado.activo():
+        # El proceso aislado necesita una ruta; el archivo se borra en cuanto lo abrimos
+        fd, ruta_temporal = tempfile.mkstemp(suffix='.pdf')
+        os.close(fd)
+        try:
+            _escribir_pdf(tipo, registro, aislado, ruta_temporal)
+            return open(ruta_temporal, 'rb'), None
+        finally:
+            os.remove(ruta_temporal)
+
+    archivo = tempfile.SpooledTemporaryFile(max_size=settings.PDF_SPOOL_MAX_BYTES)
+    _escribir_pdf(tipo, registro, aislado, archivo)
+    archivo.seek(0)
+    return archivo, None
+
+
+def generar_pdf(tipo, registro, aislado=False):
+    """Devuelve los bytes del PDF del registro, desde la caché en disco si ya se había generado."""
+    archivo, _ = archivo_pdf(tipo, registro, aislado)
+    with archivo:
+        return archivo.read()
+
+
+def pdf_en_cache(tipo, registro):
+    """True si el PDF vigente del registro ya está en la caché de disco."""
+    return pdf_cache.existe(tipo, registro.pk, clave_cache(tipo, registro))
+
+
+def pdf_desde_cache(tipo, registro):
+    """Bytes del PDF vigente si ya está en caché, o None (no renderiza)."""
+    return pdf_cache.leer(tipo, registro.pk, clave_cache(tipo, registro))
+
+
+def pdf_unido(tipo, registros, destino=None):
+    """
+    Un solo PDF con las páginas de todos los registros, uno tras otro.
+    Las hojas de estilo y las fuentes se preparan una vez para todo el lote.
+    Con destino (archivo abierto) el PDF se escribe ahí y devuelve True. None si no hay registros.
+    """
+    estilos = estilos_de(tipo)
+    plantilla = PDF_CONFIG[tipo]['template']
+    registros = list(registros)
+    # Las filas hijas de todo el lote en una consulta por relación
+    cargar_hijos(tipo, registros)
+    documentos = [
+        estilos.render(render_to_string(plantilla, construir_contexto(tipo, registro)))
+        for registro in registros
+    ]
+    if not documentos:
+        return None
+    paginas = [pagina for documento in documentos for pagina in documento.pages]
+    pdf_file = documentos[0].copy(paginas).write_pdf(destino, **opciones_pdf())
+    return pdf_file if destino is None else True
@@ -0,0 +1,173 @@
+import multiprocessing
+import resource
+import threading
+import time
+import traceback
+
+from django.conf import settings
+
+# =======================================================
+# RENDER AISLADO (PROCESOS SUPERVISADOS)
+# =======================================================
+# La maquetación de WeasyPrint corre en procesos aparte, con límite de memoria
+# (RLIMIT_AS) y de tiempo. Un registro patológico (textos enormes) solo tumba a
+# ese proceso; el worker web recibe PDFNoDisponible y responde 503.
+# Cada proceso atiende un PDF a la vez por su propio Pipe: si uno se pasa de tiempo
+# se termina solo ese, y los demás PDF en curso siguen. Los procesos se crean al
+# primer PDF que los necesita y se reciclan tras PDF_AISLADO_RENDERS PDF para no
+# arrastrar fragmentación.
+
+
+class PDFNoDisponible(Exception):
+    """El PDF no se pudo generar dentro de los límites de tiempo o memoria."""
+
+
+def activo():
+    return settings.PDF_AISLADO_PROCESOS > 0
+
+
+def _iniciar_proceso(limite_bytes):
+    if limite_bytes:
+        resource.setrlimit(resource.RLIMIT_AS, (limite_bytes, limite_bytes))
+    # Proceso nuevo ('spawn'): hay que cargar Django antes de importar plantillas o modelos
+    import django
+    django.setup()
+
+
+def _atender(conexion, limite_bytes, renders):
+    """
+    Corre dentro del proceso aislado: recibe (función, args) y responde ('ok', resultado),
+    ('memoria', None) o ('error', excepción). Termina tras `renders` tareas (0 = sin límite).
+    """
+    _iniciar_proceso(limite_bytes)
+    atendidas = 0
+    while not renders or atendidas < renders:
+        try:
+            funcion, args = conexion.recv()
+        except EOFError:
+            return  # El worker web cerró la conexión
+        try:
+            respuesta = ('ok', funcion(*args))
+        except MemoryError:
+            respuesta = ('memoria', None)
+        except Exception as error:
+            respuesta = ('error', error)
+        try:
+            conexion.send(respuesta)
+        except Exception:
+            # La excepción no se pudo serializar: se manda su traceback como texto
+            conexion.send(('error', RuntimeError(traceback.format_exc())))
+        atendidas += 1
+
+
+def _convertir(tipo, html_string, destino=None):
+    """Corre dentro del proceso aislado: solo HTML -> PDF, sin tocar la base de datos."""
+    from .pdf import html_a_pdf
+    return html_a_pdf(tipo, html_string, destino)
+
+
+class _Proceso:
+    """Un proceso de render y el extremo de su Pipe que usa el worker web."""
+
+    def __init__(self):
+        contexto = multiprocessing.get_context('spawn')
+        self.conexion, extremo_hijo = contexto.Pipe()
+        self.proceso = contexto.Process(
+            target=_atender, daemon=True,
+            args=(extremo_hijo, settings.PDF_AISLADO_MEMORIA_MB * 1024 * 1024, settings.PDF_AISLADO_RENDERS),
+        )
+        self.proceso.start()
+        extremo_hijo.close()
+        self.atendidas = 0
+
+    def reutilizable(self):
+        return self.proceso.is_alive() and (
+            not settings.PDF_AISLADO_RENDERS or self.atendidas < settings.PDF_AISLADO_RENDERS
+        )
+
+    def terminar(self):
+        self.conexion.close()
+        if self.proceso.is_alive():
+            self.proceso.terminate()
+        self.proceso.join(timeout=5)
+
+
+# Procesos sin trabajo, listos para el siguiente PDF, y cuántos están ocupados
+_LIBRES = []
+_ESTADO = {'ocupados': 0}
+_CONDICION = threading.Condition()
+
+
+def _tomar(espera):
+    """Un proceso para este PDF: uno libre o uno nuevo, sin pasar de PDF_AISLADO_PROCESOS a la vez."""
+    with _CONDICION:
+        if not _CONDICION.wait_for(lambda: _ESTADO['ocupados'] < settings.PDF_AISLADO_PROCESOS, espera):
+            raise PDFNoDisponible('no hubo un proceso de render libre a tiempo')
+        _ESTADO['ocupados'] += 1
+        proceso = _LIBRES.pop() if _LIBRES else None
+    if proceso is not None:
+        return proceso
+    try:
+        return _Proceso()
+    except BaseException:
+        _soltar(None)
+        raise
+
+
+def _soltar(proceso):
+    with _CONDICION:
+        _ESTADO['ocupados'] -= 1
+        if proceso is not None:
+            if proceso.reutilizable():
+                _LIBRES.append(proceso)
+            else:
+                proceso.terminar()
+        _CONDICION.notify()
+
+
+def cerrar():
+    """Termina los procesos libres (los ocupados terminan al soltarse si ya no sirven)."""
+    with _CONDICION:
+        while _LIBRES:
+            _LIBRES.pop().terminar()
+
+
+def ejecutar(funcion, *args, timeout=None):
+    """
+    Corre funcion(*args) en un proceso aislado y devuelve su resultado.
+    Si se pasa de `timeout` (default PDF_AISLADO_TIMEOUT) o el proceso muere, se termina
+    solo ese proceso y se lanza PDFNoDisponible. La función debe poder importarse (spawn).
+    """
+    timeout = timeout or settings.PDF_AISLADO_TIMEOUT
+    limite = time.monotonic() + timeout
+    proceso = _tomar(timeout)
+    try:
+        proceso.conexion.send((funcion, args))
+        if not proceso.conexion.poll(max(limite - time.monotonic(), 0)):
+            proceso.terminar()
+            raise PDFNoDisponible(f'se pasó de {timeout} s')
+        estado, valor = proceso.conexion.recv()
+        proceso.atendidas += 1
+    except (EOFError, OSError):
+        # El proceso murió (por ejemplo, el sistema lo mató por memoria)
+        proceso.terminar()
+        raise PDFNoDisponible('el proceso de render terminó inesperadamente')
+    finally:
+        _soltar(proceso)
+
+    if estado == 'memoria':
+        raise PDFNoDisponible(f'se pasó de {settings.PDF_AISLADO_MEMORIA_MB} MB')
+    if estado == 'error':
+        raise valor
+    return valor
+
+
+def html_a_pdf(tipo, html_string, destino=None):
+    """
+    Como pdf.html_a_pdf, pero en un proceso aislado. Lanza PDFNoDisponible si se pasa de los límites.
+    destino es una ruta: el proceso escribe ahí el PDF y los bytes no pasan por este worker.
+    """
+    try:
+        return ejecutar(_convertir, tipo, html_string, destino)
+    except PDFNoDisponible as error:
+        raise PDFNoDisponible(f'{tipo}: {error}') from None
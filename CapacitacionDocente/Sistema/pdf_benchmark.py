@@ -0,0 +1,282 @@
+import datetime
+import platform
+import resource
+import statistics
+import time
+import tracemalloc
+
+import django
+from django.db import connection, models, transaction
+from django.template.loader import render_to_string
+from django.test.utils import CaptureQueriesContext
+import weasyprint
+
+from .forms import (
+    InscripcionForm, ListaAsistenciaForm, CriteriosSeleccionForm,
+    CurriculumVitaeForm, DiagnosticoNecesidadesForm, EncuestaSatisfaccionForm,
+    FichaTecnicaForm, ProgramaInstitucionalForm
+)
+from .pdf import (
+    PDF_CONFIG, EstilosPDF, campo_padre, construir_contexto, estilos_de, modelo_de_relacion, opciones_pdf,
+    tablas_asistencia, tablas_hijas,
+)
+
+# =======================================================
+# BENCHMARK DE GENERACIÓN DE PDF
+# =======================================================
+# Crea registros de prueba para cada formato de PDF_CONFIG dentro de una transacción
+# que se revierte al final (no deja nada en la base), y mide por separado cada fase:
+#   contexto -> consultas y armado del diccionario de la plantilla
+#   plantilla -> render_to_string del HTML
+#   layout -> maquetación de WeasyPrint (HTML + CSS -> páginas)
+#   pdf -> escritura de los bytes del PDF
+
+# 'maximo' llena cada tabla hija hasta lo que cabe en la hoja impresa; 'tipico', la mitad.
+ESCENARIOS = ['vacio', 'tipico', 'maximo']
+
+# Con --comparar se mide también la pantalla de captura de cada formato, que es lo que
+# se mandaba a WeasyPrint antes de las plantillas de Sistema/pdf/: {tipo: (plantilla, form)}
+PLANTILLAS_WEB = {
+    'inscripcion': ('Sistema/inscripcion/inscripcion.html', InscripcionForm),
+    'ficha': ('Sistema/ficha/ficha.html', FichaTecnicaForm),
+    'criterios': ('Sistema/criterios/criterios.html', CriteriosSeleccionForm),
+    'cv': ('Sistema/cv/cv.html', CurriculumVitaeForm),
+    'encuesta': ('Sistema/encuesta/encuesta.html', EncuestaSatisfaccionForm),
+    'programa': ('Sistema/programa/programa.html', ProgramaInstitucionalForm),
+    'diagnostico': ('Sistema/diagnostico/diagnostico.html', DiagnosticoNecesidadesForm),
+    'asistencia': ('Sistema/asistencia/asistencia.html', ListaAsistenciaForm),
+    'registro': ('Sistema/registro/registro.html', None),
+}
+# Estilos aparte para las plantillas web, para no mezclar sus hojas con las de impresión
+_ESTILOS_WEB = {}
+
+_TEXTO = ('Curso de actualización docente en estrategias de enseñanza y evaluación '
+          'por competencias para el Instituto Tecnológico. ')
+
+
+def _filas(tabla, escenario):
+    if escenario == 'vacio':
+        return 0
+    if escenario == 'tipico':
+        return max(1, tabla['filas'] // 2)
+    return tabla['filas']
+
+
+def _valor(field, escenario, i):
+    """Valor de prueba para un campo según su tipo. En 'maximo' los textos llenan el campo."""
+    if field.choices:
+        opciones = [valor for valor, _ in field.flatchoices]
+        return opciones[i % len(opciones)]
+    if isinstance(field, models.BooleanField):
+        return escenario != 'vacio'
+    if isinstance(field, models.IntegerField):
+        return None if escenario == 'vacio' and field.null else 5 + i
+    if isinstance(field, models.DateTimeField):
+        return datetime.datetime.now(datetime.timezone.utc)
+    if isinstance(field, models.DateField):
+        return None if escenario == 'vacio' and field.null else datetime.date.today()
+    if isinstance(field, models.EmailField):
+        return '' if escenario == 'vacio' else f'docente{i}@reynosa.tecnm.mx'
+    if isinstance(field, (models.CharField, models.TextField)):
+        if escenario == 'vacio':
+            return None if field.null else ''
+        if escenario == 'maximo':
+            largo = field.max_length or len(_TEXTO) * 6
+        else:
+            largo = min(field.max_length or 80, 30)
+        return (_TEXTO * (largo // len(_TEXTO) + 1))[:largo]
+    return field.get_default()
+
+
+def _crear(modelo, escenario, i=0, **fijos):
+    datos = {}
+    for field in modelo._meta.concrete_fields:
+        if field.primary_key or field.is_relation or getattr(field, 'auto_now', False) \
+                or getattr(field, 'auto_now_add', False):
+            continue
+        datos[field.attname] = _valor(field, escenario, i)
+    datos.update(fijos)
+    return modelo.objects.create(**datos)
+
+
+def sembrar(tipo, escenario):
+    """Crea el documento y sus filas hijas para el escenario. Devuelve (registro, filas creadas)."""
+    config = PDF_CONFIG[tipo]
+    registro = _crear(config['model'], escenario)
+    creadas = 0
+    for tabla in config['tablas']:
+        modelo = modelo_de_relacion(config['model'], tabla['relacion'])
+        campos = {f.name for f in modelo._meta.concrete_fields}
+        for i in range(1, _filas(tabla, escenario) + 1):
+            fijos = {campo_padre(modelo, config['model']): registro.pk, **tabla['filtro']}
+            if 'no_consecutivo' in campos:
+                fijos['no_consecutivo'] = i
+            _crear(modelo, escenario, i, **fijos)
+            creadas += 1
+    return registro, creadas
+
+
+def _rss_pico_kb():
+    """Pico de memoria residente del proceso (VmHWM) en KB."""
+    try:
+        with open('/proc/self/status') as status:
+            for linea in status:
+                if linea.startswith('VmHWM:'):
+                    return int(linea.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _reiniciar_rss_pico():
+    """Reinicia VmHWM para medir el pico de una sola generación (Linux). False si no se puede."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _contexto_web(tipo, registro):
+    """El contexto con el que se imprimía la pantalla de captura: el form del encabezado y las tablas."""
+    form = PLANTILLAS_WEB[tipo][1]
+    context = {'form': form(instance=registro) if form else None}
+    if tipo == 'asistencia':
+        # La pantalla de asistencia pinta sus hojas de 23 con las mismas variables que le pasa la vista
+        context.update(tablas_asistencia(registro))
+    else:
+        context.update(tablas_hijas(tipo, registro))
+    return context
+
+
+def _generar(tipo, registro, web=False):
+    """Genera un PDF midiendo cada fase. Devuelve (tiempos en segundos, consultas, páginas, tamaño del HTML, pdf)."""
+    if web:
+        estilos = _ESTILOS_WEB.setdefault(tipo, EstilosPDF())
+        plantilla, armar_contexto = PLANTILLAS_WEB[tipo][0], _contexto_web
+    else:
+        estilos = estilos_de(tipo)
+        plantilla, armar_contexto = PDF_CONFIG[tipo]['template'], construir_contexto
+    tiempos = {}
+    # Instancia nueva en cada muestra: las filas precargadas se quedan en el objeto
+    registro = PDF_CONFIG[tipo]['model'].objects.get(pk=registro.pk)
+
+    inicio = time.perf_counter()
+    with CaptureQueriesContext(connection) as consultas:
+        context = armar_contexto(tipo, registro)
+    tiempos['contexto'] = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    html_string = render_to_string(plantilla, context)
+    tiempos['plantilla'] = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    documento = estilos.render(html_string)
+    tiempos['layout'] = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    pdf_file = documento.write_pdf(**opciones_pdf())
+    tiempos['pdf'] = time.perf_counter() - inicio
+
+    return tiempos, len(consultas), len(documento.pages), len(html_string), pdf_file
+
+
+def _resumen(valores):
+    return {
+        'min_ms': round(min(valores) * 1000, 2),
+        'mediana_ms': round(statistics.median(valores) * 1000, 2),
+        'max_ms': round(max(valores) * 1000, 2),
+    }
+
+
+def medir(tipo, escenario, repeticiones=5, web=False):
+    """
+    Mide un escenario de un formato. Los datos sembrados se revierten al terminar.
+    web=True mide la pantalla de captura (PLANTILLAS_WEB) en lugar de la plantilla de impresión.
+    """
+    with transaction.atomic():
+        registro, filas = sembrar(tipo, escenario)
+
+        # La primera generación del proceso paga el parseo del CSS y las fuentes
+        inicio = time.perf_counter()
+        _generar(tipo, registro, web)
+        primera = time.perf_counter() - inicio
+
+        muestras = {'contexto': [], 'plantilla': [], 'layout': [], 'pdf': [], 'total': []}
+        pico_rss = 0
+        for _ in range(repeticiones):
+            rss_reiniciado = _reiniciar_rss_pico()
+            tiempos, consultas, paginas, bytes_html, pdf_file = _generar(tipo, registro, web)
+            pico_rss = max(pico_rss, _rss_pico_kb())
+            for fase, segundos in tiempos.items():
+                muestras[fase].append(segundos)
+            muestras['total'].append(sum(tiempos.values()))
+
+        # tracemalloc hace lento todo lo demás: va en una pasada aparte, sin cronometrar
+        tracemalloc.start()
+        _generar(tipo, registro, web)
+        _, pico_python = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        transaction.set_rollback(True)
+
+    return {
+        'tipo': tipo,
+        'escenario': escenario,
+        'plantilla': 'web' if web else 'impresion',
+        'filas_hijas': filas,
+        'consultas': consultas,
+        'paginas': paginas,
+        'html_bytes': bytes_html,
+        'pdf_bytes': len(pdf_file),
+        'primera_ms': round(primera * 1000, 2),
+        'tiempos': {fase: _resumen(valores) for fase, valores in muestras.items()},
+        # Si no se pudo reiniciar VmHWM, el pico es el del proceso completo hasta ese momento
+        'rss_pico_kb': pico_rss,
+        'rss_pico_por_generacion': rss_reiniciado,
+        'tracemalloc_pico_kb': round(pico_python / 1024, 1),
+    }
+
+
+def _reduccion(antes, despues):
+    return round(100 * (antes - despues) / antes, 1) if antes else 0.0
+
+
+def comparacion(web, impresion):
+    """Cuánto bajan (en %) el HTML, la maquetación, el total y el PDF con la plantilla de impresión."""
+    return {
+        'tipo': impresion['tipo'],
+        'escenario': impresion['escenario'],
+        'html_bytes_pct': _reduccion(web['html_bytes'], impresion['html_bytes']),
+        'layout_pct': _reduccion(web['tiempos']['layout']['mediana_ms'], impresion['tiempos']['layout']['mediana_ms']),
+        'total_pct': _reduccion(web['tiempos']['total']['mediana_ms'], impresion['tiempos']['total']['mediana_ms']),
+        'pdf_bytes_pct': _reduccion(web['pdf_bytes'], impresion['pdf_bytes']),
+    }
+
+
+def ejecutar(tipos=None, escenarios=None, repeticiones=5, comparar=False):
+    """
+    Corre el benchmark completo y devuelve el reporte (listo para json.dump).
+    comparar=True mide además las pantallas de captura y agrega 'comparacion' (reducción en %).
+    """
+    resultados = []
+    comparaciones = []
+    for tipo in tipos or PDF_CONFIG:
+        for escenario in escenarios or ESCENARIOS:
+            impresion = medir(tipo, escenario, repeticiones)
+            resultados.append(impresion)
+            if comparar:
+                web = medir(tipo, escenario, repeticiones, web=True)
+                resultados.append(web)
+                comparaciones.append(comparacion(web, impresion))
+    return {
+        'fecha': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'weasyprint': getattr(weasyprint, '__version__', ''),
+        'base_datos': connection.vendor,
+        'repeticiones': repeticiones,
+        'resultados': resultados,
+        'comparacion': comparaciones,
+    }
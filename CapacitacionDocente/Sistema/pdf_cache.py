@@ -0,0 +1,163 @@
+import os
+import shutil
+import tempfile
+import threading
+
+from django.conf import settings
+
+# =======================================================
+# CACHÉ EN DISCO DE LOS PDF GENERADOS
+# =======================================================
+# Estructura: PDF_CACHE_DIR/<tipo>/<pk>/<clave>.pdf
+# Los PDF a medio escribir van en PDF_CACHE_DIR/.tmp: fuera de la carpeta del registro,
+# para que invalidar() no los borre mientras se generan.
+# La <clave> es el hash del registro + filas hijas + plantilla + CSS (ver pdf.clave_cache),
+# así que un cambio en cualquiera de ellos produce otro archivo. Las señales de
+# signals.py borran la carpeta <tipo>/<pk> en cuanto el registro se modifica.
+
+
+def _directorio():
+    return str(settings.PDF_CACHE_DIR)
+
+
+def _carpeta(tipo, pk):
+    return os.path.join(_directorio(), tipo, str(pk))
+
+
+def _ruta(tipo, pk, clave):
+    return os.path.join(_carpeta(tipo, pk), f'{clave}.pdf')
+
+
+def activa():
+    return settings.PDF_CACHE_MAX_BYTES > 0
+
+
+def existe(tipo, pk, clave):
+    return activa() and os.path.exists(_ruta(tipo, pk, clave))
+
+
+def abrir(tipo, pk, clave):
+    """
+    (archivo abierto en 'rb', ruta) del PDF en caché, o None si no existe.
+    El archivo abierto sigue sirviendo aunque la limpieza lo borre mientras se envía.
+    """
+    if not activa():
+        return None
+    ruta = _ruta(tipo, pk, clave)
+    try:
+        archivo = open(ruta, 'rb')
+    except FileNotFoundError:
+        return None
+    # Marcamos el uso (mtime) para que la limpieza LRU lo conserve
+    try:
+        os.utime(ruta)
+    except FileNotFoundError:
+        pass
+    return archivo, ruta
+
+
+def leer(tipo, pk, clave):
+    """Bytes del PDF en caché, o None si no existe."""
+    abierto = abrir(tipo, pk, clave)
+    if abierto is None:
+        return None
+    with abierto[0] as archivo:
+        return archivo.read()
+
+
+def temporal(tipo, pk):
+    """Ruta de un archivo vacío para escribir ahí el PDF antes de publicarlo (mismo disco que la caché)."""
+    carpeta = os.path.join(_directorio(), '.tmp')
+    os.makedirs(carpeta, exist_ok=True)
+    fd, ruta = tempfile.mkstemp(dir=carpeta, prefix=f'{tipo}_{pk}_', suffix='.tmp')
+    os.close(fd)
+    return ruta
+
+
+def publicar(tipo, pk, clave, ruta_temporal):
+    """
+    Mueve el temporal ya escrito a su lugar en la caché. Devuelve la ruta final, o None si
+    invalidar() borró la carpeta del registro justo en ese momento (el PDF se sirve sin caché).
+    """
+    # os.replace es atómico: otro worker nunca verá un PDF a medias
+    ruta = _ruta(tipo, pk, clave)
+    try:
+        tamano = os.path.getsize(ruta_temporal)
+        os.makedirs(_carpeta(tipo, pk), exist_ok=True)
+        os.replace(ruta_temporal, ruta)
+    except FileNotFoundError:
+        if os.path.exists(ruta_temporal):
+            os.remove(ruta_temporal)
+        return None
+    _tal_vez_recortar(tamano)
+    return ruta
+
+
+def guardar(tipo, pk, clave, contenido):
+    if not activa():
+        return
+    ruta_temporal = temporal(tipo, pk)
+    with open(ruta_temporal, 'wb') as archivo:
+        archivo.write(contenido)
+    publicar(tipo, pk, clave, ruta_temporal)
+
+
+def invalidar(tipo, pk):
+    """Borra todos los PDF en caché de un registro."""
+    shutil.rmtree(_carpeta(tipo, pk), ignore_errors=True)
+
+
+# Lo que ocupa la caché según este proceso: el árbol completo solo se recorre cuando la
+# estimación pasa del límite, o cada _RECORTAR_CADA publicaciones (otros procesos también
+# escriben, e invalidar() borra sin descontar)
+_RECORTAR_CADA = 50
+_ESTIMACION = {'bytes': None, 'publicados': 0}
+_CANDADO = threading.Lock()
+
+
+def _tal_vez_recortar(tamano):
+    with _CANDADO:
+        _ESTIMACION['publicados'] += 1
+        if _ESTIMACION['bytes'] is not None:
+            _ESTIMACION['bytes'] += tamano
+            if (_ESTIMACION['bytes'] <= settings.PDF_CACHE_MAX_BYTES
+                    and _ESTIMACION['publicados'] % _RECORTAR_CADA):
+                return
+    total = recortar()
+    with _CANDADO:
+        _ESTIMACION['bytes'] = total
+
+
+def recortar():
+    """
+    Si la caché pasa de PDF_CACHE_MAX_BYTES, borra los PDF menos usados recientemente (LRU)
+    hasta dejarla en el 90 %, para que las siguientes publicaciones no tengan que recortar otra vez.
+    Devuelve los bytes que ocupa al terminar.
+    """
+    archivos = []
+    total = 0
+    for raiz, _, nombres in os.walk(_directorio()):
+        for nombre in nombres:
+            if not nombre.endswith('.pdf'):
+                continue
+            ruta = os.path.join(raiz, nombre)
+            try:
+                info = os.stat(ruta)
+            except FileNotFoundError:
+                continue
+            archivos.append((info.st_mtime, info.st_size, ruta))
+            total += info.st_size
+
+    if total <= settings.PDF_CACHE_MAX_BYTES:
+        return total
+
+    archivos.sort()
+    for _, tamano, ruta in archivos:
+        try:
+            os.remove(ruta)
+        except FileNotFoundError:
+            pass
+        total -= tamano
+        if total <= settings.PDF_CACHE_MAX_BYTES * 0.9:
+            break
+    return total
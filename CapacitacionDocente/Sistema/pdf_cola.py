@@ -0,0 +1,244 @@
+import logging
+import multiprocessing
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, close_old_connections, connection, connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import TrabajoPDF
+from . import pdf_cache, pdf_lote
+from .pdf import PDF_CONFIG, archivo_pdf
+
+logger = logging.getLogger(__name__)
+
+# =======================================================
+# COLA DE PDF EN BASE DE DATOS
+# =======================================================
+# La vista solo registra el TrabajoPDF; el comando `manage.py procesar_pdfs`
+# los toma y los renderiza en un pool de procesos. El PDF terminado queda en la
+# caché de disco (pdf_cache), de donde lo sirve la descarga normal.
+# Las exportaciones de un periodo completo (pdf_lote.EXPORTACIONES) también van por
+# aquí: pueden tardar minutos y no caben en una petición web.
+
+
+def encolar(tipo, pk):
+    """Crea el trabajo para (tipo, pk), o devuelve el que ya está pendiente o en proceso."""
+    return _encolar(tipo=tipo, objeto_id=pk)
+
+
+def encolar_exportacion(tipo, periodo, tipos):
+    """Como encolar(), para una exportación del periodo ('zip', ...) con los formatos dados."""
+    return _encolar(tipo=tipo, objeto_id=0, periodo=periodo, tipos=','.join(tipos))
+
+
+def _encolar(**campos):
+    """La restricción trabajo_pdf_vivo_unico impide que dos peticiones a la vez creen dos trabajos."""
+    while True:
+        trabajo = TrabajoPDF.objects.filter(estado__in=['pendiente', 'procesando'], **campos).first()
+        if trabajo is not None:
+            return trabajo
+        try:
+            with transaction.atomic():
+                return TrabajoPDF.objects.create(**campos)
+        except IntegrityError:
+            # Otra petición lo creó entre la consulta y el INSERT: se vuelve a buscar
+            continue
+
+
+def prerenderizar(tipo, pk):
+    """
+    Genera el PDF en segundo plano en cuanto se confirma la transacción que creó el registro,
+    para que el botón "Descargar PDF" lo encuentre ya en la caché. Si aún no termina cuando
+    el usuario lo pide, la descarga simplemente lo genera en ese momento.
+    PDF_PRERENDER: 'hilo' (un hilo en este proceso), 'cola' (TrabajoPDF para procesar_pdfs) o '' (apagado).
+    Sin caché de disco no hay dónde dejarlo, así que no se hace nada.
+    """
+    if not pdf_cache.activa():
+        return
+    modo = settings.PDF_PRERENDER
+    if modo == 'cola':
+        transaction.on_commit(lambda: encolar(tipo, pk))
+    elif modo == 'hilo':
+        transaction.on_commit(
+            lambda: threading.Thread(target=_prerenderizar_en_hilo, args=(tipo, pk), daemon=True).start()
+        )
+
+
+def _prerenderizar_en_hilo(tipo, pk):
+    try:
+        registro = PDF_CONFIG[tipo]['model'].objects.get(pk=pk)
+        # Este hilo vive en el proceso web: el render va a un proceso aislado.
+        # Solo importa que quede en la caché: el archivo se cierra sin leerlo.
+        archivo, _ = archivo_pdf(tipo, registro, aislado=True)
+        archivo.close()
+    except Exception:
+        # Solo era un adelanto: la descarga lo volverá a intentar de forma síncrona
+        logger.exception('No se pudo pre-generar el PDF %s #%s', tipo, pk)
+    finally:
+        # Cada hilo abre su propia conexión; hay que cerrarla al terminar
+        connection.close()
+
+
+def tomar_trabajos(cantidad):
+    """
+    Marca como 'procesando' hasta `cantidad` trabajos y devuelve sus ids.
+    Con PostgreSQL, SKIP LOCKED permite correr varios procesadores a la vez sin repetir trabajos.
+    También recupera los que se quedaron 'procesando' demasiado tiempo (un worker que murió):
+    mientras un trabajo corre, _latido() renueva su fecha_actualizacion, así que solo se
+    recupera el que de verdad se quedó sin dueño. Cada toma sube `intento`.
+    """
+    limite = timezone.now() - timedelta(seconds=settings.PDF_COLA_TIMEOUT)
+    with transaction.atomic():
+        ids = list(
+            TrabajoPDF.objects.select_for_update(skip_locked=True)
+            .filter(Q(estado='pendiente') | Q(estado='procesando', fecha_actualizacion__lt=limite))
+            .order_by('fecha_creacion')
+            .values_list('pk', flat=True)[:cantidad]
+        )
+        TrabajoPDF.objects.filter(pk__in=ids).update(
+            estado='procesando', intento=F('intento') + 1, fecha_actualizacion=timezone.now()
+        )
+    return ids
+
+
+def _de_este_intento(trabajo):
+    """El trabajo, solo si sigue 'procesando' en este intento (nadie lo recuperó)."""
+    return TrabajoPDF.objects.filter(pk=trabajo.pk, estado='procesando', intento=trabajo.intento)
+
+
+def renovar(trabajo):
+    """Renueva la reserva del trabajo. False si otro procesador ya lo recuperó."""
+    return _de_este_intento(trabajo).update(fecha_actualizacion=timezone.now()) == 1
+
+
+@contextmanager
+def _latido(trabajo):
+    """Mientras dura el bloque, un hilo renueva la reserva cada tercio de PDF_COLA_TIMEOUT."""
+    alto = threading.Event()
+
+    def latir():
+        try:
+            while not alto.wait(settings.PDF_COLA_TIMEOUT / 3):
+                if not renovar(trabajo):
+                    return
+        except Exception:
+            logger.exception('No se pudo renovar el trabajo PDF #%s', trabajo.pk)
+        finally:
+            connection.close()
+
+    hilo = threading.Thread(target=latir, daemon=True)
+    hilo.start()
+    try:
+        yield
+    finally:
+        alto.set()
+        hilo.join()
+
+
+def procesar_trabajo(trabajo_id):
+    """Renderiza un trabajo (corre dentro de un proceso del pool)."""
+    # Cada hijo del pool vive muchos trabajos: una conexión que la base cerró no debe
+    # arrastrarse al siguiente (como hace Django al empezar y terminar cada petición)
+    close_old_connections()
+    try:
+        return _procesar_trabajo(trabajo_id)
+    finally:
+        close_old_connections()
+
+
+def _procesar_trabajo(trabajo_id):
+    trabajo = TrabajoPDF.objects.get(pk=trabajo_id)
+    cambios = {'archivo': trabajo.archivo}
+    try:
+        with _latido(trabajo):
+            if trabajo.tipo in pdf_lote.EXPORTACIONES:
+                cambios['archivo'] = pdf_lote.exportar(
+                    trabajo.tipo, trabajo.periodo, trabajo.tipos.split(','), trabajo.pk,
+                    vigente=lambda: _de_este_intento(trabajo).exists(),
+                )
+            else:
+                config = PDF_CONFIG[trabajo.tipo]
+                registro = config['model'].objects.get(pk=trabajo.objeto_id)
+                archivo, _ = archivo_pdf(trabajo.tipo, registro)
+                archivo.close()
+    except pdf_lote.ExportacionDescartada:
+        logger.warning('El trabajo PDF #%s fue recuperado por otro procesador; se descarta este intento', trabajo_id)
+        return trabajo_id
+    except Exception:
+        cambios.update(estado='error', error=traceback.format_exc())
+    else:
+        cambios.update(estado='listo', error='')
+    # Solo lo cierra el intento vigente: uno recuperado por otro procesador no lo pisa
+    if not _de_este_intento(trabajo).update(fecha_actualizacion=timezone.now(), **cambios):
+        logger.warning('El trabajo PDF #%s fue recuperado por otro procesador; se descarta este intento', trabajo_id)
+    return trabajo_id
+
+
+def marcar_error(trabajo_id, error):
+    TrabajoPDF.objects.filter(pk=trabajo_id).update(estado='error', error=error, fecha_actualizacion=timezone.now())
+
+
+def _pool(procesos):
+    # 'fork': los hijos heredan Django ya configurado (settings, apps, plantillas)
+    return ProcessPoolExecutor(max_workers=procesos, mp_context=multiprocessing.get_context('fork'))
+
+
+def ejecutar(procesos=2, una_vez=False, espera=1.0):
+    """
+    Bucle del procesador: mantiene ocupados `procesos` workers mientras haya trabajos.
+    Si un trabajo falla fuera de procesar_trabajo (el proceso murió, la base no respondió),
+    ese trabajo queda en 'error' y el bucle sigue; si el pool se rompió, se arma uno nuevo.
+    Si la base falla al tomar trabajos, se espera y se vuelve a intentar.
+    """
+    en_curso = {}  # {futuro: trabajo_id}
+    pool = _pool(procesos)
+    try:
+        while True:
+            libres = procesos - len(en_curso)
+            try:
+                ids = tomar_trabajos(libres) if libres > 0 else []
+            except DatabaseError:
+                # La base no respondió (reinicio, red): se reintenta en lugar de tumbar el procesador
+                logger.exception('No se pudieron tomar trabajos PDF')
+                connections.close_all()
+                time.sleep(espera)
+                continue
+            if ids:
+                # Cerramos la conexión antes de que el pool haga fork: un hijo que
+                # heredara el socket del padre lo dejaría inservible para ambos.
+                connections.close_all()
+                for trabajo_id in ids:
+                    en_curso[pool.submit(procesar_trabajo, trabajo_id)] = trabajo_id
+
+            if en_curso:
+                terminados, _ = wait(en_curso, timeout=espera, return_when=FIRST_COMPLETED)
+                roto = False
+                for futuro in terminados:
+                    trabajo_id = en_curso.pop(futuro)
+                    try:
+                        futuro.result()
+                    except Exception as error:
+                        logger.exception('Falló el trabajo PDF #%s', trabajo_id)
+                        marcar_error(trabajo_id, traceback.format_exc())
+                        roto = roto or isinstance(error, BrokenProcessPool)
+                if roto:
+                    # Con el pool roto fallan también los demás trabajos que tenía
+                    for trabajo_id in en_curso.values():
+                        marcar_error(trabajo_id, 'El proceso de render terminó inesperadamente.')
+                    en_curso.clear()
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    pool = _pool(procesos)
+            elif una_vez:
+                return
+            else:
+                time.sleep(espera)
+    finally:
+        pool.shutdown(wait=True)
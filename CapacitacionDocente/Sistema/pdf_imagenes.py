@@ -0,0 +1,66 @@
+import os
+
+from django.conf import settings
+from PIL import Image
+
+# =======================================================
+# IMÁGENES A RESOLUCIÓN DE IMPRESIÓN PARA LOS PDF
+# =======================================================
+# Los logos de static/Sistema/img están a resolución de pantalla grande (hasta 2448 px)
+# y en el PDF se imprimen de poco más de 1 cm. `manage.py optimizar_imagenes_pdf` deja
+# en img/pdf/ una copia reducida y optimizada de cada una, con el mismo nombre; al
+# generar el PDF se usa esa copia si existe (ver pdf._ruta_local).
+CARPETA_IMG = os.path.join(os.path.dirname(__file__), 'static', 'Sistema', 'img')
+CARPETA_IMG_PDF = os.path.join(CARPETA_IMG, 'pdf')
+PREFIJO_IMG = 'Sistema/img/'
+PREFIJO_IMG_PDF = 'Sistema/img/pdf/'
+
+EXTENSIONES = ('.png', '.jpg', '.jpeg')
+
+
+def variante_pdf(nombre):
+    """'Sistema/img/logo.png' -> 'Sistema/img/pdf/logo.png'. None si no es una imagen de img/."""
+    if not nombre.startswith(PREFIJO_IMG) or nombre.startswith(PREFIJO_IMG_PDF):
+        return None
+    if not nombre.lower().endswith(EXTENSIONES):
+        return None
+    return PREFIJO_IMG_PDF + nombre[len(PREFIJO_IMG):]
+
+
+def optimizar_imagen(origen, destino, lado_max=None, dpi=None):
+    """Reduce la imagen a lado_max px (sin agrandarla) y la guarda optimizada. Devuelve el tamaño final en bytes."""
+    lado_max = lado_max or settings.PDF_IMAGEN_LADO_MAX
+    dpi = dpi or settings.PDF_IMAGEN_DPI
+    with Image.open(origen) as imagen:
+        imagen.load()
+    imagen.thumbnail((lado_max, lado_max), Image.Resampling.LANCZOS)
+
+    if destino.lower().endswith('.png'):
+        if imagen.mode not in ('RGB', 'RGBA'):
+            imagen = imagen.convert('RGBA')
+        # Paleta de 256 colores: para logos planos no se nota y el PNG baja varias veces
+        imagen = imagen.quantize(colors=256, method=Image.Quantize.FASTOCTREE)
+        imagen.save(destino, optimize=True, dpi=(dpi, dpi))
+    else:
+        imagen.convert('RGB').save(destino, quality=settings.PDF_JPEG_CALIDAD, optimize=True, dpi=(dpi, dpi))
+    return os.path.getsize(destino)
+
+
+def optimizar_carpeta(lado_max=None, dpi=None):
+    """Genera img/pdf/ desde img/. Devuelve [(nombre, bytes originales, bytes optimizados)]."""
+    os.makedirs(CARPETA_IMG_PDF, exist_ok=True)
+    resultados = []
+    for nombre in sorted(os.listdir(CARPETA_IMG)):
+        origen = os.path.join(CARPETA_IMG, nombre)
+        if not os.path.isfile(origen) or not nombre.lower().endswith(EXTENSIONES):
+            continue
+        destino = os.path.join(CARPETA_IMG_PDF, nombre)
+        optimizado = optimizar_imagen(origen, destino, lado_max, dpi)
+        original = os.path.getsize(origen)
+        if optimizado >= original:
+            # Ya venía pequeña: se deja igual que la original
+            with open(origen, 'rb') as entrada, open(destino, 'wb') as salida:
+                salida.write(entrada.read())
+            optimizado = original
+        resultados.append((nombre, original, optimizado))
+    return resultados
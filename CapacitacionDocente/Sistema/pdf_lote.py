@@ -0,0 +1,194 @@
+import multiprocessing
+import os
+import time
+import traceback
+import uuid
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.conf import settings
+from django.db import connections
+from django.utils.text import slugify
+
+from .pdf import PDF_CONFIG, generar_pdf, pdf_desde_cache, pdf_unido
+
+# =======================================================
+# EXPORTACIÓN MASIVA DE PDF POR PERIODO
+# =======================================================
+# Formatos que se archivan al cierre del semestre (todos tienen campo 'periodo').
+TIPOS_PERIODO = ['asistencia', 'encuesta', 'inscripcion']
+
+
+def registros_periodo(periodo, tipos=TIPOS_PERIODO):
+    """Itera (tipo, registro) de todos los documentos del periodo."""
+    for tipo in tipos:
+        modelo = PDF_CONFIG[tipo]['model']
+        for registro in modelo.objects.filter(periodo=periodo).order_by('pk'):
+            yield tipo, registro
+
+
+def pdf_unido_periodo(periodo, tipo, destino=None):
+    """Un PDF continuo con todos los documentos de un tipo en el periodo (para imprimir)."""
+    registros = PDF_CONFIG[tipo]['model'].objects.filter(periodo=periodo).order_by('pk')
+    return pdf_unido(tipo, registros, destino)
+
+
+def _renderizar(tipo, pk):
+    """Corre dentro de un proceso del pool. Devuelve (tipo, pk, pdf_bytes, error)."""
+    try:
+        registro = PDF_CONFIG[tipo]['model'].objects.get(pk=pk)
+        return tipo, pk, generar_pdf(tipo, registro), None
+    except Exception:
+        return tipo, pk, None, traceback.format_exc()
+
+
+def generar_pdfs(pendientes, procesos=None):
+    """
+    Itera (tipo, pk, pdf_bytes, error) conforme cada PDF queda listo.
+    Los que ya están en la caché de disco salen primero sin renderizar; el resto se
+    reparte en un pool de procesos y se entrega en el orden en que van terminando.
+    """
+    por_renderizar = []
+    for tipo, registro in pendientes:
+        contenido = pdf_desde_cache(tipo, registro)
+        if contenido is not None:
+            yield tipo, registro.pk, contenido, None
+        else:
+            por_renderizar.append((tipo, registro.pk))
+
+    if not por_renderizar:
+        return
+
+    procesos = procesos or settings.PDF_LOTE_PROCESOS
+    if procesos == 1:
+        # Sin pool: uno tras otro en este mismo proceso
+        for tipo, pk in por_renderizar:
+            yield _renderizar(tipo, pk)
+        return
+
+    # Sin conexión abierta al hacer fork: cada hijo abre la suya
+    connections.close_all()
+    pool = ProcessPoolExecutor(
+        max_workers=procesos,
+        mp_context=multiprocessing.get_context('fork'),
+    )
+    try:
+        futuros = [pool.submit(_renderizar, tipo, pk) for tipo, pk in por_renderizar]
+        for futuro in as_completed(futuros):
+            yield futuro.result()
+    finally:
+        # Si el cliente corta la descarga, no seguimos renderizando lo que falta
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+class _BufferZip:
+    """Destino de escritura para ZipFile que se vacía por partes (no admite seek)."""
+
+    def __init__(self):
+        self.partes = []
+
+    def write(self, data):
+        self.partes.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def vaciar(self):
+        data = b''.join(self.partes)
+        self.partes = []
+        return data
+
+
+def zip_en_partes(pendientes, procesos=None):
+    """
+    Genera el ZIP en trozos de bytes, uno por cada PDF que termina.
+    Nunca se tiene el archivo completo en memoria: solo el PDF que se está agregando.
+    """
+    buffer = _BufferZip()
+    errores = []
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_STORED) as archivo_zip:
+        for tipo, pk, contenido, error in generar_pdfs(pendientes, procesos):
+            if error:
+                errores.append(f'{tipo} #{pk}\n{error}')
+                continue
+            # Los PDF ya vienen comprimidos; volver a comprimirlos solo gasta CPU
+            archivo_zip.writestr(f'{tipo}/{tipo}_{pk}.pdf', contenido)
+            yield buffer.vaciar()
+
+        if errores:
+            archivo_zip.writestr('errores.txt', '\n\n'.join(errores))
+    yield buffer.vaciar()
+
+
+# =======================================================
+# EXPORTACIONES EN LA COLA (pdf_cola / procesar_pdfs)
+# =======================================================
+# La vista solo encola la exportación y devuelve la URL para consultar su estado;
+# el archivo se arma en PDF_EXPORTACIONES_DIR y de ahí se descarga.
+def _escribir_zip(periodo, tipos, archivo):
+    for parte in zip_en_partes(registros_periodo(periodo, tipos)):
+        archivo.write(parte)
+
+
+def _escribir_unido(periodo, tipos, archivo):
+    if pdf_unido_periodo(periodo, tipos[0], archivo) is None:
+        raise ValueError('No hay documentos en ese periodo.')
+
+
+# {tipo de TrabajoPDF: (extensión, content type, función(periodo, tipos, archivo abierto))}
+EXPORTACIONES = {
+    'zip': ('zip', 'application/zip', _escribir_zip),
+    'unido': ('pdf', 'application/pdf', _escribir_unido),
+}
+
+
+def nombre_descarga(trabajo):
+    """Nombre con el que se descarga la exportación."""
+    extension = EXPORTACIONES[trabajo.tipo][0]
+    if trabajo.tipo == 'zip':
+        return f'pdfs_{slugify(trabajo.periodo)}.{extension}'
+    return f'{trabajo.tipos}_{slugify(trabajo.periodo)}.{extension}'
+
+
+class ExportacionDescartada(Exception):
+    """Otro procesador recuperó el trabajo mientras este lo generaba: su archivo no se publica."""
+
+
+def exportar(tipo, periodo, tipos, trabajo_id, vigente=None):
+    """
+    Genera la exportación en PDF_EXPORTACIONES_DIR y devuelve su ruta.
+    Cada intento escribe en su propio temporal; vigente() dice si este intento sigue siendo
+    el dueño del trabajo, y si ya no lo es el archivo se descarta en lugar de publicarse.
+    """
+    extension, _, escribir = EXPORTACIONES[tipo]
+    carpeta = str(settings.PDF_EXPORTACIONES_DIR)
+    os.makedirs(carpeta, exist_ok=True)
+    limpiar_exportaciones()
+
+    ruta = os.path.join(carpeta, f'{tipo}_{slugify(periodo)}_{trabajo_id}.{extension}')
+    temporal = f'{ruta}.{uuid.uuid4().hex}.tmp'
+    try:
+        with open(temporal, 'wb') as archivo:
+            escribir(periodo, tipos, archivo)
+        if vigente is not None and not vigente():
+            raise ExportacionDescartada(f'{tipo} #{trabajo_id}')
+        os.replace(temporal, ruta)
+    except BaseException:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+    return ruta
+
+
+def limpiar_exportaciones():
+    """Borra las exportaciones de más de PDF_EXPORTACIONES_SEGUNDOS."""
+    carpeta = str(settings.PDF_EXPORTACIONES_DIR)
+    limite = time.time() - settings.PDF_EXPORTACIONES_SEGUNDOS
+    for nombre in os.listdir(carpeta):
+        ruta = os.path.join(carpeta, nombre)
+        try:
+            if os.path.getmtime(ruta) < limite:
+                os.remove(ruta)
+        except FileNotFoundError:
+            pass
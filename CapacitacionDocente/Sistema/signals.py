@@ -0,0 +1,100 @@
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.utils import timezone
+
+from . import estadisticas_encuestas, pdf_cache
+from .models import EncuestaSatisfaccion
+from .pdf import PDF_CONFIG, campo_padre, modelos_hijos
+
+# =======================================================
+# INVALIDACIÓN DE LA CACHÉ DE PDF
+# =======================================================
+# {modelo: [(tipo, attname_de_la_fk_al_padre o None si es el documento mismo)]}
+_MODELOS_PDF = {}
+for _tipo, _config in PDF_CONFIG.items():
+    _MODELOS_PDF.setdefault(_config['model'], []).append((_tipo, None))
+    for _hijo in modelos_hijos(_tipo):
+        _MODELOS_PDF.setdefault(_hijo, []).append((_tipo, campo_padre(_hijo, _config['model'])))
+
+
+# Dentro de filas_en_bloque() las filas hijas no invalidan ni tocan su documento una por una
+_estado = threading.local()
+
+
+@contextmanager
+def filas_en_bloque():
+    """
+    Para guardar o borrar muchas filas hijas de un documento de una vez: sus señales no
+    hacen nada, y quien lo usa guarda el documento una sola vez (ese save() invalida su PDF).
+    """
+    anterior = getattr(_estado, 'en_bloque', False)
+    _estado.en_bloque = True
+    try:
+        yield
+    finally:
+        _estado.en_bloque = anterior
+
+
+def invalidar_pdf(sender, instance, **kwargs):
+    for tipo, fk in _MODELOS_PDF.get(sender, []):
+        if fk and getattr(_estado, 'en_bloque', False):
+            continue
+        pk = getattr(instance, fk) if fk else instance.pk
+        if pk is not None:
+            pdf_cache.invalidar(tipo, pk)
+            if fk:
+                tocar_documento(tipo, pk)
+
+
+def tocar_documento(tipo, pk):
+    """
+    Marca el documento como modificado cuando cambia una de sus filas hijas,
+    para que su fecha_actualizacion (ETag/Last-Modified del PDF) también cambie.
+    Con .update() no se disparan señales de nuevo.
+    """
+    PDF_CONFIG[tipo]['model'].objects.filter(pk=pk).update(fecha_actualizacion=timezone.now())
+
+
+# =======================================================
+# RESUMEN DE ENCUESTAS (ESTADÍSTICAS)
+# =======================================================
+def recordar_encuesta_anterior(sender, instance, **kwargs):
+    """Antes de editar una encuesta, guarda sus valores viejos para restarlos del resumen."""
+    instance._valores_anteriores = None
+    if instance.pk is not None:
+        campos = estadisticas_encuestas.CLAVE_RESUMEN + estadisticas_encuestas.PREGUNTAS
+        instance._valores_anteriores = sender.objects.filter(pk=instance.pk).values(*campos).first()
+
+
+def actualizar_resumen(sender, instance, **kwargs):
+    nuevos = estadisticas_encuestas.valores_encuesta(instance)
+    anteriores = getattr(instance, '_valores_anteriores', None)
+    if anteriores == nuevos:
+        return
+    if anteriores:
+        estadisticas_encuestas.sumar_encuesta(anteriores, -1)
+    estadisticas_encuestas.sumar_encuesta(nuevos)
+
+
+def restar_del_resumen(sender, instance, **kwargs):
+    estadisticas_encuestas.sumar_encuesta(estadisticas_encuestas.valores_encuesta(instance), -1)
+
+
+def invalidar_estadisticas(sender, instance, **kwargs):
+    # Hasta que se confirme: antes, otra petición podría guardar en la versión nueva datos viejos
+    transaction.on_commit(estadisticas_encuestas.invalidar)
+
+
+def conectar():
+    for modelo in _MODELOS_PDF:
+        post_save.connect(invalidar_pdf, sender=modelo, dispatch_uid=f'pdf_save_{modelo.__name__}')
+        post_delete.connect(invalidar_pdf, sender=modelo, dispatch_uid=f'pdf_delete_{modelo.__name__}')
+
+    pre_save.connect(recordar_encuesta_anterior, sender=EncuestaSatisfaccion, dispatch_uid='resumen_pre_save')
+    post_save.connect(actualizar_resumen, sender=EncuestaSatisfaccion, dispatch_uid='resumen_save')
+    post_delete.connect(restar_del_resumen, sender=EncuestaSatisfaccion, dispatch_uid='resumen_delete')
+    post_save.connect(invalidar_estadisticas, sender=EncuestaSatisfaccion, dispatch_uid='estadisticas_save')
+    post_delete.connect(invalidar_estadisticas, sender=EncuestaSatisfaccion, dispatch_uid='estadisticas_delete')
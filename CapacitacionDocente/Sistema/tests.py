@@ -1,3 +1,759 @@
-from django.test import TestCase
+import io
+import json
+import os
+import statistics
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+from concurrent.futures import Future
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import DatabaseError, connection
+from django.db.models import Avg
+from django.forms.models import model_to_dict
+from django.conf import settings
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import estadisticas_encuestas, pdf_aislado, pdf_cache, pdf_cola, pdf_lote
+from .models import (
+    AsistenciaParticipante, CurriculumVitae, DiagnosticoNecesidades, EncuestaSatisfaccion, ListaAsistencia,
+    ProgramaInstitucional, RegistroGeneral, ResumenEncuesta,
+)
+from . import pdf
+from .pdf import PDF_CONFIG, cargar_hijos, construir_contexto, presupuesto_consultas
+from .pdf_benchmark import sembrar
+
+
+# =======================================================
+# CONTEXTO DEL PDF: CONSULTAS POR FORMATO
+# =======================================================
+class ContextoPDFTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.registros = {tipo: [sembrar(tipo, 'maximo')[0] for _ in range(3)] for tipo in PDF_CONFIG}
+
+    def _recargar(self, tipo, registro):
+        return PDF_CONFIG[tipo]['model'].objects.get(pk=registro.pk)
+
+    def test_contexto_respeta_presupuesto_de_consultas(self):
+        for tipo in PDF_CONFIG:
+            with self.subTest(tipo=tipo):
+                registro = self._recargar(tipo, self.registros[tipo][0])
+                with self.assertNumQueries(presupuesto_consultas(tipo)):
+                    construir_contexto(tipo, registro)
+
+    def test_varios_documentos_cuestan_lo_mismo_que_uno(self):
+        for tipo in PDF_CONFIG:
+            with self.subTest(tipo=tipo):
+                registros = [self._recargar(tipo, r) for r in self.registros[tipo]]
+                with self.assertNumQueries(presupuesto_consultas(tipo)):
+                    cargar_hijos(tipo, registros)
+                    for registro in registros:
+                        construir_contexto(tipo, registro)
+
+    def test_tablas_se_rellenan_hasta_el_tamano_de_la_hoja(self):
+        for tipo, config in PDF_CONFIG.items():
+            context = construir_contexto(tipo, self._recargar(tipo, self.registros[tipo][0]))
+            for tabla in config['tablas']:
+                with self.subTest(tipo=tipo, tabla=tabla['contexto']):
+                    self.assertEqual(len(context[tabla['contexto']]), tabla['filas'])
+
+    def test_filas_de_asistencia_por_numero_consecutivo(self):
+        lista = self.registros['asistencia'][0]
+        lista.participantes.filter(no_consecutivo=2).delete()
+        filas = construir_contexto('asistencia', ListaAsistencia.objects.get(pk=lista.pk))['tabla_participantes']
+        self.assertEqual([f['counter'] for f in filas], list(range(1, 24)))
+        self.assertEqual(filas[1]['nombre'], '')
+        self.assertNotEqual(filas[2]['nombre'], '')
+
+    def test_asistencia_sin_tope_se_reparte_en_hojas(self):
+        lista = self.registros['asistencia'][0]
+        AsistenciaParticipante.objects.create(lista=lista, no_consecutivo=30, nombre='Participante 30')
+        context = construir_contexto('asistencia', ListaAsistencia.objects.get(pk=lista.pk))
+        self.assertEqual(len(context['tabla_participantes']), 46)
+        hojas = context['tabla_participantes_hojas']
+        self.assertEqual([(h['numero'], h['total'], len(h['filas'])) for h in hojas], [(1, 2, 23), (2, 2, 23)])
+        self.assertEqual(hojas[1]['filas'][6]['nombre'], 'Participante 30')
+
+
+# =======================================================
+# RECURSOS ESTÁTICOS DEL PDF
+# =======================================================
+class RecursosEstaticosPDFTests(TestCase):
+
+    def _static_root(self, manifest):
+        """STATIC_ROOT temporal con los archivos del manifest {original: con hash} y su staticfiles.json."""
+        carpeta = tempfile.TemporaryDirectory()
+        self.addCleanup(carpeta.cleanup)
+        for guardado in manifest.values():
+            ruta = os.path.join(carpeta.name, guardado)
+            os.makedirs(os.path.dirname(ruta), exist_ok=True)
+            with open(ruta, 'wb') as archivo:
+                archivo.write(b'png')
+        with open(os.path.join(carpeta.name, 'staticfiles.json'), 'w') as archivo:
+            json.dump({'paths': manifest, 'version': '1.1'}, archivo)
+        return carpeta.name
+
+    def test_variante_de_impresion_con_manifest(self):
+        static_root = self._static_root({
+            'Sistema/img/logo_tecnm.png': 'Sistema/img/logo_tecnm.1a2b3c4d5e6f.png',
+            'Sistema/img/pdf/logo_tecnm.png': 'Sistema/img/pdf/logo_tecnm.6f5e4d3c2b1a.png',
+        })
+        storages = {**settings.STORAGES, 'staticfiles': {
+            'BACKEND': 'django.contrib.staticfiles.storage.ManifestStaticFilesStorage',
+        }}
+        url = pdf.BASE_URL_PDF + 'static/Sistema/img/logo_tecnm.1a2b3c4d5e6f.png'
+        with override_settings(STATIC_ROOT=static_root, STORAGES=storages, PDF_OPTIMIZAR=True):
+            self.assertEqual(pdf._ruta_local(url),
+                             os.path.join(static_root, 'Sistema/img/pdf/logo_tecnm.6f5e4d3c2b1a.png'))
+        with override_settings(STATIC_ROOT=static_root, STORAGES=storages, PDF_OPTIMIZAR=False):
+            self.assertEqual(pdf._ruta_local(url), os.path.join(static_root, 'Sistema/img/logo_tecnm.1a2b3c4d5e6f.png'))
+
+    def test_sin_optimizar_usa_los_defaults_de_weasyprint(self):
+        with override_settings(PDF_OPTIMIZAR=False):
+            self.assertEqual(pdf.opciones_pdf(), {})
+
+
+# =======================================================
+# PDF SIN WEASYPRINT: CACHÉ, COLA Y DESCARGAS
+# =======================================================
+def _pdf_falso(tipo, html_string, destino=None):
+    """Reemplazo de pdf.html_a_pdf: un 'PDF' que depende del HTML, escrito igual que WeasyPrint."""
+    contenido = b'%PDF-1.7 ' + tipo.encode() + b' ' + str(len(html_string)).encode()
+    if destino is None:
+        return contenido
+    if isinstance(destino, str):
+        with open(destino, 'wb') as archivo:
+            archivo.write(contenido)
+    else:
+        destino.write(contenido)
+
+
+class PDFFalsoTestCase(TestCase):
+    """html_a_pdf simulado, caché de disco en una carpeta temporal y sin procesos aislados ni pre-render."""
+
+    def setUp(self):
+        carpeta = tempfile.TemporaryDirectory()
+        self.addCleanup(carpeta.cleanup)
+        ajustes = override_settings(PDF_CACHE_DIR=os.path.join(carpeta.name, 'cache'),
+                                    PDF_EXPORTACIONES_DIR=os.path.join(carpeta.name, 'exportaciones'),
+                                    PDF_CACHE_MAX_BYTES=10 * 1024 * 1024, PDF_LOTE_PROCESOS=1,
+                                    PDF_AISLADO_PROCESOS=0, PDF_PRERENDER='', PDF_ENVIO='')
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        parche = mock.patch('Sistema.pdf.html_a_pdf', side_effect=_pdf_falso)
+        self.html_a_pdf = parche.start()
+        self.addCleanup(parche.stop)
+        # La estimación de tamaño es del proceso: cada prueba empieza con su caché vacía
+        estimacion = mock.patch.dict(pdf_cache._ESTIMACION, {'bytes': None, 'publicados': 0})
+        estimacion.start()
+        self.addCleanup(estimacion.stop)
+
+
+class DescargaPDFTests(PDFFalsoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.lista, _ = sembrar('asistencia', 'tipico')
+        self.url = reverse('descargar_pdf', args=['asistencia', self.lista.pk])
+
+    def _descargar(self, **encabezados):
+        response = self.client.get(self.url, **encabezados)
+        contenido = b''.join(response.streaming_content) if response.streaming else response.content
+        response.close()
+        return response, contenido
+
+    def test_segunda_descarga_sale_de_la_cache(self):
+        primera, pdf_primera = self._descargar()
+        segunda, pdf_segunda = self._descargar()
+        self.assertEqual((primera.status_code, segunda.status_code), (200, 200))
+        self.assertTrue(pdf_primera.startswith(b'%PDF'))
+        self.assertEqual(pdf_primera, pdf_segunda)
+        self.assertEqual(self.html_a_pdf.call_count, 1)
+
+    def test_etag_cambia_al_editar_el_documento_o_una_fila_hija(self):
+        etags = [self._descargar()[0]['ETag']]
+
+        self.lista.periodo = 'Agosto-Diciembre 2031'
+        self.lista.save()
+        etags.append(self._descargar()[0]['ETag'])
+
+        participante = self.lista.participantes.get(no_consecutivo=1)
+        participante.nombre = 'Nombre corregido'
+        participante.save()
+        etags.append(self._descargar()[0]['ETag'])
+
+        self.assertEqual(len(set(etags)), 3)
+        self.assertEqual(self.html_a_pdf.call_count, 3)
+
+    def test_guardar_durante_la_descarga_no_la_rompe(self):
+        self._descargar()
+
+        def guardan_a_la_mitad(tipo, html_string, destino=None):
+            # signals.py borra la carpeta del registro mientras el PDF se está escribiendo
+            pdf_cache.invalidar('asistencia', self.lista.pk)
+            return _pdf_falso(tipo, html_string, destino)
+
+        self.lista.periodo = 'Enero-Junio 2032'
+        self.lista.save()
+        self.html_a_pdf.side_effect = guardan_a_la_mitad
+        response, contenido = self._descargar()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(contenido.startswith(b'%PDF'))
+
+        # Y si la carpeta desaparece justo al publicar, se sirve el PDF sin guardarlo en la caché
+        self.lista.periodo = 'Agosto-Diciembre 2032'
+        self.lista.save()
+        with mock.patch.object(pdf_cache.os, 'replace', side_effect=FileNotFoundError):
+            response, contenido = self._descargar()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(contenido.startswith(b'%PDF'))
+        self.assertFalse(pdf.pdf_en_cache('asistencia', self.lista))
+        self.assertEqual(os.listdir(os.path.join(settings.PDF_CACHE_DIR, '.tmp')), [])
+
+    def test_recorta_solo_cuando_la_estimacion_pasa_del_limite(self):
+        with override_settings(PDF_CACHE_MAX_BYTES=1000), \
+                mock.patch.object(pdf_cache, 'recortar', wraps=pdf_cache.recortar) as recortar:
+            for pk in range(1, 14):
+                pdf_cache.guardar('encuesta', pk, 'clave', b'x' * 100)
+            # La primera mide la carpeta; luego solo al pasar de 1000 bytes (y se deja en 900)
+            self.assertEqual(recortar.call_count, 3)
+            self.assertEqual(recortar(), 900)
+        self.assertEqual(sum(pdf_cache.existe('encuesta', pk, 'clave') for pk in range(1, 14)), 9)
+
+    def test_if_none_match_responde_304_sin_generar(self):
+        etag = self._descargar()[0]['ETag']
+        response, contenido = self._descargar(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((response.status_code, contenido), (304, b''))
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(self.html_a_pdf.call_count, 1)
+
+
+class _PoolEnLinea:
+    """Sustituto de ProcessPoolExecutor que corre cada tarea al momento, en este proceso."""
+
+    def submit(self, funcion, *args):
+        futuro = Future()
+        try:
+            futuro.set_result(funcion(*args))
+        except BaseException as error:
+            futuro.set_exception(error)
+        return futuro
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+
+class ColaPDFTests(PDFFalsoTestCase):
+
+    def _ejecutar(self):
+        with mock.patch.object(pdf_cola, '_pool', return_value=_PoolEnLinea()), \
+                mock.patch.object(pdf_cola.connections, 'close_all'):
+            pdf_cola.ejecutar(una_vez=True, espera=0)
+
+    def test_trabajo_encolado_termina_listo_y_queda_en_cache(self):
+        encuesta, _ = sembrar('encuesta', 'tipico')
+        trabajo = pdf_cola.encolar('encuesta', encuesta.pk)
+        self.assertEqual(pdf_cola.encolar('encuesta', encuesta.pk), trabajo)
+
+        self._ejecutar()
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.estado, 'listo')
+        self.assertTrue(pdf.pdf_en_cache('encuesta', encuesta))
+
+        # Ya terminado, una nueva petición crea otro trabajo
+        self.assertNotEqual(pdf_cola.encolar('encuesta', encuesta.pk), trabajo)
+
+    def test_prerender_deja_el_pdf_en_cache_y_sin_cache_no_hace_nada(self):
+        encuesta, _ = sembrar('encuesta', 'tipico')
+        with override_settings(PDF_PRERENDER='hilo', PDF_CACHE_MAX_BYTES=0), \
+                self.captureOnCommitCallbacks() as callbacks:
+            pdf_cola.prerenderizar('encuesta', encuesta.pk)
+        self.assertEqual(callbacks, [])
+
+        # Lo que corre el hilo (aquí en el mismo, con la conexión de la prueba)
+        with mock.patch.object(pdf_cola, 'connection'):
+            pdf_cola._prerenderizar_en_hilo('encuesta', encuesta.pk)
+        self.assertTrue(pdf.pdf_en_cache('encuesta', encuesta))
+
+    def test_trabajo_que_truena_queda_en_error_y_la_cola_sigue(self):
+        encuestas = [sembrar('encuesta', 'tipico')[0] for _ in range(2)]
+        malo, bueno = [pdf_cola.encolar('encuesta', e.pk) for e in encuestas]
+        original = pdf_cola.procesar_trabajo
+
+        def procesar(trabajo_id):
+            if trabajo_id == malo.pk:
+                raise RuntimeError('se cayó la base')
+            return original(trabajo_id)
+
+        with mock.patch.object(pdf_cola, 'procesar_trabajo', side_effect=procesar), \
+                self.assertLogs('Sistema.pdf_cola', 'ERROR'):
+            self._ejecutar()
+        malo.refresh_from_db()
+        bueno.refresh_from_db()
+        self.assertEqual((malo.estado, bueno.estado), ('error', 'listo'))
+        self.assertIn('se cayó la base', malo.error)
+
+    def test_la_cola_sobrevive_a_una_caida_de_la_base_y_renueva_conexiones(self):
+        encuesta, _ = sembrar('encuesta', 'tipico')
+        trabajo = pdf_cola.encolar('encuesta', encuesta.pk)
+        original = pdf_cola.tomar_trabajos
+        caidas = [DatabaseError('se reinició la base')]
+
+        def tomar(cantidad):
+            if caidas:
+                raise caidas.pop()
+            return original(cantidad)
+
+        with mock.patch.object(pdf_cola, 'tomar_trabajos', side_effect=tomar), \
+                mock.patch.object(pdf_cola, 'close_old_connections') as cerrar_viejas, \
+                self.assertLogs('Sistema.pdf_cola', 'ERROR'):
+            self._ejecutar()
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.estado, 'listo')
+        self.assertEqual(cerrar_viejas.call_count, 2)
+
+    def test_exportacion_zip_por_la_cola_con_una_entrada_por_registro(self):
+        self.client.force_login(User.objects.create_superuser('admin'))
+        encuestas = [sembrar('encuesta', 'tipico')[0] for _ in range(3)]
+        EncuestaSatisfaccion.objects.filter(pk__in=[e.pk for e in encuestas[:2]]).update(periodo='2025-1')
+
+        response = self.client.get(reverse('exportar_periodo_zip'), {'periodo': '2025-1', 'tipos': 'encuesta'})
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['estado'], 'pendiente')
+
+        self._ejecutar()
+        estado = self.client.get(response.json()['url_estado']).json()
+        self.assertEqual(estado['estado'], 'listo')
+
+        descarga = self.client.get(estado['url_descarga'])
+        self.assertEqual(descarga['Content-Type'], 'application/zip')
+        with zipfile.ZipFile(io.BytesIO(b''.join(descarga.streaming_content))) as archivo_zip:
+            self.assertEqual(sorted(archivo_zip.namelist()),
+                             sorted(f'encuesta/encuesta_{e.pk}.pdf' for e in encuestas[:2]))
+
+    def test_pdf_unido_del_periodo_por_la_cola(self):
+        self.client.force_login(User.objects.create_superuser('admin'))
+        url = reverse('exportar_periodo_unido')
+        self.assertEqual(self.client.get(url, {'periodo': '2025-1', 'tipo': 'encuesta'}).status_code, 404)
+
+        encuesta, _ = sembrar('encuesta', 'tipico')
+        EncuestaSatisfaccion.objects.filter(pk=encuesta.pk).update(periodo='2025-1')
+        trabajo = self.client.get(url, {'periodo': '2025-1', 'tipo': 'encuesta'}).json()
+
+        def unido(periodo, tipo, destino):
+            destino.write(b'%PDF-1.7 unido')
+            return True
+
+        with mock.patch('Sistema.pdf_lote.pdf_unido_periodo', side_effect=unido):
+            self._ejecutar()
+        descarga = self.client.get(self.client.get(trabajo['url_estado']).json()['url_descarga'])
+        self.assertEqual(b''.join(descarga.streaming_content), b'%PDF-1.7 unido')
+        self.assertIn('encuesta_2025-1.pdf', descarga['Content-Disposition'])
+
+    def _sin_latido(self, trabajo):
+        """Deja la reserva del intento vigente como si su procesador llevara rato sin dar señales."""
+        antes = timezone.now() - timedelta(seconds=settings.PDF_COLA_TIMEOUT + 60)
+        pdf_cola._de_este_intento(trabajo).update(fecha_actualizacion=antes)
+
+    def _exportacion_recuperada_a_media(self, tipo, tipos):
+        """
+        Corre una exportación y, mientras escribe, otro procesador la recupera: ese primer
+        intento no debe publicar su archivo ni cerrar el trabajo; el segundo sí.
+        """
+        trabajo = pdf_cola.encolar_exportacion(tipo, '2025-1', tipos)
+        self.assertEqual(pdf_cola.tomar_trabajos(1), [trabajo.pk])
+        trabajo.refresh_from_db()
+
+        # Con el latido al día no se recupera; sin él, sí
+        self._sin_latido(trabajo)
+        self.assertTrue(pdf_cola.renovar(trabajo))
+        self.assertEqual(pdf_cola.tomar_trabajos(1), [])
+
+        extension, content_type, escribir = pdf_lote.EXPORTACIONES[tipo]
+
+        def escribir_y_perderlo(periodo, tipos, archivo):
+            escribir(periodo, tipos, archivo)
+            self._sin_latido(trabajo)
+            self.assertEqual(pdf_cola.tomar_trabajos(1), [trabajo.pk])
+
+        with mock.patch.dict(pdf_lote.EXPORTACIONES, {tipo: (extension, content_type, escribir_y_perderlo)}), \
+                self.assertLogs('Sistema.pdf_cola', 'WARNING'):
+            pdf_cola.procesar_trabajo(trabajo.pk)
+        trabajo.refresh_from_db()
+        self.assertEqual((trabajo.estado, trabajo.intento, trabajo.archivo), ('procesando', 2, ''))
+        self.assertEqual(os.listdir(settings.PDF_EXPORTACIONES_DIR), [])
+
+        # El intento vigente termina normalmente
+        pdf_cola.procesar_trabajo(trabajo.pk)
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.estado, 'listo')
+        self.assertEqual(os.listdir(settings.PDF_EXPORTACIONES_DIR), [os.path.basename(trabajo.archivo)])
+        return trabajo
+
+    def test_exportacion_zip_recuperada_a_media_no_se_publica_dos_veces(self):
+        encuestas = [sembrar('encuesta', 'tipico')[0] for _ in range(2)]
+        EncuestaSatisfaccion.objects.filter(pk__in=[e.pk for e in encuestas]).update(periodo='2025-1')
+
+        trabajo = self._exportacion_recuperada_a_media('zip', ['encuesta'])
+        with zipfile.ZipFile(trabajo.archivo) as archivo_zip:
+            self.assertEqual(len(archivo_zip.namelist()), 2)
+
+    def test_pdf_unido_recuperado_a_media_no_se_pisa(self):
+        # Un solo render largo de WeasyPrint: el latido corre en su propio hilo mientras tanto
+        def unido(periodo, tipo, destino):
+            destino.write(b'%PDF-1.7 unido')
+            return True
+
+        with mock.patch('Sistema.pdf_lote.pdf_unido_periodo', side_effect=unido):
+            trabajo = self._exportacion_recuperada_a_media('unido', ['encuesta'])
+        with open(trabajo.archivo, 'rb') as archivo:
+            self.assertEqual(archivo.read(), b'%PDF-1.7 unido')
+
+
+def _dormir(segundos):
+    """Tarea de prueba para los procesos aislados (se importa desde el proceso hijo)."""
+    time.sleep(segundos)
+    return os.getpid()
+
+
+class RenderAisladoTests(SimpleTestCase):
+
+    def setUp(self):
+        ajustes = override_settings(PDF_AISLADO_PROCESOS=2, PDF_AISLADO_MEMORIA_MB=0, PDF_AISLADO_RENDERS=0)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.addCleanup(pdf_aislado.cerrar)
+
+    def test_timeout_termina_solo_su_proceso(self):
+        resultado = {}
+        otro = threading.Thread(target=lambda: resultado.update(pid=pdf_aislado.ejecutar(_dormir, 2, timeout=60)))
+        otro.start()
+        with self.assertRaises(pdf_aislado.PDFNoDisponible):
+            pdf_aislado.ejecutar(_dormir, 60, timeout=1)
+        otro.join()
+
+        # El PDF que corría a la vez terminó bien, y su proceso se reutiliza
+        self.assertIn('pid', resultado)
+        self.assertEqual(pdf_aislado.ejecutar(_dormir, 0), resultado['pid'])
+
+
+# =======================================================
+# GUARDADO DE FORMULARIOS CON TABLAS HIJAS
+# =======================================================
+class GuardadoEnBloqueTests(TestCase):
+
+    def _encabezado(self, tipo):
+        """Datos del documento padre tomados de un registro sembrado (como los mandaría el formulario)."""
+        registro, _ = sembrar(tipo, 'tipico')
+        return {campo: valor for campo, valor in model_to_dict(registro).items() if valor is not None}
+
+    def _filas_programa(self, n):
+        return {f'{campo}_{i}': f'{campo} {i}' for i in range(1, n + 1)
+                for campo in ['curso', 'objetivo', 'periodo', 'lugar', 'instructor', 'dirigido']}
+
+    def _filas_diagnostico(self, n):
+        datos = {}
+        for i in range(1, n + 1):
+            for letra in 'ab':
+                datos.update({f'{letra}_asignatura_{i}': 'Asignatura', f'{letra}_num_profes_{i}': '3'})
+            for letra in 'cd':
+                datos.update({f'{letra}_actividad_{i}': 'Actividad', f'{letra}_fecha_{i}': 'Enero'})
+        return datos
+
+    def _filas_cv(self, n):
+        return {f'{campo}_{i}': 'Dato' for i in range(1, n + 1)
+                for campo in ['exp_puesto', 'doc_materia', 'prod_actividad', 'inst_curso']}
+
+    def _filas_registro(self, n):
+        return {f'{campo}_{i}': valor for i in range(1, n + 1) for campo, valor in [
+            ('curso', f'Curso {i}'), ('f_inicio', '2025-01-06'), ('f_termino', '2025-01-10'), ('horas', '30'),
+            ('inscritos', '20'), ('terminaron', '18'), ('acreditados', '15'),
+        ]}
+
+    def _consultas(self, url, datos):
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.post(url, datos)
+        self.assertEqual(response.status_code, 302)
+        return len(consultas)
+
+    def test_consultas_no_dependen_del_numero_de_filas(self):
+        # (url, tipo sembrado, filas del POST, filas a llenar, modelo padre, relación, filas esperadas)
+        casos = [
+            ('Programa', 'programa', self._filas_programa, 10, ProgramaInstitucional, 'detalles', 10),
+            ('Diagnostico', 'diagnostico', self._filas_diagnostico, 3, DiagnosticoNecesidades, 'asignaturas', 6),
+            ('CV', 'cv', self._filas_cv, 3, CurriculumVitae, 'cvexperiencialaboral_set', 3),
+            ('Registro', 'registro', self._filas_registro, 15, RegistroGeneral, 'filas', 15),
+        ]
+        for nombre, tipo, filas, maximo, modelo, relacion, esperadas in casos:
+            with self.subTest(formulario=nombre):
+                encabezado = self._encabezado(tipo)
+                una = self._consultas(reverse(nombre), {**encabezado, **filas(1)})
+                todas = self._consultas(reverse(nombre), {**encabezado, **filas(maximo)})
+                self.assertEqual(una, todas)
+                self.assertEqual(getattr(modelo.objects.latest('pk'), relacion).count(), esperadas)
+
+    def test_doble_envio_con_el_mismo_token_no_duplica(self):
+        casos = [('Inscripcion', 'inscripcion', {}), ('Encuesta', 'encuesta', {}), ('CV', 'cv', self._filas_cv(3))]
+        for nombre, tipo, filas in casos:
+            with self.subTest(formulario=nombre):
+                datos = {**self._encabezado(tipo), **filas, 'token_envio': str(uuid.uuid4())}
+                modelo = PDF_CONFIG[tipo]['model']
+                antes = modelo.objects.count()
+                primera = self.client.post(reverse(nombre), datos)
+                with CaptureQueriesContext(connection) as consultas:
+                    segunda = self.client.post(reverse(nombre), datos)
+                self.assertEqual(modelo.objects.count(), antes + 1)
+                self.assertFalse([q for q in consultas if q['sql'].startswith('INSERT')])
+                self.assertEqual((primera.status_code, segunda.status_code), (302, 302))
+                self.assertEqual(self.client.session['pdf_download']['pk'], modelo.objects.latest('pk').pk)
+
+    def test_token_de_otro_formulario_guarda_con_uno_nuevo(self):
+        token = str(uuid.uuid4())
+        self.client.post(reverse('Inscripcion'), {**self._encabezado('inscripcion'), 'token_envio': token})
+        datos = {**self._encabezado('encuesta'), 'token_envio': token}
+        antes = EncuestaSatisfaccion.objects.count()
+
+        response = self.client.post(reverse('Encuesta'), datos)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(EncuestaSatisfaccion.objects.count(), antes + 1)
+        self.assertEqual(self.client.session['pdf_download'],
+                         {'tipo': 'encuesta', 'pk': EncuestaSatisfaccion.objects.latest('pk').pk})
+
+    def test_registro_reporta_todas_las_filas_invalidas_sin_escribir(self):
+        datos = {**self._encabezado('registro'), **self._filas_registro(15)}
+        datos.update({'horas_2': 'muchas', 'f_inicio_15': 'ayer'})
+        antes = RegistroGeneral.objects.count()
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.post(reverse('Registro'), datos)
+        self.assertEqual(RegistroGeneral.objects.count(), antes)
+        self.assertFalse([q for q in consultas if q['sql'].startswith('INSERT')])
+        errores = [str(m) for m in response.context['messages']]
+        self.assertEqual([e.split(':')[0] for e in errores], ['Fila 2', 'Fila 15'])
+        # Lo capturado vuelve a la pantalla
+        self.assertContains(response, 'Curso 14')
+
+    def test_asistencia_guarda_solo_las_filas_que_cambiaron(self):
+        self.client.force_login(User.objects.create_user('instructor'))
+        encabezado = self._encabezado('asistencia')
+        encabezado.update({'instructor_rfc': 'RFC', 'instructor_curp': 'CURP',
+                           'coordinador_rfc': 'RFC', 'coordinador_curp': 'CURP'})
+        filas = {f'nombre_{i}': f'Participante {i}' for i in range(1, 31)}
+        self.client.post(reverse('Asistencia'), {**encabezado, **filas})
+        lista = ListaAsistencia.objects.latest('pk')
+        antes = dict(lista.participantes.values_list('no_consecutivo', 'pk'))
+
+        # Se corrige un nombre, se quita una fila y se agrega otra
+        filas.update({'nombre_2': 'Corregido', 'nombre_31': 'Nuevo'})
+        del filas['nombre_5']
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.post(reverse('editar_asistencia', args=[lista.pk]), {**encabezado, **filas})
+        escrituras = [q['sql'].split()[0] for q in consultas if 'asistenciaparticipante' in q['sql']
+                      and not q['sql'].startswith('SELECT')]
+        self.assertEqual(sorted(escrituras), ['DELETE', 'INSERT', 'UPDATE'])
+        # La lista se guarda una vez; borrar la fila no la vuelve a tocar
+        listas = [q for q in consultas if q['sql'].startswith('UPDATE') and 'listaasistencia' in q['sql']]
+        self.assertEqual(len(listas), 1)
+
+        # La hoja agregada (participantes 24 en adelante) es la actual
+        lista.refresh_from_db()
+        self.assertEqual((lista.hoja_actual, lista.hoja_total), ('2', '2'))
+
+        despues = dict(lista.participantes.values_list('no_consecutivo', 'pk'))
+        self.assertEqual(sorted(despues), [n for n in range(1, 32) if n != 5])
+        self.assertTrue(all(despues[n] == antes[n] for n in antes if n != 5))
+        self.assertEqual(lista.participantes.get(no_consecutivo=2).nombre, 'Corregido')
+
+    @override_settings(ASISTENCIA_MAX_HOJAS=1)
+    def test_asistencia_rechaza_participantes_de_mas_sin_perderlos(self):
+        self.client.force_login(User.objects.create_user('instructor'))
+        encabezado = self._encabezado('asistencia')
+        encabezado.update({'instructor_rfc': 'RFC', 'instructor_curp': 'CURP',
+                           'coordinador_rfc': 'RFC', 'coordinador_curp': 'CURP'})
+        filas = {f'nombre_{i}': f'Participante {i}' for i in range(1, 26)}
+        antes = ListaAsistencia.objects.count()
+
+        response = self.client.post(reverse('Asistencia'), {**encabezado, **filas})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(ListaAsistencia.objects.count(), antes)
+        self.assertIn('hasta 23 participantes', str(list(response.context['messages'])[0]))
+        # Lo capturado vuelve a la pantalla, también las filas de más
+        self.assertContains(response, 'value="Participante 25"')
+
+
+# =======================================================
+# GUARDADO AUTOMÁTICO DE ASISTENCIA (API POR CELDA)
+# =======================================================
+class GuardadoAutomaticoAsistenciaTests(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('instructor')
+        self.client.force_login(self.usuario)
+        self.lista, _ = sembrar('asistencia', 'tipico')
+        ListaAsistencia.objects.filter(pk=self.lista.pk).update(usuario=self.usuario, estado='borrador')
+
+    def _enviar(self, cambios, lista=None):
+        url = reverse('api_guardar_asistencia', args=[(lista or self.lista).pk])
+        return self.client.post(url, json.dumps({'cambios': cambios}), content_type='application/json')
+
+    def test_aplica_solo_las_celdas_enviadas(self):
+        rfc_original = self.lista.participantes.get(no_consecutivo=1).rfc
+        response = self._enviar([
+            {'no': 1, 'campo': 'asist_l', 'valor': 'X'},
+            {'no': 30, 'campo': 'nombre', 'valor': 'Nuevo'},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['hojas'], 2)
+        self.lista.refresh_from_db()
+        self.assertEqual((self.lista.hoja_actual, self.lista.hoja_total), ('2', '2'))
+        fila = self.lista.participantes.get(no_consecutivo=1)
+        self.assertEqual((fila.asist_l, fila.rfc), ('X', rfc_original))
+        self.assertTrue(self.lista.participantes.filter(no_consecutivo=30, nombre='Nuevo').exists())
+
+    def test_celdas_no_validas_se_avisan_sin_perder_las_demas(self):
+        response = self._enviar([
+            {'no': 1, 'campo': 'lista_id', 'valor': '1'},
+            {'no': 1, 'campo': 'asist_m1', 'valor': 'X'},
+            {'no': 31, 'campo': 'rfc', 'valor': 'SINNOMBRE'},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.json()['errores']), {'lista_id_1', 'rfc_31'})
+        self.assertEqual(self.lista.participantes.get(no_consecutivo=1).asist_m1, 'X')
+        # Como al guardar el formulario: sin nombre la fila no se crea, y si ya estaba se quita
+        self.assertFalse(self.lista.participantes.filter(no_consecutivo=31).exists())
+        self._enviar([{'no': 1, 'campo': 'nombre', 'valor': ''}])
+        self.assertFalse(self.lista.participantes.filter(no_consecutivo=1).exists())
+
+    def test_rechaza_lotes_mal_formados_y_listas_ajenas_o_finalizadas(self):
+        self.assertEqual(self._enviar({'no': 1, 'campo': 'nombre', 'valor': 'X'}).status_code, 400)
+
+        ajena, _ = sembrar('asistencia', 'tipico')
+        self.assertEqual(self._enviar([{'no': 1, 'campo': 'nombre', 'valor': 'X'}], ajena).status_code, 404)
+
+        ListaAsistencia.objects.filter(pk=self.lista.pk).update(estado='finalizado')
+        self.assertEqual(self._enviar([{'no': 1, 'campo': 'nombre', 'valor': 'X'}]).status_code, 409)
+
+
+# =======================================================
+# ESTADÍSTICAS DE ENCUESTAS
+# =======================================================
+class EstadisticasTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def _encuesta(self, periodo, facilitador, calificacion):
+        # execute=True: corre los on_commit (la invalidación de la caché) como en producción
+        with self.captureOnCommitCallbacks(execute=True):
+            encuesta, _ = sembrar('encuesta', 'tipico')
+            encuesta.periodo, encuesta.facilitador = periodo, facilitador
+            for q in estadisticas_encuestas.PREGUNTAS:
+                setattr(encuesta, q, calificacion)
+            encuesta.save()
+        return encuesta
+
+    def _promedios_directos(self, **filtro):
+        encuestas = EncuestaSatisfaccion.objects.filter(**filtro)
+        return {q: encuestas.aggregate(p=Avg(q))['p'] for q in estadisticas_encuestas.PREGUNTAS}
+
+    def test_resumen_sigue_altas_cambios_y_bajas(self):
+        self._encuesta('2025-1', 'Ana', 5)
+        otra = self._encuesta('2025-1', 'Ana', 3)
+        borrada = self._encuesta('2025-2', 'Luis', 4)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            otra.q1 = 1
+            otra.save()
+            borrada.delete()
+
+        for filtro in [{}, {'periodo': '2025-1'}, {'facilitador': 'Ana'}]:
+            with self.subTest(**filtro):
+                self.assertEqual(estadisticas_encuestas.promedios(**filtro), self._promedios_directos(**filtro))
+        self.assertEqual(estadisticas_encuestas.opciones_filtro(), (['2025-1'], ['Ana']))
+        self.assertFalse(ResumenEncuesta.objects.filter(facilitador='Luis').exists())
+
+    def test_tablero_no_depende_del_numero_de_encuestas(self):
+        self._encuesta('2025-1', 'Ana', 5)
+        with CaptureQueriesContext(connection) as pocas:
+            self.client.get(reverse('Estadisticas'), {'periodo': '2025-1'})
+        for _ in range(20):
+            self._encuesta('2025-1', 'Ana', 4)
+        with CaptureQueriesContext(connection) as muchas:
+            response = self.client.get(reverse('Estadisticas'), {'periodo': '2025-1'})
+        self.assertEqual(len(pocas), len(muchas))
+        self.assertEqual(response.context['datos_grafica'][0], round((5 + 20 * 4) / 21, 2))
+
+    def test_tablero_sale_de_la_cache_hasta_que_cambia_una_encuesta(self):
+        self._encuesta('2025-1', 'Ana', 5)
+        self.client.get(reverse('Estadisticas'))
+        with self.assertNumQueries(0):
+            estadisticas_encuestas.opciones_filtro()
+            estadisticas_encuestas.promedios()
+
+        self._encuesta('2025-2', 'Luis', 3)
+        self.assertEqual(estadisticas_encuestas.opciones_filtro(), (['2025-1', '2025-2'], ['Ana', 'Luis']))
+        self.assertEqual(estadisticas_encuestas.promedios()['q1'], 4)
+
+    def test_distribucion_en_una_sola_consulta(self):
+        for calificacion in [1, 5, 5]:
+            self._encuesta('2025-1', 'Ana', calificacion)
+        self._encuesta('2025-2', 'Ana', 3)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('api_distribucion_encuestas'), {'periodo': '2025-1'})
+        data = response.json()
+        self.assertEqual(data['n'], 3)
+        q1 = data['preguntas'][0]
+        self.assertEqual(q1['conteos'], {'1': 1, '2': 0, '3': 0, '4': 0, '5': 2})
+        self.assertEqual(q1['promedio'], round(11 / 3, 2))
+        self.assertEqual(q1['desviacion'], round(statistics.pstdev([1, 5, 5]), 2))
+
+    def test_ranking_por_periodo_con_percentil(self):
+        for facilitador, calificacion in [('Ana', 5), ('Luis', 3), ('Eva', 4), ('Eva', 2)]:
+            self._encuesta('2025-1', facilitador, calificacion)
+        self._encuesta('2025-2', 'Ana', 1)
+
+        response = self.client.get(reverse('ranking_facilitadores'), {'periodo': '2025-1'})
+        filas = [(f['facilitador'], f['lugar'], f['percentil'], f['banda']) for f in response.context['pagina']]
+        self.assertEqual(filas, [('Ana', 1, 100, 'Superior'), ('Eva', 2, 0, 'Inferior'), ('Luis', 2, 0, 'Inferior')])
+        self.assertEqual(response.context['pagina'][1]['respuestas'], 2)
+
+        # Segunda visita: sale de la caché
+        with self.assertNumQueries(0):
+            estadisticas_encuestas.ranking_facilitadores('2025-1')
+
+    def test_periodos_en_orden_cronologico(self):
+        for periodo in ['Enero-Junio 2024', 'Agosto-Diciembre 2023', 'Agosto-Diciembre 2024', '2023-1']:
+            self._encuesta(periodo, 'Ana', 4)
+
+        cronologico = ['2023-1', 'Agosto-Diciembre 2023', 'Enero-Junio 2024', 'Agosto-Diciembre 2024']
+        self.assertEqual(estadisticas_encuestas.opciones_filtro()[0], cronologico)
+        self.assertEqual([p['periodo'] for p in estadisticas_encuestas.tendencia()], cronologico)
+        self.assertEqual([f['periodo'] for f in estadisticas_encuestas.ranking_facilitadores()], cronologico[::-1])
+
+    def test_tendencia_por_periodo_general_y_por_facilitador(self):
+        self._encuesta('2025-2', 'Ana', 5)
+        self._encuesta('2025-1', 'Ana', 3)
+        self._encuesta('2025-1', 'Luis', 4)
+
+        with self.assertNumQueries(1):
+            periodos = estadisticas_encuestas.tendencia()
+        self.assertEqual([(p['periodo'], p['n'], p['general']) for p in periodos],
+                         [('2025-1', 2, 3.5), ('2025-2', 1, 5.0)])
+        self.assertEqual(periodos[0]['promedios']['q1'], 3.5)
+
+        data = self.client.get(reverse('api_tendencia_encuestas'), {'facilitador': 'Luis'}).json()
+        self.assertEqual([(p['periodo'], p['general']) for p in data['periodos']], [('2025-1', 4.0)])
+
+        # Una encuesta nueva invalida la serie guardada
+        self._encuesta('2025-2', 'Ana', 1)
+        self.assertEqual(estadisticas_encuestas.tendencia()[1]['general'], 3.0)
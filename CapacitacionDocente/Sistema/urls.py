@@ -24,7 +24,15 @@ urlpatterns = [
     path('cursos/editar/', views.editar_curso, name='editar_curso'),
     path('cursos/eliminar/', views.eliminar_curso, name='eliminar_curso'),
     path('estadisticas/', views.estadisticas, name='Estadisticas'),
+    path('estadisticas/ranking/', views.ranking_facilitadores, name='ranking_facilitadores'),
+    path('estadisticas/distribucion/', views.api_distribucion_encuestas, name='api_distribucion_encuestas'),
+    path('estadisticas/tendencia/', views.api_tendencia_encuestas, name='api_tendencia_encuestas'),
+    path('pdf/trabajo/<int:trabajo_id>/', views.estado_pdf, name="estado_pdf"),
+    path('pdf/periodo/', views.exportar_periodo_zip, name="exportar_periodo_zip"),
+    path('pdf/periodo/unido/', views.exportar_periodo_unido, name="exportar_periodo_unido"),
+    path('pdf/exportacion/<int:trabajo_id>/', views.descargar_exportacion, name="descargar_exportacion"),
     path('pdf/<str:tipo>/<int:pk>/', views.descargar_pdf_generico, name="descargar_pdf"),
     path('api/buscar-curso/', views.api_buscar_curso, name='api_buscar_curso'),
     path('api/buscar-profesor/', views.api_buscar_profesor, name='api_buscar_profesor'),
+    path('api/asistencia/<int:pk>/', views.api_guardar_asistencia, name='api_guardar_asistencia'),
 ]
\ No newline at end of file
@@ -1,11 +1,21 @@
+import json
+import logging
+import os
+import re
+import uuid
+
+from django.conf import settings
 from django.contrib.auth import authenticate, login, logout
-from django.db.models import Avg
+from django.db import IntegrityError, transaction
+from django.db.models import Max
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
-from django.template.loader import render_to_string
-from django.http import HttpResponse
-import weasyprint
+from django.core.paginator import Paginator
+from django.http import FileResponse, HttpResponse
 from django.http import JsonResponse
 from django.db.models import Q
 
@@ -13,159 +23,97 @@ from .forms import (
     InscripcionForm, ListaAsistenciaForm, CriteriosSeleccionForm,
     CurriculumVitaeForm, DiagnosticoNecesidadesForm, EncuestaSatisfaccionForm,
     FichaTecnicaForm, ProgramaInstitucionalForm,
-    RegistroFilaForm
+    RegistroGeneralForm, RegistroFilaForm
 )
 from .models import (
-    Curso, Inscripcion, FichaTecnica, CriteriosSeleccion, EncuestaSatisfaccion,
-    ProgramaInstitucional, ProgramaDetalle,
-    DiagnosticoNecesidades, DiagnosticoAsignatura, DiagnosticoActividad,
-    CurriculumVitae, CVExperienciaLaboral, CVExperienciaDocente, CVProductoAcademico, CVParticipacionInstructor,
-    ListaAsistencia, AsistenciaParticipante,
-    RegistroGeneral, RegistroFila, Profesor
+    Curso, ProgramaDetalle, DiagnosticoAsignatura, DiagnosticoActividad,
+    CVExperienciaLaboral, CVExperienciaDocente, CVProductoAcademico, CVParticipacionInstructor,
+    ListaAsistencia, AsistenciaParticipante, Profesor, TrabajoPDF, EnvioFormulario
+)
+from . import estadisticas_encuestas, pdf_aislado, pdf_cola, pdf_lote
+from .signals import filas_en_bloque
+from .pdf import (
+    PARTICIPANTES_POR_HOJA, PDF_CONFIG, archivo_pdf, etag_pdf, filas_en_hojas, max_participantes, pdf_en_cache,
+    tablas_asistencia,
 )
 
-# --- 2. DICCIONARIO MAESTRO (CONFIGURACIÓN) ---
-# Aquí registras cada formato. Si creas uno nuevo, solo agregas una línea aquí.
-PDF_CONFIG = {
-    'inscripcion': {
-        'model': Inscripcion,
-        'form': InscripcionForm,
-        'template': 'Sistema/inscripcion/inscripcion.html'
-    },
-    'ficha': {
-        'model': FichaTecnica,
-        'form': FichaTecnicaForm,
-        'template': 'Sistema/ficha/ficha.html'
-    },
-    'criterios': {
-        'model': CriteriosSeleccion,
-        'form': CriteriosSeleccionForm,
-        'template': 'Sistema/criterios/criterios.html'
-    },
-    'cv': {
-        'model': CurriculumVitae,
-        'form': CurriculumVitaeForm,
-        'template': 'Sistema/cv/cv.html'
-    },
-    'encuesta': {
-        'model': EncuestaSatisfaccion,
-        'form': EncuestaSatisfaccionForm,
-        'template': 'Sistema/encuesta/encuesta.html'
-    },
-    'programa': {
-        'model': ProgramaInstitucional,
-        'form': ProgramaInstitucionalForm,
-        'template': 'Sistema/programa/programa.html'
-    },
-    'diagnostico': {
-        'model': DiagnosticoNecesidades,
-        'form': DiagnosticoNecesidadesForm,
-        'template': 'Sistema/diagnostico/diagnostico.html'
-    },
-    'cv': {
-        'model': CurriculumVitae,
-        'form': CurriculumVitaeForm,
-        'template': 'Sistema/cv/cv.html'
-    },
-    'asistencia': {
-        'model': ListaAsistencia,
-        'form': ListaAsistenciaForm,
-        'template': 'Sistema/asistencia/asistencia.html'
-    },
-    'registro': {
-        'model': RegistroGeneral,
-        'form': None,
-        'template': 'Sistema/registro/registro.html'
-    },
-}
-
+logger = logging.getLogger(__name__)
 
 # --- 3. VISTA GENÉRICA ÚNICA ---
+# La configuración de cada formato (PDF_CONFIG) y el armado del contexto viven en pdf.py
 def descargar_pdf_generico(request, tipo, pk):
     config = PDF_CONFIG.get(tipo)
     if not config: return HttpResponse("Tipo no válido.", status=404)
 
-    if tipo == 'registro':
-        # Buscamos el PADRE específico
-        registro = get_object_or_404(RegistroGeneral, pk=pk)
-        form = None
-    else:
-        registro = get_object_or_404(config['model'], pk=pk)
-        form = config['form'](instance=registro)
+    registro = get_object_or_404(config['model'], pk=pk)
+
+    # MODO ASÍNCRONO (opcional): ?async=1 encola el render y responde de inmediato.
+    # El cliente consulta 'estado_pdf' y, cuando esté listo, descarga esta misma URL sin ?async.
+    if request.GET.get('async'):
+        if pdf_en_cache(tipo, registro):
+            return JsonResponse({'estado': 'listo', 'url_descarga': reverse('descargar_pdf', args=[tipo, pk])})
+        trabajo = pdf_cola.encolar(tipo, pk)
+        return JsonResponse(_datos_trabajo(trabajo), status=202)
+
+    # GET CONDICIONAL: si el navegador/proxy ya tiene esta versión, 304 sin generar nada
+    etag = etag_pdf(tipo, registro)
+    ultima_modificacion = registro.fecha_actualizacion.timestamp()
+    response = get_conditional_response(request, etag=etag, last_modified=int(ultima_modificacion))
+    if response is None:
+        try:
+            archivo, ruta = archivo_pdf(tipo, registro, aislado=True)
+        except pdf_aislado.PDFNoDisponible:
+            logger.warning('PDF %s #%s no disponible', tipo, pk, exc_info=True)
+            response = HttpResponse("No se pudo generar el PDF en este momento. Intenta de nuevo en unos minutos.",
+                                    status=503)
+            response['Retry-After'] = '60'
+            return response
+
+        response = _respuesta_pdf(archivo, ruta, f"{tipo}_{pk}.pdf")
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(ultima_modificacion)
+    # Solo el navegador puede guardarlo, y debe revalidar cada vez (la revalidación es barata)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
 
-    context = {'form': form}
 
-    # ... (Lógica de programa, diagnostico, cv, asistencia IGUAL) ...
-    if tipo == 'programa':
-        detalles_db = {d.no_consecutivo: d for d in registro.detalles.all()}
-        filas = []
-        for i in range(1, 11):
-            d = detalles_db.get(i)
-            filas.append({ 'counter': i, 'nombre_curso': d.nombre_curso if d else '', 'objetivo': d.objetivo if d else '', 'periodo': d.periodo_realizacion if d else '', 'lugar': d.lugar if d else '', 'horas': d.horas if d else '', 'instructor': d.instructor if d else '', 'dirigido': d.dirigido_a if d else '', 'observaciones': d.observaciones if d else '' })
-        context['tabla_filas'] = filas
-
-    elif tipo == 'diagnostico':
-        def obtener_filas(modelo, tipo_tabla, cantidad=3):
-            items = list(modelo.objects.filter(diagnostico=registro, tipo_tabla=tipo_tabla))
-            while len(items) < cantidad: items.append(None)
-            return items
-        context['tabla_a'] = obtener_filas(DiagnosticoAsignatura, 'generica')
-        context['tabla_b'] = obtener_filas(DiagnosticoAsignatura, 'especialidad')
-        context['tabla_c'] = obtener_filas(DiagnosticoActividad, 'docente')
-        context['tabla_d'] = obtener_filas(DiagnosticoActividad, 'profesional')
-
-    elif tipo == 'cv':
-        def obtener_cv_filas(modelo, cantidad=3):
-            items = list(modelo.objects.filter(cv=registro))
-            while len(items) < cantidad: items.append(None)
-            return items
-        context['tabla_laboral'] = obtener_cv_filas(CVExperienciaLaboral)
-        context['tabla_docente'] = obtener_cv_filas(CVExperienciaDocente)
-        context['tabla_productos'] = obtener_cv_filas(CVProductoAcademico)
-        context['tabla_instructor'] = obtener_cv_filas(CVParticipacionInstructor)
-
-    elif tipo == 'asistencia':
-        participantes_db = {p.no_consecutivo: p for p in registro.participantes.all()}
-        filas = []
-        for i in range(1, 24):
-            p = participantes_db.get(i)
-            filas.append({ 'counter': i, 'nombre': p.nombre if p else '', 'rfc': p.rfc if p else '', 'puesto': p.puesto if p else '', 'sexo': p.sexo if p else '', 'asist_l': p.asist_l if p else '', 'asist_m1': p.asist_m1 if p else '', 'asist_m2': p.asist_m2 if p else '', 'asist_j': p.asist_j if p else '', 'asist_v': p.asist_v if p else '', 'concluyo': p.concluyo if p else '' })
-        context['tabla_participantes'] = filas
-
-    # --- LÓGICA REGISTRO (NUEVO) ---
-    elif tipo == 'registro':
-        # Recuperamos las FILAS de este registro
-        filas_db = {r.no_consecutivo: r for r in registro.filas.all()}
-        filas = []
-        for i in range(1, 16):
-            r = filas_db.get(i)
-            filas.append({
-                'counter': i,
-                'instituto': r.instituto if r else '',
-                'nombre_curso': r.nombre_curso if r else '',
-                'es_formacion': 'X' if r and r.es_formacion else '',
-                'es_actualizacion': 'X' if r and r.es_actualizacion else '',
-                'instructor': r.instructor if r else '',
-                'fecha_inicio': r.fecha_inicio if r else '',
-                'fecha_termino': r.fecha_termino if r else '',
-                'horas': r.horas if r else '',
-                'modalidad': r.modalidad if r else '',
-                'inscritos': r.docentes_inscritos if r else '',
-                'terminaron': r.docentes_terminaron if r else '',
-                'acreditados': r.docentes_acreditados if r else '',
-                'tipo': r.tipo if r else '',
-            })
-        context['tabla_registros'] = filas
-    # ---------------------------------------------
-
-    html_string = render_to_string(config['template'], context)
-    html = weasyprint.HTML(string=html_string, base_url=request.build_absolute_uri())
-    pdf_file = html.write_pdf()
-
-    response = HttpResponse(pdf_file, content_type='application/pdf')
-    filename = f"{tipo}_{pk}.pdf"
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    return response
+def _respuesta_pdf(archivo, ruta, filename):
+    """
+    Envía el PDF sin leerlo completo en memoria: FileResponse lo manda por bloques, o,
+    si está en la caché y PDF_ENVIO lo indica, el servidor web lo manda por su cuenta.
+    """
+    if ruta and settings.PDF_ENVIO:
+        archivo.close()
+        response = HttpResponse(content_type='application/pdf')
+        if settings.PDF_ENVIO == 'x-accel':
+            relativa = os.path.relpath(ruta, settings.PDF_CACHE_DIR).replace(os.sep, '/')
+            response['X-Accel-Redirect'] = settings.PDF_X_ACCEL_PREFIJO.rstrip('/') + '/' + relativa
+        else:
+            response['X-Sendfile'] = ruta
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+    return FileResponse(archivo, as_attachment=True, filename=filename, content_type='application/pdf')
+
+
+def _datos_trabajo(trabajo):
+    data = {
+        'id': trabajo.pk,
+        'estado': trabajo.estado,
+        'url_estado': reverse('estado_pdf', args=[trabajo.pk]),
+    }
+    if trabajo.estado == 'listo':
+        if trabajo.tipo in pdf_lote.EXPORTACIONES:
+            data['url_descarga'] = reverse('descargar_exportacion', args=[trabajo.pk])
+        else:
+            data['url_descarga'] = reverse('descargar_pdf', args=[trabajo.tipo, trabajo.objeto_id])
+    return data
+
+
+def estado_pdf(request, trabajo_id):
+    """Estado de un PDF encolado (pendiente, procesando, listo o error) en JSON."""
+    trabajo = get_object_or_404(TrabajoPDF, pk=trabajo_id)
+    return JsonResponse(_datos_trabajo(trabajo))
 
 # --- FUNCIONES DE AYUDA Y AUTENTICACIÓN ---
 
@@ -173,6 +121,58 @@ def es_admin(user):
     return user.is_superuser or user.groups.filter(name='Administradores').exists()
 
 
+# --- EXPORTACIÓN MASIVA (ZIP DEL PERIODO) ---
+# Un periodo completo tarda más que una petición web: la exportación se encola
+# (la arma `manage.py procesar_pdfs`) y se responde 202 con la URL para consultar
+# su estado, igual que ?async=1 en la descarga de un PDF.
+@login_required(login_url='Login')
+@user_passes_test(es_admin, login_url='/')
+def exportar_periodo_zip(request):
+    """Encola el ZIP con todos los PDF del periodo (?periodo=...&tipos=asistencia,encuesta)."""
+    periodo = request.GET.get('periodo', '').strip()
+    if not periodo:
+        return HttpResponse("Falta el periodo.", status=400)
+
+    pedidos = [t for t in request.GET.get('tipos', '').split(',') if t] or pdf_lote.TIPOS_PERIODO
+    if any(t not in pdf_lote.TIPOS_PERIODO for t in pedidos):
+        return HttpResponse("Tipo no válido.", status=400)
+
+    # Siempre en el mismo orden, para que el mismo pedido caiga en el mismo trabajo
+    tipos = [t for t in pdf_lote.TIPOS_PERIODO if t in pedidos]
+    trabajo = pdf_cola.encolar_exportacion('zip', periodo, tipos)
+    return JsonResponse(_datos_trabajo(trabajo), status=202)
+
+
+@login_required(login_url='Login')
+@user_passes_test(es_admin, login_url='/')
+def descargar_exportacion(request, trabajo_id):
+    """Descarga una exportación del periodo ya terminada por la cola."""
+    trabajo = get_object_or_404(TrabajoPDF, pk=trabajo_id, tipo__in=pdf_lote.EXPORTACIONES, estado='listo')
+    try:
+        archivo = open(trabajo.archivo, 'rb')
+    except FileNotFoundError:
+        return HttpResponse("La exportación ya no está disponible. Vuelve a solicitarla.", status=410)
+    return FileResponse(archivo, as_attachment=True, filename=pdf_lote.nombre_descarga(trabajo),
+                        content_type=pdf_lote.EXPORTACIONES[trabajo.tipo][1])
+
+
+@login_required(login_url='Login')
+@user_passes_test(es_admin, login_url='/')
+def exportar_periodo_unido(request):
+    """Encola un solo PDF con todos los documentos de un tipo del periodo (?periodo=...&tipo=asistencia)."""
+    periodo = request.GET.get('periodo', '').strip()
+    tipo = request.GET.get('tipo', 'asistencia')
+    if not periodo:
+        return HttpResponse("Falta el periodo.", status=400)
+    if tipo not in pdf_lote.TIPOS_PERIODO:
+        return HttpResponse("Tipo no válido.", status=400)
+    if not PDF_CONFIG[tipo]['model'].objects.filter(periodo=periodo).exists():
+        return HttpResponse("No hay documentos en ese periodo.", status=404)
+
+    trabajo = pdf_cola.encolar_exportacion('unido', periodo, [tipo])
+    return JsonResponse(_datos_trabajo(trabajo), status=202)
+
+
 def inicio(request):
     return render(request, 'Sistema/inicio/inicio.html')
 
@@ -219,26 +219,103 @@ def menu(request):
 # =======================================================
 # VISTAS DE FORMULARIOS (GUARDADO DE DATOS)
 # =======================================================
+# Las tablas hijas se arman completas antes de tocar la base y se insertan con un
+# solo bulk_create por modelo, en la misma transacción que el documento: el número
+# de consultas no depende de cuántas filas se llenaron.
+
+def _entero(valor):
+    """El número de un input, o None si viene vacío o no es número."""
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+def _guardar_hijos(filas, **padre):
+    """Vincula las filas (sin guardar) al documento padre y las inserta en un solo INSERT."""
+    if not filas:
+        return
+    for fila in filas:
+        for campo, valor in padre.items():
+            setattr(fila, campo, valor)
+    type(filas[0]).objects.bulk_create(filas)
+
+
+# Cada formulario lleva un token_envio oculto. El primer POST guarda el documento y el
+# token en la misma transacción (token con índice único); si el mismo token vuelve a
+# llegar (doble clic, reintento del navegador) se contesta con lo que ya se guardó.
+
+def _token_envio(request):
+    """El token que trae el POST; si no trae uno válido (o es GET), uno nuevo para el formulario."""
+    try:
+        return uuid.UUID(request.POST.get('token_envio', ''))
+    except ValueError:
+        return uuid.uuid4()
+
+
+def _envio(token):
+    """(tipo, pk) de lo que ya se guardó con este token, o None. El token es único entre todos los formularios."""
+    return EnvioFormulario.objects.filter(token=token).values_list('tipo', 'objeto_id').first()
+
+
+def _envio_previo(token, tipo):
+    """pk del documento de este tipo que ya se guardó con este token, o None."""
+    envio = _envio(token)
+    return envio[1] if envio and envio[0] == tipo else None
+
+
+def _guardar_una_vez(token, tipo, guardar):
+    """
+    Corre guardar() (devuelve el documento creado) y registra el token en la misma transacción.
+    Devuelve (pk, nuevo). Si otro POST con el mismo token se adelantó, este se deshace y
+    se devuelve el pk de aquel. Si el token ya lo había usado otro formulario, no es un doble
+    envío de este: se guarda con un token nuevo.
+    """
+    try:
+        with transaction.atomic():
+            registro = guardar()
+            EnvioFormulario.objects.create(token=token, tipo=tipo, objeto_id=registro.pk)
+        return registro.pk, True
+    except IntegrityError:
+        envio = _envio(token)
+        if envio is None:
+            raise
+        if envio[0] != tipo:
+            return _guardar_una_vez(uuid.uuid4(), tipo, guardar)
+        return envio[1], False
+
+
+def _guardado(request, tipo, pk, mensaje, destino):
+    """Respuesta a un guardado exitoso: se ofrece el PDF y se vuelve al formulario vacío."""
+    # 'tipo' debe coincidir con la clave en PDF_CONFIG
+    request.session['pdf_download'] = {'tipo': tipo, 'pk': pk}
+    messages.success(request, mensaje)
+    return redirect(destino)
+
 
 # 1. INSCRIPCIÓN + PDF
 def inscripcion(request):
     # 1. LEER: Revisar si venimos de un guardado exitoso para ofrecer PDF
     download_data = request.session.pop('pdf_download', None)
+    token = _token_envio(request)
 
     if request.method == 'POST':
+        # Doble clic: este token ya guardó una inscripción, se contesta igual que la primera vez
+        previo = _envio_previo(token, 'inscripcion')
+        if previo is not None:
+            return _guardado(request, 'inscripcion', previo, 'Inscripción guardada exitosamente.', 'Inscripcion')
+
         # ESTO ES LO QUE VALIDA QUE NO VENGA VACÍO
         form = InscripcionForm(request.POST)
 
         if form.is_valid():
-            # 2. GUARDAR: Guardamos y capturamos el objeto creado
-            nuevo_registro = form.save()
+            # 2. GUARDAR: Guardamos (junto con el token) y capturamos el objeto creado
+            pk, nuevo = _guardar_una_vez(token, 'inscripcion', form.save)
+            if nuevo:
+                pdf_cola.prerenderizar('inscripcion', pk)  # El PDF se va generando en segundo plano
 
             # 3. RECORDAR: Guardamos en sesión qué se acaba de crear
-            # 'tipo': 'inscripcion' debe coincidir con la clave en tu PDF_CONFIG
-            request.session['pdf_download'] = {'tipo': 'inscripcion', 'pk': nuevo_registro.pk}
-
-            messages.success(request, 'Inscripción guardada exitosamente.')
-            return redirect('Inscripcion')
+            return _guardado(request, 'inscripcion', pk, 'Inscripción guardada exitosamente.', 'Inscripcion')
         else:
             # Si form.is_valid() es False, NO se guarda nada y se muestra el error
             messages.error(request, 'Formulario incompleto. Revisa los campos rojos.')
@@ -248,6 +325,7 @@ def inscripcion(request):
     # Es vital pasar 'form' y 'download_data' al render
     return render(request, 'Sistema/inscripcion/inscripcion.html', {
         'form': form,
+        'token_envio': token,
         'download_data': download_data
     })
 
@@ -266,6 +344,7 @@ def ficha(request):
 
             # 3. RECORDAR: Guardamos en sesión qué se acaba de crear
             request.session['pdf_download'] = {'tipo': 'ficha', 'pk': nuevo_registro.pk}
+            pdf_cola.prerenderizar('ficha', nuevo_registro.pk)  # El PDF se va generando en segundo plano
 
             messages.success(request, 'Ficha Técnica guardada exitosamente.')
             return redirect('Ficha')
@@ -295,6 +374,7 @@ def criterios(request):
             # 3. RECORDAR: Guardamos en sesión qué se acaba de crear
             # 'tipo': 'criterios' debe coincidir con la clave en tu PDF_CONFIG
             request.session['pdf_download'] = {'tipo': 'criterios', 'pk': nuevo_registro.pk}
+            pdf_cola.prerenderizar('criterios', nuevo_registro.pk)  # El PDF se va generando en segundo plano
 
             messages.success(request, 'Criterios guardados exitosamente.')
             return redirect('Criterios')
@@ -313,23 +393,26 @@ def criterios(request):
 def encuesta(request):
     # 1. LEER: Revisar si venimos de un guardado exitoso para ofrecer PDF
     download_data = request.session.pop('pdf_download', None)
+    token = _token_envio(request)
 
     if request.method == 'POST':
+        # Doble clic: esta encuesta ya se guardó con este token
+        previo = _envio_previo(token, 'encuesta')
+        if previo is not None:
+            return _guardado(request, 'encuesta', previo, 'Encuesta enviada correctamente.', 'Encuesta')
+
         # 1. Cargar todas las respuestas en el formulario
         form = EncuestaSatisfaccionForm(request.POST)
 
         # 2. Validar (Candado Servidor)
         if form.is_valid():
-            # GUARDAR: Guardamos y capturamos el objeto creado
-            nuevo_registro = form.save()
+            # GUARDAR: Guardamos (junto con el token) y capturamos el objeto creado
+            pk, nuevo = _guardar_una_vez(token, 'encuesta', form.save)
+            if nuevo:
+                pdf_cola.prerenderizar('encuesta', pk)  # El PDF se va generando en segundo plano
 
             # RECORDAR: Guardamos en sesión qué se acaba de crear
-            # 'tipo': 'encuesta' debe coincidir con la clave en tu PDF_CONFIG (que agregarás después si no está)
-            # NOTA: Asegúrate de agregar 'encuesta' a tu diccionario PDF_CONFIG arriba en views.py
-            request.session['pdf_download'] = {'tipo': 'encuesta', 'pk': nuevo_registro.pk}
-
-            messages.success(request, 'Encuesta enviada correctamente.')
-            return redirect('Encuesta')
+            return _guardado(request, 'encuesta', pk, 'Encuesta enviada correctamente.', 'Encuesta')
         else:
             # Si faltó responder alguna pregunta
             messages.error(request,
@@ -339,6 +422,7 @@ def encuesta(request):
 
     return render(request, 'Sistema/encuesta/encuesta.html', {
         'form': form,
+        'token_envio': token,
         'download_data': download_data
     })
 
@@ -351,26 +435,29 @@ def programa(request):
         form = ProgramaInstitucionalForm(request.POST)
 
         if form.is_valid():
-            prog = form.save()
-
-            # Guardar las 10 filas (Tu lógica original intacta)
-            for i in range(1, 11):
-                if request.POST.get(f'curso_{i}'):
-                    ProgramaDetalle.objects.create(
-                        programa=prog,
-                        no_consecutivo=request.POST.get(f'no_{i}'),
-                        nombre_curso=request.POST.get(f'curso_{i}'),
-                        objetivo=request.POST.get(f'objetivo_{i}'),
-                        periodo_realizacion=request.POST.get(f'periodo_{i}'),
-                        lugar=request.POST.get(f'lugar_{i}'),
-                        horas=request.POST.get(f'horas_{i}') or 0,
-                        instructor=request.POST.get(f'instructor_{i}'),
-                        dirigido_a=request.POST.get(f'dirigido_{i}'),
-                        observaciones=request.POST.get(f'observaciones_{i}')
-                    )
+            # Primero se arman las 10 filas; luego el programa y sus filas se guardan juntos
+            detalles = [
+                ProgramaDetalle(
+                    no_consecutivo=_entero(request.POST.get(f'no_{i}')) or i,
+                    nombre_curso=request.POST.get(f'curso_{i}'),
+                    objetivo=request.POST.get(f'objetivo_{i}', ''),
+                    periodo_realizacion=request.POST.get(f'periodo_{i}', ''),
+                    lugar=request.POST.get(f'lugar_{i}', ''),
+                    horas=_entero(request.POST.get(f'horas_{i}')) or 0,
+                    instructor=request.POST.get(f'instructor_{i}', ''),
+                    dirigido_a=request.POST.get(f'dirigido_{i}', ''),
+                    observaciones=request.POST.get(f'observaciones_{i}')
+                )
+                for i in range(1, 11) if request.POST.get(f'curso_{i}')
+            ]
+
+            with transaction.atomic():
+                prog = form.save()
+                _guardar_hijos(detalles, programa=prog)
 
             # Guardamos datos para descarga
             request.session['pdf_download'] = {'tipo': 'programa', 'pk': prog.pk}
+            pdf_cola.prerenderizar('programa', prog.pk)  # El PDF se va generando en segundo plano
 
             messages.success(request, 'Programa guardado exitosamente.')
             return redirect('Programa')
@@ -392,51 +479,37 @@ def diagnostico(request):
     if request.method == 'POST':
         form = DiagnosticoNecesidadesForm(request.POST)
         if form.is_valid():
-            diag = form.save()
-
-            # Guardar Tablas A, B, C, D
-            # Tabla A
-            for i in range(1, 4):
-                if request.POST.get(f'a_asignatura_{i}'):
-                    DiagnosticoAsignatura.objects.create(
-                        diagnostico=diag, tipo_tabla='generica',
-                        asignatura=request.POST.get(f'a_asignatura_{i}'),
-                        contenido=request.POST.get(f'a_contenido_{i}'),
-                        num_profesores=request.POST.get(f'a_num_profes_{i}') or 0,
-                        periodo=request.POST.get(f'a_periodo_{i}'),
-                        instructor_propuesto=request.POST.get(f'a_instructor_{i}')
-                    )
-            # Tabla B
-            for i in range(1, 4):
-                if request.POST.get(f'b_asignatura_{i}'):
-                    DiagnosticoAsignatura.objects.create(
-                        diagnostico=diag, tipo_tabla='especialidad',
-                        asignatura=request.POST.get(f'b_asignatura_{i}'),
-                        contenido=request.POST.get(f'b_contenido_{i}'),
-                        num_profesores=request.POST.get(f'b_num_profes_{i}') or 0,
-                        periodo=request.POST.get(f'b_periodo_{i}'),
-                        instructor_propuesto=request.POST.get(f'b_instructor_{i}')
-                    )
-            # Tabla C
-            for i in range(1, 4):
-                if request.POST.get(f'c_actividad_{i}'):
-                    DiagnosticoActividad.objects.create(
-                        diagnostico=diag, tipo_tabla='docente',
-                        actividad=request.POST.get(f'c_actividad_{i}'),
-                        carrera_atendida=request.POST.get(f'c_carrera_{i}'),
-                        fecha_evento=request.POST.get(f'c_fecha_{i}')
-                    )
-            # Tabla D
-            for i in range(1, 4):
-                if request.POST.get(f'd_actividad_{i}'):
-                    DiagnosticoActividad.objects.create(
-                        diagnostico=diag, tipo_tabla='profesional',
-                        actividad=request.POST.get(f'd_actividad_{i}'),
-                        carrera_atendida=request.POST.get(f'd_carrera_{i}'),
-                        fecha_evento=request.POST.get(f'd_fecha_{i}')
-                    )
+            # Tablas A y B (asignaturas) y C y D (actividades): una lista por modelo
+            asignaturas = [
+                DiagnosticoAsignatura(
+                    tipo_tabla=tipo_tabla,
+                    asignatura=request.POST.get(f'{letra}_asignatura_{i}'),
+                    contenido=request.POST.get(f'{letra}_contenido_{i}', ''),
+                    num_profesores=_entero(request.POST.get(f'{letra}_num_profes_{i}')) or 0,
+                    periodo=request.POST.get(f'{letra}_periodo_{i}', ''),
+                    instructor_propuesto=request.POST.get(f'{letra}_instructor_{i}', '')
+                )
+                for letra, tipo_tabla in [('a', 'generica'), ('b', 'especialidad')]
+                for i in range(1, 4) if request.POST.get(f'{letra}_asignatura_{i}')
+            ]
+            actividades = [
+                DiagnosticoActividad(
+                    tipo_tabla=tipo_tabla,
+                    actividad=request.POST.get(f'{letra}_actividad_{i}'),
+                    carrera_atendida=request.POST.get(f'{letra}_carrera_{i}', ''),
+                    fecha_evento=request.POST.get(f'{letra}_fecha_{i}', '')
+                )
+                for letra, tipo_tabla in [('c', 'docente'), ('d', 'profesional')]
+                for i in range(1, 4) if request.POST.get(f'{letra}_actividad_{i}')
+            ]
+
+            with transaction.atomic():
+                diag = form.save()
+                _guardar_hijos(asignaturas, diagnostico=diag)
+                _guardar_hijos(actividades, diagnostico=diag)
 
             request.session['pdf_download'] = {'tipo': 'diagnostico', 'pk': diag.pk}
+            pdf_cola.prerenderizar('diagnostico', diag.pk)  # El PDF se va generando en segundo plano
             messages.success(request, 'Diagnóstico guardado exitosamente.')
             return redirect('Diagnostico')
         else:
@@ -452,52 +525,65 @@ def diagnostico(request):
 # 7. CURRICULUM VITAE + PDF
 def cv(request):
     download_data = request.session.pop('pdf_download', None)
+    token = _token_envio(request)
 
     if request.method == 'POST':
+        # Doble clic: este CV ya se guardó con este token
+        previo = _envio_previo(token, 'cv')
+        if previo is not None:
+            return _guardado(request, 'cv', previo, 'Curriculum guardado correctamente.', 'CV')
+
         form = CurriculumVitaeForm(request.POST)
         if form.is_valid():
-            curriculum = form.save()
-
-            # Guardar Tablas Hijas
-            for i in range(1, 4):
-                if request.POST.get(f'exp_puesto_{i}'):
-                    CVExperienciaLaboral.objects.create(
-                        cv=curriculum,
-                        puesto=request.POST.get(f'exp_puesto_{i}'),
-                        empresa=request.POST.get(f'exp_empresa_{i}'),
-                        permanencia=request.POST.get(f'exp_permanencia_{i}'),
-                        actividades=request.POST.get(f'exp_actividades_{i}')
-                    )
-            for i in range(1, 4):
-                if request.POST.get(f'doc_materia_{i}'):
-                    CVExperienciaDocente.objects.create(
-                        cv=curriculum,
-                        materia=request.POST.get(f'doc_materia_{i}'),
-                        periodo=request.POST.get(f'doc_periodo_{i}')
-                    )
-            for i in range(1, 4):
-                if request.POST.get(f'prod_actividad_{i}'):
-                    CVProductoAcademico.objects.create(
-                        cv=curriculum,
-                        actividad=request.POST.get(f'prod_actividad_{i}'),
-                        descripcion=request.POST.get(f'prod_desc_{i}'),
-                        fecha=request.POST.get(f'prod_fecha_{i}')
-                    )
-            for i in range(1, 4):
-                if request.POST.get(f'inst_curso_{i}'):
-                    CVParticipacionInstructor.objects.create(
-                        cv=curriculum,
-                        nombre_curso=request.POST.get(f'inst_curso_{i}'),
-                        institucion=request.POST.get(f'inst_org_{i}'),
-                        duracion=request.POST.get(f'inst_duracion_{i}'),
-                        fecha=request.POST.get(f'inst_fecha_{i}')
-                    )
+            # Tablas hijas: 3 filas de cada una
+            filas = range(1, 4)
+            laboral = [
+                CVExperienciaLaboral(
+                    puesto=request.POST.get(f'exp_puesto_{i}'),
+                    empresa=request.POST.get(f'exp_empresa_{i}', ''),
+                    permanencia=request.POST.get(f'exp_permanencia_{i}', ''),
+                    actividades=request.POST.get(f'exp_actividades_{i}', '')
+                )
+                for i in filas if request.POST.get(f'exp_puesto_{i}')
+            ]
+            docente = [
+                CVExperienciaDocente(
+                    materia=request.POST.get(f'doc_materia_{i}'),
+                    periodo=request.POST.get(f'doc_periodo_{i}', '')
+                )
+                for i in filas if request.POST.get(f'doc_materia_{i}')
+            ]
+            productos = [
+                CVProductoAcademico(
+                    actividad=request.POST.get(f'prod_actividad_{i}'),
+                    descripcion=request.POST.get(f'prod_desc_{i}', ''),
+                    fecha=request.POST.get(f'prod_fecha_{i}', '')
+                )
+                for i in filas if request.POST.get(f'prod_actividad_{i}')
+            ]
+            instructor = [
+                CVParticipacionInstructor(
+                    nombre_curso=request.POST.get(f'inst_curso_{i}'),
+                    institucion=request.POST.get(f'inst_org_{i}', ''),
+                    duracion=request.POST.get(f'inst_duracion_{i}', ''),
+                    fecha=request.POST.get(f'inst_fecha_{i}', '')
+                )
+                for i in filas if request.POST.get(f'inst_curso_{i}')
+            ]
+
+            def guardar():
+                curriculum = form.save()
+                for hijos in (laboral, docente, productos, instructor):
+                    _guardar_hijos(hijos, cv=curriculum)
+                return curriculum
+
+            # El CV, sus tablas y el token se guardan en una sola transacción
+            pk, nuevo = _guardar_una_vez(token, 'cv', guardar)
+            if nuevo:
+                pdf_cola.prerenderizar('cv', pk)  # El PDF se va generando en segundo plano
 
             # Guardar sesión para descarga
-            request.session['pdf_download'] = {'tipo': 'cv', 'pk': curriculum.pk}
-
-            messages.success(request, 'Curriculum guardado correctamente.')
-            return redirect('CV')
+            return _guardado(request, 'cv', pk, 'Curriculum guardado correctamente.', 'CV')
         else:
             messages.error(request, 'El formulario está incompleto. Por favor revisa los Datos Personales.')
     else:
@@ -505,6 +591,7 @@ def cv(request):
 
     return render(request, 'Sistema/cv/cv.html', {
         'form': form,
+        'token_envio': token,
         'download_data': download_data
     })
 
@@ -519,6 +606,72 @@ def mis_listas_asistencia(request):
 
 
 # --- VISTA 2: CREAR O EDITAR LISTA ---
+_CAMPOS_PARTICIPANTE = ['rfc', 'puesto', 'sexo', 'asist_l', 'asist_m1', 'asist_m2', 'asist_j', 'asist_v', 'concluyo']
+_NOMBRE_PARTICIPANTE = re.compile(r'^nombre_(\d+)$')
+
+
+def _participantes_del_post(post):
+    """
+    AsistenciaParticipante (sin guardar) de cada fila con nombre que venga en el POST,
+    sin tope de 23: tantas hojas como haya mandado el formulario. El tope de
+    ASISTENCIA_MAX_HOJAS lo revisa la vista, para avisar en lugar de perder filas.
+    """
+    numeros = sorted(int(m.group(1)) for m in map(_NOMBRE_PARTICIPANTE.match, post) if m)
+    return [
+        AsistenciaParticipante(
+            no_consecutivo=i,
+            nombre=post[f'nombre_{i}'],
+            **{campo: post.get(f'{campo}_{i}', '') for campo in _CAMPOS_PARTICIPANTE}
+        )
+        for i in numeros if i >= 1 and post[f'nombre_{i}']
+    ]
+
+
+def _guardar_participantes(lista, existentes, participantes):
+    """
+    Guarda solo lo que cambió, comparando por no_consecutivo con las filas que ya tenía la lista:
+    un bulk_update para las modificadas, un bulk_create para las nuevas y un DELETE para las quitadas.
+    Así guardar el progreso a cada rato no borra y vuelve a crear la lista completa.
+    """
+    campos = ['nombre'] + _CAMPOS_PARTICIPANTE
+    actuales = {}
+    quitadas = []
+    for fila in existentes:
+        if fila.no_consecutivo in actuales:
+            quitadas.append(fila.pk)  # Número repetido (listas viejas): se queda la primera
+        else:
+            actuales[fila.no_consecutivo] = fila
+
+    nuevas, modificadas, cambiados = [], [], set()
+    for fila in participantes:
+        actual = actuales.pop(fila.no_consecutivo, None)
+        if actual is None:
+            nuevas.append(fila)
+            continue
+        diferentes = [campo for campo in campos if getattr(actual, campo) != getattr(fila, campo)]
+        if diferentes:
+            for campo in diferentes:
+                setattr(actual, campo, getattr(fila, campo))
+            modificadas.append(actual)
+            cambiados.update(diferentes)
+    quitadas += [fila.pk for fila in actuales.values()]
+
+    _borrar_participantes(lista, quitadas)
+    if modificadas:
+        AsistenciaParticipante.objects.bulk_update(modificadas, [c for c in campos if c in cambiados])
+    _guardar_hijos(nuevas, lista=lista)
+
+
+def _borrar_participantes(lista, pks):
+    """
+    Borra las filas quitadas sin invalidar el PDF ni tocar la lista por cada una:
+    la lista se guarda en la misma transacción y ese save() ya invalida su PDF.
+    """
+    if pks:
+        with filas_en_bloque():
+            AsistenciaParticipante.objects.filter(lista=lista, pk__in=pks).delete()
+
+
 @login_required(login_url='Login')
 def asistencia(request, pk=None):
     # --- 1. LÓGICA INTELIGENTE (NUEVO) ---
@@ -538,41 +691,29 @@ def asistencia(request, pk=None):
     if pk:
         # MODO EDICIÓN
         lista = get_object_or_404(ListaAsistencia, pk=pk, usuario=request.user)
-        participantes_db = list(lista.participantes.all().order_by('no_consecutivo'))
     else:
         # MODO CREACIÓN (Solo si no había borradores)
         lista = None
-        participantes_db = []
-
-    # ... (El resto de la vista continúa idéntico a lo que tenías) ...
-    # Preparamos los datos para la plantilla...
-    filas_participantes = []
-    db_map = {p.no_consecutivo: p for p in participantes_db}
-
-    for i in range(1, 24):
-        p = db_map.get(i)
-        filas_participantes.append({
-            'counter': i,
-            'nombre': p.nombre if p else '',
-            'rfc': p.rfc if p else '',
-            'puesto': p.puesto if p else '',
-            'sexo': p.sexo if p else '',
-            'asist_l': p.asist_l if p else '',
-            'asist_m1': p.asist_m1 if p else '',
-            'asist_m2': p.asist_m2 if p else '',
-            'asist_j': p.asist_j if p else '',
-            'asist_v': p.asist_v if p else '',
-            'concluyo': p.concluyo if p else ''
-        })
 
+    capturadas = None
     if request.method == 'POST':
-        # ... (Tu código de guardar que ya funciona) ...
-        # Solo asegúrate de que este bloque esté igual al que te pasé antes
         form = ListaAsistenciaForm(request.POST, instance=lista)
-
-        if form.is_valid():
+        participantes = _participantes_del_post(request.POST)
+        fuera = [p.no_consecutivo for p in participantes if p.no_consecutivo > max_participantes()]
+
+        if fuera:
+            messages.error(request, f'La lista admite hasta {max_participantes()} participantes '
+                                    f'({settings.ASISTENCIA_MAX_HOJAS} hojas). Quita las filas de la '
+                                    f'{fuera[0]} en adelante. No se guardó nada.')
+            capturadas = {'participantes': participantes}
+        elif form.is_valid():
             nueva_lista = form.save(commit=False)
             nueva_lista.usuario = request.user
+            # Las hojas se calculan solas: una por cada 23 participantes, y la actual es la última
+            # en uso (la que se agregó con "Agregar hoja")
+            ultimo = max((p.no_consecutivo for p in participantes), default=0)
+            nueva_lista.hoja_total = str(filas_en_hojas(ultimo, PARTICIPANTES_POR_HOJA) // PARTICIPANTES_POR_HOJA)
+            nueva_lista.hoja_actual = nueva_lista.hoja_total
 
             if 'btn_finalizar' in request.POST:
                 nueva_lista.estado = 'finalizado'
@@ -581,32 +722,18 @@ def asistencia(request, pk=None):
                 nueva_lista.estado = 'borrador'
                 mensaje = 'Progreso guardado correctamente.'
 
-            nueva_lista.save()
-
-            if lista:
-                AsistenciaParticipante.objects.filter(lista=lista).delete()
-
-            for i in range(1, 24):
-                nombre = request.POST.get(f'nombre_{i}')
-                if nombre:
-                    AsistenciaParticipante.objects.create(
-                        lista=nueva_lista,
-                        no_consecutivo=i,
-                        nombre=nombre,
-                        rfc=request.POST.get(f'rfc_{i}', ''),
-                        puesto=request.POST.get(f'puesto_{i}', ''),
-                        sexo=request.POST.get(f'sexo_{i}', ''),
-                        asist_l=request.POST.get(f'asist_l_{i}', ''),
-                        asist_m1=request.POST.get(f'asist_m1_{i}', ''),
-                        asist_m2=request.POST.get(f'asist_m2_{i}', ''),
-                        asist_j=request.POST.get(f'asist_j_{i}', ''),
-                        asist_v=request.POST.get(f'asist_v_{i}', ''),
-                        concluyo=request.POST.get(f'concluyo_{i}', '')
-                    )
+            # Filas que ya tenía la lista
+            existentes = list(lista.participantes.all()) if lista else []
+
+            # La lista y todos sus participantes se guardan juntos o no se guarda nada
+            with transaction.atomic():
+                nueva_lista.save()
+                _guardar_participantes(nueva_lista, existentes, participantes)
 
             # Redirección
             if nueva_lista.estado == 'finalizado':
                 request.session['pdf_download'] = {'tipo': 'asistencia', 'pk': nueva_lista.pk}
+                pdf_cola.prerenderizar('asistencia', nueva_lista.pk)  # El PDF se va generando en segundo plano
                 # Al finalizar, redirigimos a "crear nueva" para limpiar la pantalla
                 # (Como ya no es borrador, la lógica del inicio no lo abrirá)
                 return redirect('Asistencia')
@@ -616,75 +743,99 @@ def asistencia(request, pk=None):
 
         else:
             messages.error(request, 'Error en el formulario.')
+            capturadas = {'participantes': participantes}
     else:
         form = ListaAsistenciaForm(instance=lista)
 
-    return render(request, 'Sistema/asistencia/asistencia.html', {
-        'form': form,
-        'tabla_participantes': filas_participantes,
+    # Las mismas filas (por no_consecutivo, en hojas de 23) que se imprimen en el PDF, en una sola
+    # consulta; si el POST se rechazó, las que se habían escrito
+    context = {'form': form}
+    context.update(tablas_asistencia(lista, capturadas))
+    context.update({
+        # Guardado automático por celda: solo en listas ya creadas que siguen en borrador
+        'url_guardado': reverse('api_guardar_asistencia', args=[lista.pk])
+                        if lista and lista.estado == 'borrador' else '',
         'download_data': request.session.pop('pdf_download', None)
     })
+    return render(request, 'Sistema/asistencia/asistencia.html', context)
 
 # 9. REGISTRO GENERAL + PDF
+# {input del formulario (sin el _n de la fila): campo de RegistroFilaForm}
+_CAMPOS_FILA_REGISTRO = {
+    'instituto': 'instituto', 'curso': 'nombre_curso', 'instructor': 'instructor',
+    'f_inicio': 'fecha_inicio', 'f_termino': 'fecha_termino', 'horas': 'horas', 'modalidad': 'modalidad',
+    'inscritos': 'docentes_inscritos', 'terminaron': 'docentes_terminaron',
+    'acreditados': 'docentes_acreditados', 'tipo': 'tipo',
+}
+_FILAS_REGISTRO = 15
+
+
+def _errores_de(form):
+    """'Campo: error; Campo: error' de un form, para mostrarlo en un solo mensaje."""
+    return '; '.join(
+        f"{form[campo].label if campo in form.fields else 'General'}: {' '.join(errores)}"
+        for campo, errores in form.errors.items()
+    )
+
+
+def _filas_de_registro(post):
+    """
+    Valida las 15 filas antes de guardar nada.
+    Devuelve (filas capturadas para volver a pintarlas, RegistroFila sin guardar, errores de todas las filas).
+    """
+    capturadas, validas, errores = [], [], []
+    for i in range(1, _FILAS_REGISTRO + 1):
+        fila = {'counter': i, 'formacion': post.get(f'formacion_{i}', ''),
+                'actualizacion': post.get(f'actualizacion_{i}', '')}
+        fila.update({campo: post.get(f'{campo}_{i}', '') for campo in _CAMPOS_FILA_REGISTRO})
+        capturadas.append(fila)
+        if not fila['curso']:
+            continue
+
+        form = RegistroFilaForm({campo: fila[entrada] for entrada, campo in _CAMPOS_FILA_REGISTRO.items()})
+        if form.is_valid():
+            obj = form.save(commit=False)
+            obj.no_consecutivo = i
+            obj.es_formacion = bool(fila['formacion'])
+            obj.es_actualizacion = bool(fila['actualizacion'])
+            validas.append(obj)
+        else:
+            fila['error'] = _errores_de(form)
+            errores.append(f"Fila {i}: {fila['error']}")
+    return capturadas, validas, errores
+
+
 def registro(request):
     download_data = request.session.pop('pdf_download', None)
+    form = RegistroGeneralForm(request.POST or None)
+    filas = [{'counter': i} for i in range(1, _FILAS_REGISTRO + 1)]
 
     if request.method == 'POST':
-        # 1. Crear el documento PADRE primero
-        # (Podrías agregar inputs en el HTML para periodo, etc., por ahora usamos defaults)
-        nuevo_registro = RegistroGeneral.objects.create(
-            periodo="2025",
-            jefe_desarrollo="Ing. Juan Perez",
-            subdirector="Lic. Maria Lopez"
-        )
+        # 1. Validar TODO primero: encabezado y las 15 filas (sin tocar la base)
+        filas, validas, errores = _filas_de_registro(request.POST)
+        if not form.is_valid():
+            errores.insert(0, f'Encabezado y firmas: {_errores_de(form)}')
+        elif not validas and not errores:
+            errores.append('El formulario está vacío.')
+
+        if not errores:
+            # 2. El documento PADRE y sus filas se guardan juntos
+            with transaction.atomic():
+                nuevo_registro = form.save()
+                _guardar_hijos(validas, registro=nuevo_registro)
 
-        filas_guardadas = 0
-
-        # 2. Guardar las HIJAS vinculadas
-        for i in range(1, 16):
-            nombre = request.POST.get(f'curso_{i}')
-            if nombre:
-                filas_guardadas += 1
-
-                # Preparamos datos para validar con el FORMULARIO NUEVO
-                data_row = {
-                    'instituto': request.POST.get(f'instituto_{i}'),
-                    'nombre_curso': nombre,
-                    'instructor': request.POST.get(f'instructor_{i}'),
-                    'fecha_inicio': request.POST.get(f'f_inicio_{i}'),
-                    'fecha_termino': request.POST.get(f'f_termino_{i}'),
-                    'horas': request.POST.get(f'horas_{i}'),
-                    'modalidad': request.POST.get(f'modalidad_{i}'),
-                    'docentes_inscritos': request.POST.get(f'inscritos_{i}'),
-                    'docentes_terminaron': request.POST.get(f'terminaron_{i}'),
-                    'docentes_acreditados': request.POST.get(f'acreditados_{i}'),
-                    'tipo': request.POST.get(f'tipo_{i}'),
-                }
-
-                form = RegistroFilaForm(data_row)  # <--- USAMOS EL FORM NUEVO
-
-                if form.is_valid():
-                    obj = form.save(commit=False)
-                    obj.registro = nuevo_registro  # Vinculamos al padre
-                    obj.no_consecutivo = i
-                    obj.es_formacion = True if request.POST.get(f'formacion_{i}') else False
-                    obj.es_actualizacion = True if request.POST.get(f'actualizacion_{i}') else False
-                    obj.save()
-                else:
-                    # Si hay error, borramos el padre para no dejar basura y avisamos
-                    nuevo_registro.delete()
-                    messages.error(request, f'Error en fila {i}: {form.errors}')
-                    return redirect('Registro')
-
-        if filas_guardadas > 0:
             request.session['pdf_download'] = {'tipo': 'registro', 'pk': nuevo_registro.pk}
+            pdf_cola.prerenderizar('registro', nuevo_registro.pk)  # El PDF se va generando en segundo plano
             messages.success(request, 'Registro General guardado exitosamente.')
             return redirect('Registro')
-        else:
-            nuevo_registro.delete()
-            messages.error(request, 'El formulario está vacío.')
+
+        # Se avisa de todas las filas con error a la vez y se conserva lo capturado
+        for error in errores:
+            messages.error(request, error)
 
     return render(request, 'Sistema/registro/registro.html', {
+        'form': form,
+        'filas': filas,
         'download_data': download_data
     })
 
@@ -732,36 +883,23 @@ def eliminar_curso(request):
 
 
 def estadisticas(request):
-    # 1. Obtener todas las encuestas base
-    encuestas = EncuestaSatisfaccion.objects.all()
-
-    # 2. Obtener listas para los filtros (valores únicos)
-    periodos = EncuestaSatisfaccion.objects.values_list('periodo', flat=True).distinct()
-    facilitadores = EncuestaSatisfaccion.objects.values_list('facilitador', flat=True).distinct()
+    # 1. Listas para los filtros (valores únicos), leídas del resumen de encuestas
+    periodos, facilitadores = estadisticas_encuestas.opciones_filtro()
 
-    # 3. Aplicar Filtros si el usuario los seleccionó
+    # 2. Filtros si el usuario los seleccionó
     periodo_select = request.GET.get('periodo')
     facilitador_select = request.GET.get('facilitador')
 
-    if periodo_select:
-        encuestas = encuestas.filter(periodo=periodo_select)
-
-    if facilitador_select:
-        encuestas = encuestas.filter(facilitador=facilitador_select)
+    # 3. Promedios por pregunta (q1 a q20) desde las sumas del resumen
+    # Esto genera un diccionario: {'q1': 4.5, 'q2': 3.8, ...}
+    promedios = estadisticas_encuestas.promedios(periodo_select, facilitador_select)
 
-    # 4. Calcular promedios por pregunta (q1 a q20)
-    # Esto genera un diccionario: {'q1__avg': 4.5, 'q2__avg': 3.8, ...}
-    promedios = encuestas.aggregate(
-        *[Avg(f'q{i}') for i in range(1, 21)]
-    )
-
-    # 5. Preparar datos para Chart.js (Limpiar los None si no hay datos)
+    # 4. Preparar datos para Chart.js (Limpiar los None si no hay datos)
     datos_grafica = []
     labels_grafica = []
 
     for i in range(1, 21):
-        clave = f'q{i}__avg'
-        valor = promedios.get(clave) or 0  # Si es None, pone 0
+        valor = promedios[f'q{i}'] or 0  # Si es None, pone 0
         datos_grafica.append(round(valor, 2))  # Redondear a 2 decimales
         labels_grafica.append(f'P{i}')  # Etiquetas P1, P2...
 
@@ -777,6 +915,38 @@ def estadisticas(request):
     return render(request, 'Sistema/estadisticas/estadisticas.html', context)
 
 
+_RANKING_POR_PAGINA = 20
+
+
+def ranking_facilitadores(request):
+    """Facilitadores ordenados por satisfacción dentro de cada periodo, con percentil y banda."""
+    periodos, _ = estadisticas_encuestas.opciones_filtro()
+    periodo_select = request.GET.get('periodo')
+
+    # El ranking completo sale de la caché; solo se pagina la lista
+    ranking = estadisticas_encuestas.ranking_facilitadores(periodo_select)
+    pagina = Paginator(ranking, _RANKING_POR_PAGINA).get_page(request.GET.get('page'))
+
+    return render(request, 'Sistema/estadisticas/ranking.html', {
+        'periodos': periodos,
+        'periodo_actual': periodo_select,
+        'pagina': pagina,
+    })
+
+
+def api_distribucion_encuestas(request):
+    """Conteo de cada calificación (1-5) por pregunta, con n y desviación estándar, en JSON."""
+    filtro = {campo: request.GET.get(campo) or None for campo in ['periodo', 'facilitador', 'nombre_curso']}
+    data = estadisticas_encuestas.distribucion(**filtro)
+    return JsonResponse({'filtro': filtro, **data})
+
+
+def api_tendencia_encuestas(request):
+    """Promedio por pregunta en cada periodo (general o de un facilitador), en JSON."""
+    facilitador = request.GET.get('facilitador') or None
+    return JsonResponse({'facilitador': facilitador, 'periodos': estadisticas_encuestas.tendencia(facilitador)})
+
+
 # =======================================================
 # API: AUTOCOMPLETADO
 # =======================================================
@@ -829,4 +999,101 @@ def api_buscar_profesor(request):
         except (Profesor.DoesNotExist, Profesor.MultipleObjectsReturned):
             pass
 
-    return JsonResponse(data)
\ No newline at end of file
+    return JsonResponse(data)
+
+
+# =======================================================
+# API: GUARDADO AUTOMÁTICO DE ASISTENCIA
+# =======================================================
+# La pantalla de asistencia manda solo las celdas que se editaron, en lotes pequeños:
+#   {"cambios": [{"no": 3, "campo": "asist_l", "valor": "X"}, ...]}
+# En lugar de reenviar la lista completa (23 x 11 campos por hoja) en cada guardado.
+# Una celda no válida no tumba el lote: se responde {"errores": {"campo_no": "mensaje"}}
+# y el resto de las celdas sí se guarda.
+
+_MAX_CAMBIOS = 500
+_SIN_NOMBRE = 'Escribe el nombre del participante para guardar su fila.'
+
+
+def _cambios_del_json(body):
+    """
+    ({no_consecutivo: {campo: valor}}, {"campo_no": error}) del lote.
+    Lanza ValueError solo si el cuerpo no es un lote de cambios.
+    """
+    cambios = json.loads(body).get('cambios')
+    if not isinstance(cambios, list) or not 0 < len(cambios) <= _MAX_CAMBIOS:
+        raise ValueError(f'Se esperaban de 1 a {_MAX_CAMBIOS} cambios.')
+
+    limite = max_participantes()
+    campos = ['nombre'] + _CAMPOS_PARTICIPANTE
+    por_fila, errores = {}, {}
+    for cambio in cambios:
+        if not isinstance(cambio, dict):
+            raise ValueError('Cada cambio debe ser {no, campo, valor}.')
+        no, campo, valor = cambio.get('no'), cambio.get('campo'), cambio.get('valor')
+        celda = f'{campo}_{no}'
+        if not isinstance(no, int) or isinstance(no, bool) or not 1 <= no <= limite:
+            errores[celda] = f'Número de participante no válido (máximo {limite}).'
+        elif campo not in campos:
+            errores[celda] = 'Campo no válido.'
+        elif not isinstance(valor, str) or len(valor) > AsistenciaParticipante._meta.get_field(campo).max_length:
+            errores[celda] = 'Valor no válido o demasiado largo.'
+        else:
+            por_fila.setdefault(no, {})[campo] = valor  # Si una celda viene dos veces, gana la última
+            errores.pop(celda, None)
+    return por_fila, errores
+
+
+@login_required(login_url='Login')
+def api_guardar_asistencia(request, pk):
+    """Aplica un lote de celdas editadas a los participantes de una lista en borrador del usuario."""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Método no permitido.'}, status=405)
+
+    lista = get_object_or_404(ListaAsistencia, pk=pk, usuario=request.user)
+    if lista.estado != 'borrador':
+        return JsonResponse({'error': 'La lista ya fue finalizada.'}, status=409)
+
+    try:
+        por_fila, errores = _cambios_del_json(request.body)
+    except (ValueError, AttributeError) as error:  # json.JSONDecodeError es ValueError
+        return JsonResponse({'error': str(error)}, status=400)
+
+    campos = ['nombre'] + _CAMPOS_PARTICIPANTE
+    with transaction.atomic():
+        existentes = {
+            p.no_consecutivo: p
+            for p in lista.participantes.filter(no_consecutivo__in=por_fila).order_by('-pk')
+        }
+        nuevas, modificadas, vacias, cambiados = [], [], [], set()
+        for no, valores in por_fila.items():
+            fila = existentes.get(no) or AsistenciaParticipante(no_consecutivo=no)
+            for campo, valor in valores.items():
+                setattr(fila, campo, valor)
+            if not fila.nombre:
+                # Igual que al guardar el formulario: una fila sin nombre no se guarda (y si ya
+                # estaba, se quita); lo que se escribió en ella se avisa celda por celda
+                errores.update({f'{campo}_{no}': _SIN_NOMBRE for campo, valor in valores.items()
+                                if valor and campo != 'nombre'})
+                if fila.pk:
+                    vacias.append(fila)
+            elif fila.pk:
+                cambiados.update(valores)
+                modificadas.append(fila)
+            else:
+                nuevas.append(fila)
+
+        _borrar_participantes(lista, [f.pk for f in vacias])
+        if modificadas:
+            AsistenciaParticipante.objects.bulk_update(modificadas, [c for c in campos if c in cambiados])
+        _guardar_hijos(nuevas, lista=lista)
+
+        # Las hojas se recalculan, y el save() de la lista invalida su PDF (bulk_* no dispara señales)
+        ultimo = lista.participantes.aggregate(ultimo=Max('no_consecutivo'))['ultimo'] or 0
+        lista.hoja_total = str(filas_en_hojas(ultimo, PARTICIPANTES_POR_HOJA) // PARTICIPANTES_POR_HOJA)
+        lista.hoja_actual = lista.hoja_total
+        lista.save(update_fields=['hoja_actual', 'hoja_total', 'fecha_actualizacion'])
+
+    return JsonResponse({'guardado': len(nuevas) + len(modificadas), 'hojas': int(lista.hoja_total),
+                         'errores': errores})
+